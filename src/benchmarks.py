@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+import instrumentation
+
+RESULTS_PATH = './data/benchmarks/results.json'
+BASELINE_PATH = './data/benchmarks/baseline.json'
+
+# Time fn() and return the best and mean wall time over repeats, after one warm-up call
+def time_call(fn, repeats):
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), sum(times) / len(times)
+
+# Each benchmark takes a problem size and returns the function to time
+
+def bench_hstab_grid(size):
+    from hstab_params import get_params
+    from hstab_sizing import evaluate_grid, sweep_grid
+    params = get_params()
+    lh_arr, aoa_arr = sweep_grid(params, size, 11)
+    return lambda: evaluate_grid(lh_arr, aoa_arr, params)
+
+def bench_hstab_adaptive(size):
+    from hstab_params import get_params
+    from hstab_adaptive import adaptive_grid
+    from hstab_sizing import sweep_grid
+    params = get_params()
+    lh_arr, aoa_arr = sweep_grid(params, size, 11)
+    return lambda: adaptive_grid(lh_arr, aoa_arr, params)
+
+def bench_full_estimation(size):
+    import weight_est
+    sweep_params = {**weight_est.sweep_params, 'num': size}
+    verification_params = dict(weight_est.verification_params)
+    return lambda: weight_est.full_estimation(sweep_params, verification_params)
+
+def bench_weight_estimate(size, method):
+    import weight_est
+    sp = weight_est.sweep_params
+    tw_values = np.linspace(0.6, 1.0, size)
+    def run():
+        for t in tw_values:
+            weight_est.weight_estimate(t, 6.0/60.0, sp['WTO_guess'], sp['WTO_lower'], sp['WTO_upper'], method=method)
+    return run
+
+def bench_constraints(size):
+    from constraints import evaluate_constraints
+    rng = np.random.default_rng(0)
+    params = {
+        'AR': rng.uniform(4, 10, size),
+        'CD0': rng.uniform(0.008, 0.04, size),
+        'CLmaxTO': rng.uniform(0.8, 1.8, size),
+        's_TOFL': rng.uniform(100, 1000, size),
+        'V_max': rng.uniform(80, 200, size),
+    }
+    return lambda: evaluate_constraints(params)
+
+# Uncached coefficient fits: the h-stab flight coefficients, and the stability polar fit linearized at size trim angles
+def bench_coeff_fits(size):
+    import hstab_params
+    import stability_params
+    hstab_params.load_polars()
+    stability_params.load_polars()
+    aoa_trims = np.linspace(0.0, 5.0, size)
+    def run():
+        hstab_params.fit_flight_surface_coeffs()
+        for aoa_trim in aoa_trims:
+            stability_params.trim_coeffs(stability_params.fit_polar_coeffs(), aoa_trim)
+    return run
+
+# Fit the four component models to size rows, add 1% more rows and predict at size points
+def bench_surrogates(size):
+    from surrogates import LinearSurrogate
+    rng = np.random.default_rng(0)
+    x = rng.uniform(1.0, 20.0, (size + size // 100 + 1, 2))
+    y = 1.0 + x @ np.array([0.5, 0.2]) + 0.01 * rng.standard_normal(len(x))
+    def run():
+        for k in range(4):
+            model = LinearSurrogate().fit(x[:size, :1 + k % 2], y[:size])
+            model.update(x[size:, :1 + k % 2], y[size:])
+            model.predict(x[:size, :1 + k % 2])
+    return run
+
+# Gradient of bh, SM and T/W_req over size (lh, aoa_trim) points with respect to the h-stab inputs
+def bench_sensitivities(size):
+    from hstab_params import get_params
+    from hstab_sizing import SM, TW_req, calculate_bh
+    from sensitivities import hstab_inputs, sensitivities
+    params = get_params()
+    lh = np.linspace(1.0, 4.0, size)
+    aoa_trim = np.full(size, 5.0)
+    bh = calculate_bh(lh, aoa_trim, params)
+    def run():
+        sensitivities(calculate_bh, [lh, aoa_trim], params, [0, 1] + hstab_inputs)
+        sensitivities(SM, [lh, bh], params, [0, 1] + hstab_inputs)
+        sensitivities(TW_req, [np.full(size, 0.012)], params, [0, 'W/S', 'e', 'AR'])
+    return run
+
+def bench_stability_maps(size):
+    from stability_coeffs import stability_maps
+    import stability_params
+    stability_params.polar_coeffs()
+    rng = np.random.default_rng(0)
+    arrays = {
+        'Sh': rng.uniform(0.5, 1.5, size),
+        'lh': rng.uniform(1.0, 4.0, size),
+        'Sv': rng.uniform(0.4, 1.2, size),
+        'aoa_trim': rng.uniform(0.0, 5.0, size),
+    }
+    return lambda: stability_maps(**arrays)
+
+# size single-parameter changes, each followed by the quantities an interactive session shows
+def bench_design_graph(size):
+    from design_graph import sizing_graph
+    graph = sizing_graph()
+    show = ['bh_trim', 'verified', 'stability_coefficients']
+    for name in show:
+        graph.get(name)
+    values = np.linspace(1.5, 2.5, size)
+    def run():
+        for value in values:
+            graph.set('lh', value)
+            for name in show:
+                graph.get(name)
+    return run
+
+# size concurrent weight_estimate queries to a warm sizing service, over 10 connections
+def bench_sizing_service(size):
+    import asyncio
+    from sizing_service import SizingService, request_many
+    service = SizingService()
+    service.warm_up()
+    messages = [{'op': 'weight_estimate', 'TW_ratio': tw, 'Endurance': 0.1} for tw in np.linspace(0.6, 1.0, size)]
+    async def round_trip():
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            await asyncio.gather(*(request_many(messages[k::10], port=port) for k in range(min(10, size))))
+    return lambda: asyncio.run(round_trip())
+
+# size coupled solves at different endurances, sharing the cached tail grid
+# Every solve starts again from the initial takeoff weight, so an unchanged endurance is still solved
+# instead of returning the memoized design
+def bench_coupled_sizing(size):
+    from coupled_sizing import coupled_graph, coupled_solve
+    graph = coupled_graph()
+    start = graph.get('WTO')
+    coupled_solve(graph)
+    endurances = np.linspace(0.08, 0.12, size)
+    def run():
+        for endurance in endurances:
+            graph.update({'params': {**graph.get('params'), 'Endurance': endurance}, 'WTO': start})
+            coupled_solve(graph)
+    return run
+
+# Range and top-k queries on an in-memory store of size random solution rows
+def bench_solution_store(size):
+    from hstab_sizing import solution_columns
+    from solution_store import SolutionStore
+    rng = np.random.default_rng(0)
+    store = SolutionStore(':memory:', solution_columns)
+    store.insert(store.add_run(), {column: rng.uniform(0.0, 4.0, size) for column in solution_columns})
+    def run():
+        store.top_k('T/W_req', 10, {'SM': (0.5, 3.5), 'bh (ft)': (None, 3.0)})
+        store.top_k('T/W_req', 10, {'SM': (2.0, 2.001)})
+        store.query({'lh (ft)': (1.0, 1.01)})
+    return run
+
+# Mission-sized weight closure of size (T/W, endurance) points, with the traces of the first 100 designs
+def bench_mission_sim(size):
+    from mission_sim import mission_weight_estimate, search_range, simulate_mission
+    rng = np.random.default_rng(0)
+    TW_ratio = rng.uniform(0.7, 1.0, size)
+    Endurance = rng.uniform(5/60.0, 10/60.0, size)
+    def run():
+        WTO = mission_weight_estimate(TW_ratio, Endurance, 7, search_range['WTO_lower'], search_range['WTO_upper'])[0]
+        simulate_mission(WTO[:100], TW_ratio[:100], Endurance[:100])
+    return run
+
+def bench_startup(size):
+    from startup_check import measure_startup
+    return lambda: [measure_startup() for _ in range(size)]
+
+# Name, benchmark, problem sizes, repeats
+benchmarks = [
+    ('hstab_grid', bench_hstab_grid, [1001, 10001, 100001], 5),
+    ('hstab_adaptive', bench_hstab_adaptive, [1001, 10001, 100001], 5),
+    ('full_estimation', bench_full_estimation, [6, 60, 600], 5),
+    ('weight_estimate[bisection]', lambda n: bench_weight_estimate(n, 'bisection'), [10, 100], 3),
+    ('weight_estimate[newton]', lambda n: bench_weight_estimate(n, 'newton'), [10, 100], 3),
+    ('weight_estimate[linear]', lambda n: bench_weight_estimate(n, 'linear'), [10, 100], 3),
+    ('constraints', bench_constraints, [100, 10000, 1000000], 5),
+    ('coeff_fits', bench_coeff_fits, [1, 10, 100], 3),
+    ('surrogates', bench_surrogates, [100, 10000, 1000000], 5),
+    ('sensitivities', bench_sensitivities, [1, 1000, 100000], 5),
+    ('stability_maps', bench_stability_maps, [1000, 100000, 1000000], 5),
+    ('design_graph', bench_design_graph, [10, 100], 5),
+    ('sizing_service', bench_sizing_service, [1, 100, 10000], 5),
+    ('coupled_sizing', bench_coupled_sizing, [1, 10, 100], 5),
+    ('solution_store', bench_solution_store, [10000, 100000, 1000000], 5),
+    ('mission_sim', bench_mission_sim, [1000, 10000, 100000], 5),
+    ('startup', bench_startup, [1], 3),
+]
+
+# Run the benchmarks whose name contains one of the filters, at every size or only the smallest
+def run_benchmarks(filters=None, quick=False):
+    results = []
+    for name, bench, sizes, repeats in benchmarks:
+        if filters and not any(f in name for f in filters):
+            continue
+        for size in (sizes[:1] if quick else sizes):
+            best, mean = time_call(bench(size), repeats)
+            results.append({'name': name, 'size': size, 'best_s': best, 'mean_s': mean, 'repeats': repeats})
+            print("{:<28} {:>9} {:>12.6f} s {:>12.6f} s".format(name, size, best, mean))
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+# Compare best times against a baseline; a benchmark regresses when it is more than threshold slower
+def compare(report, baseline, threshold):
+    # Timings only compare on the same hardware
+    for key in ('machine', 'processor', 'cpus'):
+        if baseline['meta'].get(key) != report['meta'][key]:
+            print("Warning: baseline {} is {!r}, this run has {!r}".format(key, baseline['meta'].get(key), report['meta'][key]))
+    base = {(r['name'], r['size']): r for r in baseline['results']}
+    regressions = []
+    for r in report['results']:
+        b = base.get((r['name'], r['size']))
+        if b is None:
+            print("{:<28} {:>9} no baseline".format(r['name'], r['size']))
+            continue
+        ratio = r['best_s'] / b['best_s']
+        flag = 'REGRESSION' if ratio > 1 + threshold else ''
+        print("{:<28} {:>9} {:>8.2f}x {}".format(r['name'], r['size'], ratio, flag))
+        if flag:
+            regressions.append((r['name'], r['size'], ratio))
+    return regressions
+
+def save(report, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the sizing stages at several problem sizes.')
+    parser.add_argument('filters', nargs='*', help='only run benchmarks whose name contains one of these')
+    parser.add_argument('--out', default=RESULTS_PATH, help='JSON results file')
+    parser.add_argument('--quick', action='store_true', help='only run the smallest size of each benchmark')
+    parser.add_argument('--compare', nargs='?', const=BASELINE_PATH, default=None, help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown before flagging a regression')
+    parser.add_argument('--save-baseline', action='store_true', help='also store the results as the baseline')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    # The baseline is read before this run can replace it with --save-baseline
+    baseline = None
+    if args.compare:
+        if not os.path.exists(args.compare):
+            parser.error("no baseline at {}; store one with --save-baseline first".format(args.compare))
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print("{:<28} {:>9} {:>14} {:>14}".format('benchmark', 'size', 'best', 'mean'))
+    with instrumentation.from_args(args):
+        report = run_benchmarks(args.filters, args.quick)
+    save(report, args.out)
+    if args.save_baseline:
+        save(report, BASELINE_PATH)
+
+    if baseline is not None:
+        print("\nComparison with {}".format(args.compare))
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print("{} regression(s) beyond {:.0%}".format(len(regressions), args.threshold))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
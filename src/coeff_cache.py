@@ -0,0 +1,47 @@
+import hashlib
+import json
+import os
+import numpy as np
+import instrumentation
+
+# Derived coefficients are stored here, one .npz file per set of inputs
+CACHE_DIR = 'data/cache'
+
+# Hash of the input file contents and the fit settings
+def cache_key(paths, settings):
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+# Load the coefficients for these inputs from the cache, or build and store them
+# build() must return a flat dict of scalar coefficients
+def cached_coeffs(name, paths, settings, build, cache_dir=None):
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    path = os.path.join(cache_dir, '{}-{}.npz'.format(name, cache_key(paths, settings)[:16]))
+    if os.path.exists(path):
+        instrumentation.count('coeff_cache.hit')
+        with np.load(path) as data:
+            return {key: data[key].item() for key in data.files}
+
+    instrumentation.count('coeff_cache.miss')
+    coeffs = build()
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first so concurrent processes never read a partial file
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **{key: np.float64(value) for key, value in coeffs.items()})
+    os.replace(tmp_path, path)
+    return coeffs
+
+# Remove every cached coefficient file
+def clear_cache(cache_dir=None):
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    if not os.path.isdir(cache_dir):
+        return
+    for file in os.listdir(cache_dir):
+        if file.endswith('.npz'):
+            os.remove(os.path.join(cache_dir, file))
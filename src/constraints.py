@@ -1,26 +1,35 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from constraint_params import params
+from constraint_params import params as default_params
+import instrumentation
+import rendering
     
-def takeoff_constraint(wing_loading):
+def takeoff_constraint(wing_loading, params=None):
+    if params is None:
+        params = default_params
     rho_alt = params['rho_alt']
     rho_sea = params['rho_sea']
     s_TOFL = params['s_TOFL']
     CLmaxTO = params['CLmaxTO']
     return (37.5/(rho_alt/rho_sea*s_TOFL*CLmaxTO)) * wing_loading
 
-def landing_constraint():
+def landing_constraint(params=None):
+    if params is None:
+        params = default_params
     rho_alt = params['rho_alt']
     s_FL = params['s_FL']
     CLmaxL = params['CLmaxL']
     return s_FL*rho_alt*CLmaxL/1.014
 
-def size_constraint(W_TO):
+def size_constraint(W_TO, params=None):
+    if params is None:
+        params = default_params
     AR=params['AR']
     b_max=params['b_max']
     return AR/b_max**2 * W_TO
 
-def velocity_constraint(wing_loading):
+def velocity_constraint(wing_loading, params=None):
+    if params is None:
+        params = default_params
     V_max = params['V_max']
     rho_alt = params['rho_alt']
     CD0 = params['CD0']
@@ -28,7 +37,9 @@ def velocity_constraint(wing_loading):
     AR = params['AR']
     return rho_alt*CD0*V_max**2/(2*wing_loading) + 2*wing_loading/(rho_alt*np.pi*e*AR*V_max**2)
 
-def min_turn_radius_constraint():
+def min_turn_radius_constraint(params=None):
+    if params is None:
+        params = default_params
     V_turn = params['V_turn']
     g = params['g']
     R_turn = params['R_turn']
@@ -36,55 +47,181 @@ def min_turn_radius_constraint():
     CLmaxCruise = params['CLmaxCruise']
     return (rho_alt*V_turn**2*CLmaxCruise)/(2*np.sqrt((V_turn**2/(R_turn*g))**2+1))
 
-# Plot inputs
-WTO_estimate = params['WTO_estimate']
-max_wing_loading = 5.0
-max_tw_ratio = 1.0
-wing_loading = np.linspace(0,max_wing_loading,1000)
-
-# Enter Design Point Here
-TW_ratio_val = None # Enter the thrust to weight ratio of the design point given by A&P
-wing_loading_val = params['WTO_estimate']/(params['b']**2  / params['AR'])
-
-# Calculate constraints
-takeoff = takeoff_constraint(wing_loading)
-velocity = velocity_constraint(wing_loading)
-size = size_constraint(WTO_estimate)
-turn_radius = min_turn_radius_constraint()
-landing = landing_constraint()
-if min([size]) < min([turn_radius,landing]):
-    wing_loading_subset = np.linspace(size,min([turn_radius,landing]),1000)
-else:
-    wing_loading_subset = np.linspace(0,min([turn_radius,landing]),1000)
-    print("Size constraint violated. Design point not feasible.")
-takeoff_subset = takeoff_constraint(wing_loading_subset)
-velocity_subset = velocity_constraint(wing_loading_subset)
-min_takeoff_velocity = np.maximum(takeoff_subset,velocity_subset)
-
-
-# Create a sample plot
-plt.plot(wing_loading,takeoff, label='Takeoff (min)')
-plt.plot(wing_loading,velocity, label='Velocity (min)')
-if min([size]) > min([turn_radius,landing]):
-    plt.axvline(x=size, color='r', linestyle='--', label='Size VIOLATED (min)')
-else:
-    plt.axvline(x=size, color='r', linestyle='--', label='Size (min)')
-plt.axvline(x=turn_radius, color='b', linestyle='--', label='Turn Radius (max)')
-plt.axvline(x=landing, color='g', linestyle='--', label='Landing (max)')
-# Shade the feasible region
-plt.fill_between(wing_loading_subset, min_takeoff_velocity, max_tw_ratio, where=(min_takeoff_velocity <= max_tw_ratio), color='gray', alpha=0.5)
-# Plot the design point
-if (TW_ratio_val and wing_loading_val):
-    plt.scatter(wing_loading_val, TW_ratio_val, color='r', label='Design Point')
-elif (wing_loading_val):
-    plt.axvline(x=wing_loading_val, color='y', linestyle='-', label='Design Point')
-plt.ylim((0,max_tw_ratio))
-plt.xlim((0,max_wing_loading))
-plt.legend(loc='upper right')
-plt.xlabel('Wing Loading (lbs/ft^2)')
-plt.ylabel('Thrust to Weight Ratio')
-plt.title('Constraints Diagram')
-
-# Show the plot
-plt.show()
+# Coefficients of the T/W constraint curves: takeoff is k*W/S and velocity is A/(W/S) + B*W/S
+def curve_coeffs(params):
+    k = takeoff_constraint(1.0, params)
+    A = params['rho_alt']*params['CD0']*params['V_max']**2/2
+    B = 2/(params['rho_alt']*np.pi*params['e']*params['AR']*params['V_max']**2)
+    return k, A, B
 
+# Wing loading that minimizes max(takeoff, velocity), which is convex in W/S:
+# the velocity minimum, or the takeoff/velocity crossing if that comes first
+def unconstrained_optimum(k, A, B):
+    ws_velocity = np.sqrt(A/B)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ws_cross = np.where(k > B, np.sqrt(A/(k - B)), np.inf)
+    return np.minimum(ws_velocity, ws_cross), ws_cross
+
+# Wing loadings between ws_min and ws_max where both T/W curves are at or below max_tw_ratio
+# Returns the bounds and whether they hold a feasible interval; the bounds mean nothing where they do not
+def capped_bounds(ws_min, ws_max, k, A, B, max_tw_ratio):
+    disc = max_tw_ratio**2 - 4*A*B
+    root = np.sqrt(np.maximum(disc, 0))
+    lo = np.where(disc >= 0, np.maximum(ws_min, (max_tw_ratio - root)/(2*B)), ws_min)
+    hi = np.minimum(ws_max, max_tw_ratio/k)
+    hi = np.where(disc >= 0, np.minimum(hi, (max_tw_ratio + root)/(2*B)), hi)
+    return lo, hi, (disc >= 0) & (ws_min < ws_max) & (lo <= hi)
+
+# Evaluate all five constraints for many configurations in one broadcasted pass
+# Entries of params may be scalars or arrays; missing entries fall back to constraint_params
+# As in feasible_region, ws_min and ws_max are the wing loading limits and ws_lower and ws_upper bound the
+# feasible region, which also keeps T/W at or below max_tw_ratio; they are NaN where it is empty
+@instrumentation.timed('constraints.evaluate_constraints')
+def evaluate_constraints(params, max_tw_ratio=1.0):
+    params = {**default_params, **params}
+    p = {key: np.asarray(value, dtype=float) for key, value in params.items()}
+    # Feasible wing loading interval between the size and the turn radius / landing limits
+    ws_min = size_constraint(p['WTO_estimate'], p)
+    ws_max = np.minimum(min_turn_radius_constraint(p), landing_constraint(p))
+    k, A, B = curve_coeffs(p)
+    ws_lower, ws_upper, feasible = capped_bounds(ws_min, ws_max, k, A, B, max_tw_ratio)
+    ws_lower = np.where(feasible, ws_lower, np.nan)
+    ws_upper = np.where(feasible, ws_upper, np.nan)
+    # Clip the unconstrained minimum to the interval
+    ws_opt, _ = unconstrained_optimum(k, A, B)
+    ws_opt = np.clip(ws_opt, ws_min, np.maximum(ws_min, ws_max))
+    tw_min = np.maximum(takeoff_constraint(ws_opt, p), velocity_constraint(ws_opt, p))
+    ws_min, ws_max, ws_lower, ws_upper, ws_opt, tw_min, feasible = np.broadcast_arrays(ws_min, ws_max, ws_lower, ws_upper, ws_opt, tw_min, feasible)
+    return {
+        'ws_min': ws_min,
+        'ws_max': ws_max,
+        'ws_lower': ws_lower,
+        'ws_upper': ws_upper,
+        'ws_opt': ws_opt,
+        'tw_min': tw_min,
+        'feasible': feasible,
+    }
+
+# Exact feasible region of the constraint diagram for one configuration
+# The region is bounded by the wing loading limits, the max(takeoff, velocity) curve below and max_tw_ratio above.
+# Vertices run counter-clockwise from the lower left; between the first vertices the lower edge follows the
+# velocity curve up to the takeoff/velocity crossing and the takeoff line after it.
+@instrumentation.timed('constraints.feasible_region')
+def feasible_region(params=None, max_tw_ratio=1.0):
+    params = default_params if params is None else {**default_params, **params}
+    k, A, B = curve_coeffs(params)
+    ws_min = size_constraint(params['WTO_estimate'], params)
+    ws_max = min(min_turn_radius_constraint(params), landing_constraint(params))
+    lo, hi, feasible = capped_bounds(ws_min, ws_max, k, A, B, max_tw_ratio)
+    lo, hi = float(lo), float(hi)
+    region = {
+        'ws_min': ws_min,
+        'ws_max': ws_max,
+        'feasible': bool(feasible),
+        'ws_lower': np.nan,
+        'ws_upper': np.nan,
+        'ws_opt': np.nan,
+        'tw_min': np.nan,
+        'vertices': [],
+    }
+    if not region['feasible']:
+        return region
+
+    def tw(w):
+        return float(max(takeoff_constraint(w, params), velocity_constraint(w, params)))
+    ws_opt, ws_cross = unconstrained_optimum(k, A, B)
+    ws_opt = float(np.clip(ws_opt, lo, hi))
+    region['ws_lower'] = float(lo)
+    region['ws_upper'] = float(hi)
+    region['ws_opt'] = ws_opt
+    region['tw_min'] = tw(ws_opt)
+    vertices = [(lo, tw(lo))]
+    if lo < ws_cross < hi:
+        vertices.append((float(ws_cross), tw(ws_cross)))
+    vertices += [(hi, tw(hi)), (hi, max_tw_ratio), (lo, max_tw_ratio)]
+    # Drop repeated vertices where the curve meets max_tw_ratio at a limit
+    region['vertices'] = [v for i, v in enumerate(vertices) if i == 0 or not np.allclose(v, vertices[i-1])]
+    return region
+
+# Draw the constraints diagram with the feasible region shaded
+def draw_constraints(fig, wing_loading, takeoff, velocity, size, turn_radius, landing, wing_loading_subset, min_takeoff_velocity, wing_loading_val, TW_ratio_val, max_wing_loading, max_tw_ratio):
+    ax = fig.add_subplot()
+    ax.plot(wing_loading,takeoff, label='Takeoff (min)')
+    ax.plot(wing_loading,velocity, label='Velocity (min)')
+    if min([size]) > min([turn_radius,landing]):
+        ax.axvline(x=size, color='r', linestyle='--', label='Size VIOLATED (min)')
+    else:
+        ax.axvline(x=size, color='r', linestyle='--', label='Size (min)')
+    ax.axvline(x=turn_radius, color='b', linestyle='--', label='Turn Radius (max)')
+    ax.axvline(x=landing, color='g', linestyle='--', label='Landing (max)')
+    # Shade the feasible region
+    ax.fill_between(wing_loading_subset, min_takeoff_velocity, max_tw_ratio, where=(min_takeoff_velocity <= max_tw_ratio), color='gray', alpha=0.5)
+    # Plot the design point
+    if (TW_ratio_val and wing_loading_val):
+        ax.scatter(wing_loading_val, TW_ratio_val, color='r', label='Design Point')
+    elif (wing_loading_val):
+        ax.axvline(x=wing_loading_val, color='y', linestyle='-', label='Design Point')
+    ax.set_ylim((0,max_tw_ratio))
+    ax.set_xlim((0,max_wing_loading))
+    ax.legend(loc='upper right')
+    ax.set_xlabel('Wing Loading (lbs/ft^2)')
+    ax.set_ylabel('Thrust to Weight Ratio')
+    ax.set_title('Constraints Diagram')
+
+# Plot the constraints diagram with the feasible region shaded
+# Shown on screen, or rendered to out (.png, .svg or .pdf), in the background when a renderer is given
+def plot_constraints(wing_loading, takeoff, velocity, size, turn_radius, landing, wing_loading_subset, min_takeoff_velocity, wing_loading_val, TW_ratio_val, max_wing_loading, max_tw_ratio, out=None, max_points=None, renderer=None):
+    wing_loading, takeoff, velocity = rendering.downsample(max_points, wing_loading, takeoff, velocity)
+    wing_loading_subset, min_takeoff_velocity = rendering.downsample(max_points, wing_loading_subset, min_takeoff_velocity)
+    return rendering.render(draw_constraints, (wing_loading, takeoff, velocity, size, turn_radius, landing, wing_loading_subset, min_takeoff_velocity, wing_loading_val, TW_ratio_val, max_wing_loading, max_tw_ratio), out, renderer)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Constraint diagram for the aircraft in constraint_params.')
+    parser.add_argument('--no-plot', action='store_true', help='print the exact feasible region without plotting')
+    rendering.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.from_args(args):
+        params = default_params
+        # Plot inputs
+        WTO_estimate = params['WTO_estimate']
+        max_wing_loading = 5.0
+        max_tw_ratio = 1.0
+
+        # Exact feasible region
+        region = feasible_region(params, max_tw_ratio)
+        if region['feasible']:
+            print("Feasible wing loading: {:.4f} to {:.4f} lbs/ft^2".format(region['ws_lower'], region['ws_upper']))
+            print("Minimum T/W: {:.4f} at W/S = {:.4f} lbs/ft^2".format(region['tw_min'], region['ws_opt']))
+        if args.no_plot:
+            if not region['feasible']:
+                print("No feasible design point.")
+            return
+
+        wing_loading = np.linspace(0,max_wing_loading,1000)
+
+        # Enter Design Point Here
+        TW_ratio_val = None # Enter the thrust to weight ratio of the design point given by A&P
+        wing_loading_val = params['WTO_estimate']/(params['b']**2  / params['AR'])
+
+        # Calculate constraints
+        with np.errstate(divide='ignore'):
+            takeoff = takeoff_constraint(wing_loading)
+            velocity = velocity_constraint(wing_loading)
+        size = size_constraint(WTO_estimate)
+        turn_radius = min_turn_radius_constraint()
+        landing = landing_constraint()
+        if min([size]) < min([turn_radius,landing]):
+            wing_loading_subset = np.linspace(size,min([turn_radius,landing]),1000)
+        else:
+            wing_loading_subset = np.linspace(0,min([turn_radius,landing]),1000)
+            print("Size constraint violated. Design point not feasible.")
+        takeoff_subset = takeoff_constraint(wing_loading_subset)
+        velocity_subset = velocity_constraint(wing_loading_subset)
+        min_takeoff_velocity = np.maximum(takeoff_subset,velocity_subset)
+
+        plot_constraints(wing_loading, takeoff, velocity, size, turn_radius, landing, wing_loading_subset, min_takeoff_velocity, wing_loading_val, TW_ratio_val, max_wing_loading, max_tw_ratio, args.plot_out, args.max_points)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import numpy as np
+from constraint_params import params as constraint_defaults
+from constraints import landing_constraint, min_turn_radius_constraint, takeoff_constraint, velocity_constraint
+from design_graph import DependencyGraph
+import hstab_params
+from hstab_sizing import TW_req, sweep_grid, trim_aerodynamics
+import instrumentation
+import weight_est
+
+# Coupled sizing of the takeoff weight, design point and h-stab
+# The wing span and aspect ratio in constraint_params fix the wing area, so the takeoff weight sets W/S.
+# T/W is the largest of the design T/W, the constraint diagram at that W/S and the trimmed cruise requirement
+# of the tail, and the weight closure at that T/W gives the next takeoff weight.
+coupled_params = {
+    'Endurance': weight_est.constraint_params['endurance'], # hrs
+    # The EDF database starts near 4 lbs of thrust, so the weight closure has no fixed point
+    # in the weight range below T/W of about 0.7; the design value sets the floor
+    'T/W': hstab_params.design_params['T/W'], # unitless
+    'tw_margin': 0.02, # T/W kept above the tail's trimmed cruise requirement, as a fraction of it
+    'max_tw_ratio': 1.0, # unitless
+    'WTO_lower': 1, # lbs
+    'WTO_upper': 50, # lbs
+}
+
+# Tail geometry and aerodynamics on the sweep grid; none of it depends on T/W, W/S or the weight
+def tail_grid(params, num_lh, num_aoa):
+    lh_arr, aoa_arr = sweep_grid(params, num_lh, num_aoa)
+    lh, aoa_trim = np.meshgrid(lh_arr, aoa_arr, indexing='ij')
+    bh, CLCruise, aoa_L_TO, CD_CL_0, sm = trim_aerodynamics(lh, aoa_trim, params)
+    # Every verify check except T/W, which the design point is raised to meet
+    candidates = (bh >= params['bh_range'][0]) & (bh <= params['bh_range'][1]) & (CLCruise > params['CLCruise']) \
+        & (aoa_L_TO > params['aoa_L/TO_range'][0]) & (aoa_L_TO < params['aoa_L/TO_range'][1])
+    return {
+        'lh': lh[candidates], 'aoa_trim': aoa_trim[candidates], 'bh': bh[candidates],
+        'aoa_L_TO': aoa_L_TO[candidates], 'CD_CL_0': CD_CL_0[candidates], 'SM': sm[candidates],
+    }
+
+# Tail with the lowest trimmed cruise T/W requirement at this wing loading
+def select_tail(grid, wing_loading, params):
+    if len(grid['lh']) == 0:
+        raise ValueError("No tail on the sweep grid passes the bh, cruise CL and takeoff/landing aoa checks")
+    TW = TW_req(grid['CD_CL_0'], {**params, 'W/S': wing_loading})
+    i = int(np.argmin(TW))
+    return {'lh': grid['lh'][i], 'bh': grid['bh'][i], 'aoa_trim': grid['aoa_trim'][i], 'aoa_L/TO': grid['aoa_L_TO'][i], 'SM': grid['SM'][i], 'TW_req': TW[i]}
+
+# Constraint diagram at the design wing loading
+def design_constraints(WTO, wing_loading, params, max_tw_ratio):
+    ws_max = min(min_turn_radius_constraint(params), landing_constraint(params))
+    tw = max(takeoff_constraint(wing_loading, params), velocity_constraint(wing_loading, params))
+    return {'ws_max': ws_max, 'tw_constraint': tw, 'feasible': params['b'] <= params['b_max'] and wing_loading <= ws_max and tw <= max_tw_ratio}
+
+# Memoized graph of the coupled analyses; WTO is the iterated input
+# Changing a parameter set before another solve only recomputes what depends on it; the tail grid,
+# which is the only expensive piece, depends on the h-stab parameters alone
+def coupled_graph(constraint_params=None, design_params=None, params=None, WTO=None, num_lh=1001, num_aoa=11):
+    constraint_params = constraint_defaults if constraint_params is None else constraint_params
+    params = {**coupled_params, **(params or {})}
+    graph = DependencyGraph()
+    graph.add_input('constraint_params', dict(constraint_params))
+    graph.add_input('hstab_params', hstab_params.get_params() if design_params is None else {**hstab_params.get_params(), **design_params})
+    graph.add_input('params', params)
+    graph.add_input('tail_grid_size', (num_lh, num_aoa))
+    graph.add_input('WTO', float(constraint_params['WTO_estimate'] if WTO is None else WTO))
+
+    graph.add_node('tail_grid', ['hstab_params', 'tail_grid_size'], lambda h, size: tail_grid(h, *size))
+    graph.add_node('W/S', ['WTO', 'constraint_params'], lambda WTO, c: WTO / (c['b']**2 / c['AR']))
+    graph.add_node('constraints', ['WTO', 'W/S', 'constraint_params', 'params'], lambda WTO, ws, c, p: design_constraints(WTO, ws, c, p['max_tw_ratio']))
+    graph.add_node('tail', ['tail_grid', 'W/S', 'hstab_params'], select_tail)
+    graph.add_node('T/W', ['constraints', 'tail', 'params'], lambda c, tail, p: max(p['T/W'], c['tw_constraint'], tail['TW_req'] * (1 + p['tw_margin'])))
+    # Warm started from the current takeoff weight, which only moves the starting point, not the result
+    graph.add_node('weight', ['T/W', 'params', 'WTO'], weight_closure)
+    return graph
+
+# Converged takeoff weight closure at this T/W, from the warm start guess
+def weight_closure(TW, params, guess):
+    guess = min(max(guess, params['WTO_lower']), params['WTO_upper'])
+    result, info = weight_est.weight_estimate(TW, params['Endurance'], guess, params['WTO_lower'], params['WTO_upper'],
+                                              method='newton', rtol=1e-10, return_info=True)
+    if result is None:
+        raise ValueError("Weight closure has no solution between {} and {} lbs at T/W = {:.4f}".format(params['WTO_lower'], params['WTO_upper'], TW))
+    return {'WTO': float(result[0]), 'W_motor': float(result[1]), 'W_battery': float(result[2]), 'Power': float(result[3]), 'iterations': info['iterations']}
+
+# Fixed-point iteration of the takeoff weight across the three analyses
+# Each step is a secant step on WTO - closure(WTO) once two iterates exist, which the closure's
+# smooth dependence on T/W makes safe; returns the design and the per-iteration history
+# The design is the last evaluated iterate. When the weight closure has no solution at an iterate
+# (T/W too low for the motor data), the design is not converged, has no weight and 'error' says why.
+@instrumentation.timed('coupled_sizing.coupled_solve')
+def coupled_solve(graph=None, rtol=1e-8, max_iter=50):
+    graph = coupled_graph() if graph is None else graph
+    history = []
+    WTO = graph.get('WTO')
+    previous = None
+    closure = None
+    error = None
+    converged = False
+    for iteration in range(1, max_iter + 1):
+        graph.set('WTO', WTO)
+        TW = graph.get('T/W')
+        try:
+            closure = graph.get('weight')
+        except ValueError as e:
+            closure = None
+            error = str(e)
+            break
+        residual = WTO - closure['WTO']
+        history.append({'WTO': WTO, 'W/S': graph.get('W/S'), 'T/W': TW, 'WTO_closure': closure['WTO'], 'closure_iterations': closure['iterations']})
+        converged = abs(residual) <= rtol * abs(WTO)
+        if converged or iteration == max_iter:
+            break
+        step = closure['WTO']
+        if previous is not None and residual != previous[1]:
+            step = WTO - residual * (WTO - previous[0]) / (residual - previous[1])
+        previous = (WTO, residual)
+        WTO = step
+    instrumentation.observe('coupled_solve iterations', iteration)
+    return {
+        'converged': converged,
+        'error': error,
+        'iterations': iteration,
+        'WTO': WTO,
+        'W/S': graph.get('W/S'),
+        'T/W': graph.get('T/W'),
+        'constraints': graph.get('constraints'),
+        'tail': graph.get('tail'),
+        'weight': closure,
+    }, history
+
+def print_design(design, history):
+    print("Converged: {} after {} iterations".format(design['converged'], design['iterations']))
+    if design['error'] is not None:
+        print("Stopped: {}".format(design['error']))
+    print("{:>4} {:>12} {:>10} {:>10} {:>12}".format('it', 'WTO (lbs)', 'W/S', 'T/W', 'closure'))
+    for k, h in enumerate(history):
+        print("{:>4} {:>12.6f} {:>10.6f} {:>10.6f} {:>12.6f}".format(k + 1, h['WTO'], h['W/S'], h['T/W'], h['WTO_closure']))
+    print("\nTakeoff Weight: {:.4f} lbs".format(design['WTO']))
+    print("Wing Loading: {:.4f} lbs/ft^2".format(design['W/S']))
+    print("Thrust-to-Weight Ratio: {:.4f} (constraints {:.4f}, tail {:.4f})".format(design['T/W'], design['constraints']['tw_constraint'], design['tail']['TW_req']))
+    print("Constraint diagram feasible: {}".format(design['constraints']['feasible']))
+    if design['weight'] is not None:
+        print("Motor Weight: {:.4f} lbs".format(design['weight']['W_motor']))
+        print("Battery Weight: {:.4f} lbs".format(design['weight']['W_battery']))
+        print("Power: {:.2f} W".format(design['weight']['Power']))
+    tail = design['tail']
+    print("H-stab: lh {:.4f} ft, bh {:.4f} ft, aoa_trim {:.2f} deg, SM {:.4f}".format(tail['lh'], tail['bh'], tail['aoa_trim'], tail['SM']))
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Coupled sizing of the takeoff weight, design point and h-stab.')
+    parser.add_argument('--tw', type=float, default=coupled_params['T/W'], help='design thrust-to-weight ratio, raised when a requirement is higher')
+    parser.add_argument('--endurance', type=float, default=coupled_params['Endurance'], help='endurance (hrs)')
+    parser.add_argument('--tw-margin', type=float, default=coupled_params['tw_margin'], help="T/W margin over the tail's trimmed cruise requirement")
+    parser.add_argument('--wto', type=float, default=None, help='starting takeoff weight (lbs), WTO_estimate by default')
+    parser.add_argument('--rtol', type=float, default=1e-8, help='relative tolerance on the takeoff weight')
+    parser.add_argument('--max-iter', type=int, default=50, help='largest number of coupled iterations')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.from_args(args):
+        graph = coupled_graph(params={'T/W': args.tw, 'Endurance': args.endurance, 'tw_margin': args.tw_margin}, WTO=args.wto)
+        try:
+            design, history = coupled_solve(graph, args.rtol, args.max_iter)
+        except ValueError as error:
+            parser.exit(1, "Coupled sizing failed: {}\n".format(error))
+        print_design(design, history)
+
+if __name__ == '__main__':
+    main()
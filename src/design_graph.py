@@ -0,0 +1,159 @@
+import numpy as np
+import instrumentation
+import hstab_params
+from hstab_sizing import calculate_bh, evaluate_grid, evaluate_points, sweep_grid
+import stability_params
+from stability_coeffs import stability_coefficients
+
+# Check whether a new input value equals the stored one, for scalars and arrays
+def unchanged(old, new):
+    try:
+        return bool(np.array_equal(old, new)) if isinstance(old, np.ndarray) or isinstance(new, np.ndarray) else bool(old == new)
+    except (TypeError, ValueError):
+        return False
+
+# Inputs and derived quantities with memoized values
+# Setting an input drops the memoized values downstream of it; they are recomputed on the next get
+class DependencyGraph:
+    def __init__(self):
+        self.functions = {} # name -> (function or None for inputs, dependencies)
+        self.dependents = {} # name -> names computed directly from it
+        self.values = {}
+        self.computations = 0
+
+    def add_input(self, name, value):
+        self.functions[name] = (None, ())
+        self.dependents.setdefault(name, set())
+        self.values[name] = value
+
+    # fn is called with the values of deps in order
+    def add_node(self, name, deps, fn):
+        for dep in deps:
+            if dep not in self.functions:
+                raise ValueError("Unknown dependency '{}' of '{}'".format(dep, name))
+        self.functions[name] = (fn, tuple(deps))
+        self.dependents.setdefault(name, set())
+        for dep in deps:
+            self.dependents[dep].add(name)
+
+    def get(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name not in self.functions:
+            raise ValueError("Unknown quantity '{}'".format(name))
+        fn, deps = self.functions[name]
+        value = fn(*[self.get(dep) for dep in deps])
+        self.values[name] = value
+        self.computations += 1
+        instrumentation.count('DependencyGraph.compute')
+        return value
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def set(self, name, value):
+        if name not in self.functions:
+            raise ValueError("Unknown input '{}'".format(name))
+        if self.functions[name][0] is not None:
+            raise ValueError("'{}' is derived and cannot be set".format(name))
+        if unchanged(self.values[name], value):
+            return
+        self.values[name] = value
+        # A memoized value always has memoized dependencies, so the walk can stop at values already dropped
+        stack = list(self.dependents[name])
+        while stack:
+            node = stack.pop()
+            if node in self.values:
+                del self.values[node]
+                stack.extend(self.dependents[node])
+
+    # Set several inputs, given as a dict since names like 'T/W' are not identifiers
+    def update(self, changes):
+        for name, value in changes.items():
+            self.set(name, value)
+
+    def inputs(self):
+        return [name for name, (fn, _) in self.functions.items() if fn is None]
+
+# Parameters read by each h-stab function, so a change only reaches the functions that use it
+# calculate_bh gets e0 and deda from their own nodes; the fitted coefficients come from the hstab_fit nodes
+bh_keys = ['ARh', 'S', 'MAC', 'Cmacwf', 'SM_wing', 'CL0wf', 'CLawf', 'CL0h', 'CLah']
+point_keys = bh_keys + ['AR', 'zh', 'x_acwf', 'e', 'rho_alt', 'Vmax', 'W/S', 'T/W', 'CLCruise', 'CLmaxL/TO', 'bh_range', 'aoa_L/TO_range', 'polar_speed']
+sweep_keys = point_keys + ['lh_range', 'aoa_trim_range']
+
+# Node holding the dict of the given inputs and nodes
+def add_params_node(graph, name, keys):
+    graph.add_node(name, keys, lambda *values: dict(zip(keys, values)))
+
+# Graph of the h-stab and stability quantities
+# Both parameter sets share one namespace: their common entries (AR, S, MAC, e, SM_wing, zh, ARh) describe the same aircraft.
+# The design point lh and aoa_trim of stability_params also place the h-stab design point, and the stability
+# coefficients use the tail sized there: bh is bh_trim and Sh = bh^2/ARh, in place of the stability_params inputs.
+def sizing_graph():
+    graph = DependencyGraph()
+    stability_keys = list(stability_params.params)
+    for name, value in {**stability_params.params, **hstab_params.design_params}.items():
+        if name not in ('bh', 'Sh'):
+            graph.add_input(name, value)
+
+    # H-stab sizing
+    graph.add_node('hstab_fit', [], hstab_params.flight_surface_coeffs)
+    for name in ('CL0wf', 'CL0wf_flaps', 'CL0h', 'CLawf', 'CLawf_flaps', 'CLah'):
+        graph.add_node(name, ['hstab_fit'], lambda fit, name=name: fit[name])
+    add_params_node(graph, 'bh_params', bh_keys)
+    add_params_node(graph, 'point_params', point_keys)
+    add_params_node(graph, 'hstab_params', sweep_keys)
+    graph.add_node('e0', ['CL0wf', 'AR', 'lh', 'zh'], lambda CL0wf, AR, lh, zh: 2 * CL0wf / (np.pi * AR) * (lh / np.sqrt(lh**2 + zh**2)))
+    graph.add_node('deda', ['CLawf', 'AR', 'lh', 'zh'], lambda CLawf, AR, lh, zh: 2 * CLawf / (np.pi * AR) * (lh / np.sqrt(lh**2 + zh**2)))
+    graph.add_node('bh_trim', ['lh', 'aoa_trim', 'bh_params', 'e0', 'deda'], lambda lh, aoa_trim, params, e0, deda: calculate_bh(lh, aoa_trim, params, (e0, deda)))
+    graph.add_node('design_point', ['lh', 'aoa_trim', 'point_params'], evaluate_points)
+    graph.add_node('verified', ['design_point'], lambda point: bool(np.logical_and.reduce(list(point[0].values()))))
+    graph.add_node('hstab_sweep', ['hstab_params'], lambda params: evaluate_grid(*sweep_grid(params), params))
+
+    # Stability coefficients
+    graph.add_node('bh', ['bh_trim'], lambda bh: bh)
+    graph.add_node('Sh', ['bh', 'ARh'], lambda bh, ARh: bh**2 / ARh)
+    graph.add_node('stability_fit', [], stability_params.polar_coeffs)
+    graph.add_node('trim_coeffs', ['stability_fit', 'aoa_trim'], stability_params.trim_coeffs)
+    graph.add_node('stability_params', stability_keys, lambda *values: dict(zip(stability_keys, values)))
+    graph.add_node('surface_coeffs', ['stability_params', 'trim_coeffs'], stability_params.surface_coeffs)
+    graph.add_node('stability_coefficients', ['stability_params', 'surface_coeffs'], lambda params, surfaces: stability_coefficients(params, *surfaces))
+    return graph
+
+# Parse NAME=VALUE, with VALUE a Python literal
+def parse_assignment(text):
+    import ast
+    name, _, value = text.partition('=')
+    try:
+        return name, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        raise ValueError("Cannot parse the value of '{}'".format(text))
+
+def main():
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Recompute only the sizing quantities affected by input changes.')
+    parser.add_argument('changes', nargs='*', help='NAME=VALUE input changes applied one after another')
+    parser.add_argument('--show', nargs='+', default=['bh_trim', 'verified', 'e0', 'deda', 'stability_coefficients'], help='quantities to print after each change')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.from_args(args):
+        graph = sizing_graph()
+        start = time.perf_counter()
+        values = {name: graph.get(name) for name in args.show}
+        print("Initial evaluation: {} quantities in {:.3f} ms".format(graph.computations, (time.perf_counter() - start) * 1e3))
+        for name, value in values.items():
+            print("  {}: {}".format(name, value))
+        for change in args.changes:
+            name, value = parse_assignment(change)
+            computations = graph.computations
+            start = time.perf_counter()
+            graph.set(name, value)
+            values = {name: graph.get(name) for name in args.show}
+            print("\n{}: {} quantities recomputed in {:.3f} ms".format(change, graph.computations - computations, (time.perf_counter() - start) * 1e3))
+            for name, value in values.items():
+                print("  {}: {}".format(name, value))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import numpy as np
+import instrumentation
+from hstab_params import get_params
+from hstab_sizing import evaluate_points, sweep_grid, solution_columns
+
+# Adaptive sampling of the lh x aoa_trim grid
+# Starts from a coarse sub-grid and only splits cells whose corners disagree on a verify criterion
+# (bh_range limits, cruise CL, aoa_L/TO window or T/W), down to the spacing of the full grid.
+# Cells whose corners agree take the corner verdict without being evaluated inside.
+# A grid with a single point on either axis has no cells, so every point is evaluated.
+def adaptive_grid(lh_arr, aoa_arr, params, coarse_points=(17, 3)):
+    lh_arr = np.asarray(lh_arr, dtype=float)
+    aoa_arr = np.asarray(aoa_arr, dtype=float)
+    n_lh, n_aoa = len(lh_arr), len(aoa_arr)
+    # Criterion states packed into one code per grid point, -1 while unevaluated
+    state = np.full((n_lh, n_aoa), -1, dtype=np.int16)
+    evaluated = {col: [] for col in solution_columns}
+    evaluated_verified = []
+
+    def evaluate(i, j):
+        # Evaluate only the points not seen yet
+        new = state[i, j] < 0
+        i, j = i[new], j[new]
+        if i.size == 0:
+            return
+        # Corners shared by several cells appear more than once
+        flat = np.unique(i * n_aoa + j)
+        i, j = flat // n_aoa, flat % n_aoa
+        checks, data = evaluate_points(lh_arr[i], aoa_arr[j], params)
+        code = np.zeros(i.size, dtype=np.int16)
+        for bit, passed in enumerate(checks.values()):
+            code |= passed.astype(np.int16) << bit
+        state[i, j] = code
+        for col in solution_columns:
+            evaluated[col].append(data[col])
+        evaluated_verified.append(np.logical_and.reduce(list(checks.values())))
+
+    # Coarse starting grid, always including the last point on each axis
+    def coarse(n, points):
+        step = max(1, (n - 1) // max(1, points - 1))
+        return np.unique(np.r_[np.arange(0, n, step), n - 1])
+    ci, cj = coarse(n_lh, coarse_points[0]), coarse(n_aoa, coarse_points[1])
+    i0, j0 = np.meshgrid(ci[:-1], cj[:-1], indexing='ij')
+    i1, j1 = np.meshgrid(ci[1:], cj[1:], indexing='ij')
+    cells = np.stack([i0.ravel(), i1.ravel(), j0.ravel(), j1.ravel()])
+    if min(n_lh, n_aoa) < 2:
+        i, j = np.meshgrid(np.arange(n_lh), np.arange(n_aoa), indexing='ij')
+        evaluate(i.ravel(), j.ravel())
+
+    # Uniform cells are filled through a 2-D difference array
+    fill = np.zeros((n_lh + 1, n_aoa + 1), dtype=np.int32)
+    full_code = (1 << 6) - 1
+    levels = 0
+    while cells.shape[1]:
+        levels += 1
+        i0, i1, j0, j1 = cells
+        evaluate(np.r_[i0, i0, i1, i1], np.r_[j0, j1, j0, j1])
+        corners = np.stack([state[i0, j0], state[i0, j1], state[i1, j0], state[i1, j1]])
+        mixed = (corners != corners[0]).any(axis=0)
+
+        uniform = ~mixed & (corners[0] == full_code)
+        np.add.at(fill, (i0[uniform], j0[uniform]), 1)
+        np.add.at(fill, (i1[uniform] + 1, j0[uniform]), -1)
+        np.add.at(fill, (i0[uniform], j1[uniform] + 1), -1)
+        np.add.at(fill, (i1[uniform] + 1, j1[uniform] + 1), 1)
+
+        # Split mixed cells along every axis still wider than one grid step
+        i0, i1, j0, j1 = cells[:, mixed]
+        split_i = i1 - i0 > 1
+        split_j = j1 - j0 > 1
+        im = np.where(split_i, (i0 + i1) // 2, i1)
+        jm = np.where(split_j, (j0 + j1) // 2, j1)
+        children = [
+            np.stack([i0, im, j0, jm])[:, split_i | split_j],
+            np.stack([im, i1, j0, jm])[:, split_i],
+            np.stack([i0, im, jm, j1])[:, split_j],
+            np.stack([im, i1, jm, j1])[:, split_i & split_j],
+        ]
+        cells = np.concatenate(children, axis=1)
+
+    instrumentation.observe('adaptive_grid levels', levels)
+    verified = np.cumsum(np.cumsum(fill, axis=0), axis=1)[:n_lh, :n_aoa] > 0
+    seen = state >= 0
+    verified[seen] = state[seen] == full_code
+    return {
+        'verified': verified,
+        'evaluations': int(seen.sum()),
+        'levels': levels,
+        'evaluated': {col: np.concatenate(v) if v else np.empty(0) for col, v in evaluated.items()},
+        'evaluated_verified': np.concatenate(evaluated_verified) if evaluated_verified else np.empty(0, dtype=bool),
+    }
+
+def main():
+    import argparse
+    from hstab_sizing import evaluate_grid
+    parser = argparse.ArgumentParser(description='Adaptive h-stab sweep refined around the feasibility boundary.')
+    parser.add_argument('--num-lh', type=int, default=1001, help='number of lh points of the finest grid')
+    parser.add_argument('--num-aoa', type=int, default=11, help='number of aoa_trim points of the finest grid')
+    parser.add_argument('--coarse-lh', type=int, default=17, help='lh points of the starting grid')
+    parser.add_argument('--coarse-aoa', type=int, default=3, help='aoa_trim points of the starting grid')
+    parser.add_argument('--check', action='store_true', help='compare against the full grid')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.from_args(args):
+
+        params = get_params()
+        lh_arr, aoa_arr = sweep_grid(params, args.num_lh, args.num_aoa)
+        result = adaptive_grid(lh_arr, aoa_arr, params, (args.coarse_lh, args.coarse_aoa))
+        total = len(lh_arr) * len(aoa_arr)
+        print("Model evaluations: {} of {} grid points ({:.1%}), {} refinement levels".format(
+            result['evaluations'], total, result['evaluations'] / total, result['levels']))
+        print("Verified grid points: {}".format(int(result['verified'].sum())))
+        if args.check:
+            verified, _ = evaluate_grid(lh_arr, aoa_arr, params)
+            print("Points classified differently from the full grid: {}".format(int((verified != result['verified']).sum())))
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
-import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
+from coeff_cache import cached_coeffs
+import instrumentation
 
 # Function to remove whitespace from DataFrame
 def remove_whitespace(df):
@@ -9,20 +9,66 @@ def remove_whitespace(df):
         df[col] = df[col].str.strip()  # Strip whitespace from string data
     return df
 
-# Import CSV data
-wing_flap_data = pd.read_csv('data/polars/Wing-Flap.csv')
-wing_data = pd.read_csv('data/polars/Wing.csv')
-hstab_data = pd.read_csv('data/polars/Hstab.csv')
+# Polar data, lookup tables and fitted parameters, built on first use
+cache = {}
+
+polar_files = {
+    'wing_flap_data': 'data/polars/Wing-Flap.csv',
+    'wing_data': 'data/polars/Wing.csv',
+    'hstab_data': 'data/polars/Hstab.csv',
+}
+
+# Bump when the coefficient fits change so cached values are rebuilt
+FIT_VERSION = 1
+
+# Import CSV data and build the lookup tables
+@instrumentation.timed('hstab_params.load_polars')
+def load_polars():
+    if 'polars' not in cache:
+        import pandas as pd
+        from polar_tables import PolarTable
+        wing_flap_data = pd.read_csv(polar_files['wing_flap_data'])
+        wing_data = pd.read_csv(polar_files['wing_data'])
+        hstab_data = pd.read_csv(polar_files['hstab_data'])
+        cache['polars'] = {
+            'wing_flap_data': wing_flap_data,
+            'wing_data': wing_data,
+            'hstab_data': hstab_data,
+            # Sorted lookup tables for the polars
+            'wing_flap_polar': PolarTable(wing_flap_data),
+            'wing_polar': PolarTable(wing_data),
+            'hstab_polar': PolarTable(hstab_data),
+        }
+    return cache['polars']
 
 # Get the coefficients
-CL0wf = wing_data.loc[wing_data['alpha'] == 0, 'CL'].values[0]
-CL0wf_flaps = wing_flap_data.loc[wing_flap_data['alpha'] == 0, 'CL'].values[0]
-CL0h = hstab_data.loc[hstab_data['alpha'] == 0, 'CL'].values[0]
-CLawf = LinearRegression().fit(wing_data['alpha'].values.reshape(-1, 1), wing_data['CL'].values).coef_[0] * (360/(2*np.pi))
-CLawf_flaps = LinearRegression().fit(wing_flap_data['alpha'].values.reshape(-1, 1), wing_flap_data['CL'].values).coef_[0] * (360/(2*np.pi))
-CLah = LinearRegression().fit(hstab_data['alpha'].values.reshape(-1, 1), hstab_data['CL'].values).coef_[0] * (360/(2*np.pi))
-
-params = {
+@instrumentation.timed('hstab_params.fit_flight_surface_coeffs')
+def fit_flight_surface_coeffs():
+    from sklearn.linear_model import LinearRegression
+    polars = load_polars()
+    wing_flap_data = polars['wing_flap_data']
+    wing_data = polars['wing_data']
+    hstab_data = polars['hstab_data']
+    CL0wf = wing_data.loc[wing_data['alpha'] == 0, 'CL'].values[0]
+    CL0wf_flaps = wing_flap_data.loc[wing_flap_data['alpha'] == 0, 'CL'].values[0]
+    CL0h = hstab_data.loc[hstab_data['alpha'] == 0, 'CL'].values[0]
+    CLawf = LinearRegression().fit(wing_data['alpha'].values.reshape(-1, 1), wing_data['CL'].values).coef_[0] * (360/(2*np.pi))
+    CLawf_flaps = LinearRegression().fit(wing_flap_data['alpha'].values.reshape(-1, 1), wing_flap_data['CL'].values).coef_[0] * (360/(2*np.pi))
+    CLah = LinearRegression().fit(hstab_data['alpha'].values.reshape(-1, 1), hstab_data['CL'].values).coef_[0] * (360/(2*np.pi))
+    return {
+        'CL0wf': CL0wf,
+        'CL0wf_flaps': CL0wf_flaps,
+        'CL0h': CL0h,
+        'CLawf': CLawf,
+        'CLawf_flaps': CLawf_flaps,
+        'CLah': CLah,
+    }
+
+# Coefficients from the on-disk cache, refitted only when a polar file changes
+def flight_surface_coeffs():
+    return cached_coeffs('hstab_params', list(polar_files.values()), {'version': FIT_VERSION}, fit_flight_surface_coeffs)
+
+design_params = {
     # Constraints
     'T/W': 0.75, # unitless
     'W/S': 1.875, # lbf/ft^2
@@ -46,11 +92,41 @@ params = {
     'bh_range': (1.0, 4.0), # ft
     'zh': 1.5, # ft
     # Flight Surface Coefficients
-    'CL0wf': CL0wf,
-    'CL0wf_flaps': CL0wf_flaps,
-    'CL0h': CL0h,
-    'CLawf': CLawf,
-    'CLawf_flaps': CLawf_flaps,
-    'CLah': CLah,
     'Cmacwf': -0.12306, # FIND MANUALLY
-}
\ No newline at end of file
+    # Polar speed (ft/s) looked up in the polar store, None for the single-speed CSV polars
+    'polar_speed': None,
+}
+
+# Design parameters together with the fitted flight surface coefficients
+# Each call returns a new dict, so a caller that edits its parameters does not change them for later callers
+def get_params():
+    if 'params' not in cache:
+        cache['params'] = {**design_params, **flight_surface_coeffs()}
+    return dict(cache['params'])
+
+# Exported polars ingested into the binary polar store, at any number of speeds
+polar_store_sources = 'data/polars/*.csv'
+
+# Lookup tables for the polars
+# With a speed (ft/s, like Vmax) they come from the polar store, interpolated between the stored speeds
+def get_polars(speed=None):
+    if speed is None:
+        polars = load_polars()
+        return polars['wing_flap_polar'], polars['wing_polar'], polars['hstab_polar']
+    key = ('polars_at', float(speed))
+    if key not in cache:
+        if 'store' not in cache:
+            import glob
+            from polar_store import open_store
+            cache['store'] = open_store(glob.glob(polar_store_sources))
+        store = cache['store']
+        cache[key] = (store.polar_table('Wing', speed, flap=True), store.polar_table('Wing', speed), store.polar_table('Hstab', speed))
+    return cache[key]
+
+# Build params and the polar data on first access as module attributes
+def __getattr__(name):
+    if name == 'params':
+        return get_params()
+    if name in ('wing_flap_data', 'wing_data', 'hstab_data', 'wing_flap_polar', 'wing_polar', 'hstab_polar'):
+        return load_polars()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,179 @@
+import numpy as np
+import instrumentation
+from hstab_params import get_params
+from hstab_sizing import evaluate_grid, evaluate_points, solution_columns, sweep_grid
+
+# Pareto-front search over continuous lh and aoa_trim, with bh following from the trim condition
+# Objectives are solution columns, minimized unless given as 'column:max'
+default_objectives = ['bh (ft)', 'T/W_req', 'SM:max']
+
+# Column and sign of each objective, so every objective is minimized
+def parse_objectives(objectives):
+    parsed = []
+    for objective in objectives:
+        column, _, sense = objective.partition(':')
+        if column not in solution_columns:
+            raise ValueError("Unknown objective '{}', expected one of {}".format(column, solution_columns))
+        if sense not in ('', 'min', 'max'):
+            raise ValueError("Unknown objective sense '{}', expected 'min' or 'max'".format(sense))
+        parsed.append((column, -1.0 if sense == 'max' else 1.0))
+    return parsed
+
+# Evaluate a population of (lh, aoa_trim) points; returns the objective matrix, the number of failed
+# verify checks of each point (0 when feasible) and the solution columns
+def evaluate_population(x, params, objectives):
+    checks, data = evaluate_points(x[:, 0], x[:, 1], params)
+    violations = np.sum([~passed for passed in checks.values()], axis=0)
+    f = np.column_stack([sign * data[column] for column, sign in objectives])
+    # Infeasible points are only compared by their violations
+    f[violations > 0] = np.inf
+    return f, violations, data
+
+# Constrained domination matrix: d[i, j] when point i dominates point j
+# Fewer failed checks dominate; feasible points dominate in the Pareto sense
+def domination(f, violations):
+    better = (f[:, None, :] <= f[None, :, :]).all(axis=2) & (f[:, None, :] < f[None, :, :]).any(axis=2)
+    feasible = violations == 0
+    return (violations[:, None] < violations[None, :]) | (better & feasible[:, None] & feasible[None, :])
+
+# Non-dominated sorting: front rank of each point, 0 for the first front
+def front_ranks(f, violations):
+    d = domination(f, violations)
+    dominated_by = d.sum(axis=0)
+    ranks = np.full(len(f), -1)
+    rank = 0
+    current = np.flatnonzero(dominated_by == 0)
+    while current.size:
+        ranks[current] = rank
+        dominated_by = dominated_by - d[current].sum(axis=0)
+        dominated_by[ranks >= 0] = -1
+        current = np.flatnonzero(dominated_by == 0)
+        rank += 1
+    return ranks
+
+# Crowding distance of each point within its front; boundary points get infinity
+def crowding_distance(f, ranks):
+    distance = np.zeros(len(f))
+    finite = np.isfinite(f).all(axis=1)
+    for rank in np.unique(ranks):
+        members = np.flatnonzero((ranks == rank) & finite)
+        if members.size < 3:
+            distance[members] = np.inf
+            continue
+        for k in range(f.shape[1]):
+            order = members[np.argsort(f[members, k])]
+            span = f[order[-1], k] - f[order[0], k]
+            distance[order[0]] = distance[order[-1]] = np.inf
+            if span > 0:
+                distance[order[1:-1]] += (f[order[2:], k] - f[order[:-2], k]) / span
+    return distance
+
+# Binary tournament on rank, then crowding distance
+def tournament(ranks, distance, n, rng):
+    a, b = rng.integers(0, len(ranks), (2, n))
+    a_wins = (ranks[a] < ranks[b]) | ((ranks[a] == ranks[b]) & (distance[a] >= distance[b]))
+    return np.where(a_wins, a, b)
+
+# Blend crossover and Gaussian mutation within the search box, scaled to the box size
+def offspring(parents_a, parents_b, lower, upper, mutation, rng):
+    u = rng.uniform(-0.25, 1.25, parents_a.shape)
+    children = parents_a + u * (parents_b - parents_a)
+    children += mutation * (upper - lower) * rng.standard_normal(children.shape)
+    return np.clip(children, lower, upper)
+
+# NSGA-II search of the lh x aoa_trim box, evaluated one vectorized generation at a time
+# Returns the non-dominated feasible solutions found across every generation and the number of model evaluations
+@instrumentation.timed('hstab_pareto.pareto_front')
+def pareto_front(params, objectives=None, population=48, generations=40, seed=None):
+    objectives = parse_objectives(default_objectives if objectives is None else objectives)
+    rng = np.random.default_rng(seed)
+    lower = np.array([params['lh_range'][0], params['aoa_trim_range'][0]], dtype=float)
+    upper = np.array([params['lh_range'][1], params['aoa_trim_range'][1]], dtype=float)
+
+    x = lower + (upper - lower) * rng.random((population, 2))
+    f, violations, data = evaluate_population(x, params, objectives)
+    archive_f, archive_data = [f[violations == 0]], [{c: data[c][violations == 0] for c in solution_columns}]
+    evaluations = population
+    for generation in range(generations):
+        ranks = front_ranks(f, violations)
+        distance = crowding_distance(f, ranks)
+        # Mutation shrinks as the population settles on the front
+        mutation = 0.1 * (1 - generation / generations) + 0.005
+        a = tournament(ranks, distance, population, rng)
+        b = tournament(ranks, distance, population, rng)
+        children = offspring(x[a], x[b], lower, upper, mutation, rng)
+        child_f, child_violations, child_data = evaluate_population(children, params, objectives)
+        evaluations += population
+        feasible = child_violations == 0
+        archive_f.append(child_f[feasible])
+        archive_data.append({c: child_data[c][feasible] for c in solution_columns})
+
+        # Keep the best fronts of parents and children, filling the last front by crowding distance
+        x = np.concatenate([x, children])
+        f = np.concatenate([f, child_f])
+        violations = np.concatenate([violations, child_violations])
+        ranks = front_ranks(f, violations)
+        distance = crowding_distance(f, ranks)
+        keep = np.lexsort((-distance, ranks))[:population]
+        x, f, violations = x[keep], f[keep], violations[keep]
+
+    instrumentation.count('hstab_pareto evaluations', evaluations)
+    f = np.concatenate(archive_f)
+    data = {c: np.concatenate([d[c] for d in archive_data]) for c in solution_columns}
+    if len(f) == 0:
+        return {c: data[c] for c in solution_columns}, evaluations
+    front = ~domination(f, np.zeros(len(f), dtype=int)).any(axis=0)
+    # Points evaluated twice appear once
+    _, unique = np.unique(f[front], axis=0, return_index=True)
+    idx = np.flatnonzero(front)[np.sort(unique)]
+    idx = idx[np.argsort(f[idx, 0], kind='stable')]
+    return {c: data[c][idx] for c in solution_columns}, evaluations
+
+# Non-dominated verified points of the dense grid, for comparison
+def grid_front(lh_arr, aoa_arr, params, objectives=None):
+    objectives = parse_objectives(default_objectives if objectives is None else objectives)
+    verified, data = evaluate_grid(lh_arr, aoa_arr, params)
+    f = np.column_stack([sign * data[column][verified] for column, sign in objectives])
+    front = ~domination(f, np.zeros(len(f), dtype=int)).any(axis=0)
+    return {c: data[c][verified][front] for c in solution_columns}
+
+# Number of points of front_a dominated by some point of front_b
+def dominated_count(front_a, front_b, objectives=None):
+    objectives = parse_objectives(default_objectives if objectives is None else objectives)
+    fa = np.column_stack([sign * front_a[column] for column, sign in objectives])
+    fb = np.column_stack([sign * front_b[column] for column, sign in objectives])
+    better = (fb[:, None, :] <= fa[None, :, :]).all(axis=2) & (fb[:, None, :] < fa[None, :, :]).any(axis=2)
+    return int(better.any(axis=0).sum())
+
+def main():
+    import argparse
+    import pandas as pd
+    from solution_writer import SolutionWriter
+    parser = argparse.ArgumentParser(description='Pareto front of the h-stab sizing over continuous lh and aoa_trim.')
+    parser.add_argument('--objectives', nargs='+', default=default_objectives, help="solution columns to minimize, 'column:max' to maximize")
+    parser.add_argument('--population', type=int, default=48, help='points per generation')
+    parser.add_argument('--generations', type=int, default=40, help='number of generations')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    parser.add_argument('--out', default=None, help='write the front to a csv, npz or parquet file')
+    parser.add_argument('--check', action='store_true', help='compare against the front of the dense grid')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.from_args(args):
+        params = get_params()
+        front, evaluations = pareto_front(params, args.objectives, args.population, args.generations, args.seed)
+        print("Non-dominated solutions: {} from {} model evaluations".format(len(front['lh (ft)']), evaluations))
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(pd.DataFrame(front).to_string(index=False))
+        if args.out:
+            with SolutionWriter(args.out, solution_columns) as writer:
+                writer.write(front)
+        if args.check:
+            lh_arr, aoa_arr = sweep_grid(params)
+            reference = grid_front(lh_arr, aoa_arr, params, args.objectives)
+            print("\nDense grid: {} evaluations, {} non-dominated solutions".format(len(lh_arr) * len(aoa_arr), len(reference['lh (ft)'])))
+            print("Optimizer solutions dominated by the grid front: {}".format(dominated_count(front, reference, args.objectives)))
+            print("Grid solutions dominated by the optimizer front: {}".format(dominated_count(reference, front, args.objectives)))
+
+if __name__ == '__main__':
+    main()
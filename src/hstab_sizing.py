@@ -1,30 +1,19 @@
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.interpolate import interp1d
-from hstab_params import params, wing_flap_data, wing_data, hstab_data
-
-# Define function to interpolate between two values in a dataframe
-def interpolate_value(target, ind, dep, df):
-    # Sort the dataframe by alpha to ensure correct interpolation
-    df_sorted = df.sort_values(by=ind)
-    
-    # Extract alpha and the target column values
-    ind_values = df_sorted[ind].values
-    dep_values = df_sorted[dep].values
-    
-    # Create an interpolation function
-    interp_func = interp1d(ind_values, dep_values, kind="linear", fill_value="extrapolate")
-    
-    # Compute the interpolated value
-    interpolated_value = interp_func(target)
-    
-    return interpolated_value
+from hstab_params import get_params, get_polars
+from solution_writer import SolutionWriter
+import instrumentation
+import rendering
 
-# Define function to calculate horizontal stabilizer size for a given moment arm and trim angle of attack
-def calculate_bh(lh, aoa, params):
+# Downwash at the tail: the angle at zero angle of attack e0 (rad) and the gradient deda
+def downwash(lh, params):
     e0 = 2 * params['CL0wf'] / (np.pi * params['AR']) * (lh / np.sqrt(lh**2 + params['zh']**2))
     deda = 2 * params['CLawf'] / (np.pi * params['AR']) * (lh / np.sqrt(lh**2 + params['zh']**2))
+    return e0, deda
+
+# Define function to calculate horizontal stabilizer size for a given moment arm and trim angle of attack
+# wash is (e0, deda) at lh when already known, otherwise it is computed from params
+def calculate_bh(lh, aoa, params, wash=None):
+    e0, deda = downwash(lh, params) if wash is None else wash
     t1 = params['ARh'] * params['S'] * params['MAC'] / lh
     t2 = params['Cmacwf'] + (params['CL0wf'] * -params['SM_wing']) + (params['CLawf'] * -params['SM_wing'] * np.deg2rad(aoa))
     t3 = params['CL0h'] - (params['CLah'] * e0) + (params['CLah'] * (1 - deda) * lh / params['MAC'] * np.deg2rad(aoa))
@@ -38,27 +27,32 @@ def aoa(lh, bh, CL, params):
     return np.rad2deg((CL - t1) / t2)
 
 # Define function to calculate coefficient of drag for a given angle of attack
-def CD(aoa, lh, bh, flap = False):
+# params['polar_speed'], when set, selects polars at that speed from the polar store
+def CD(aoa, lh, bh, flap = False, params = None):
+    if params is None:
+        params = get_params()
+    wing_flap_polar, wing_polar, hstab_polar = get_polars(params.get('polar_speed'))
     e0 = 2 * params['CL0wf'] / (np.pi * params['AR']) * (lh / np.sqrt(lh**2 + params['zh']**2))
-    if flap:
-        CD_wing = interpolate_value(aoa, 'alpha', 'CD', wing_flap_data)
-    else:
-        CD_wing = interpolate_value(aoa, 'alpha', 'CD', wing_data)
-    CD_hstab = interpolate_value(aoa - np.rad2deg(e0), 'alpha', 'CD', hstab_data)
+    wing_table = wing_flap_polar if flap else wing_polar
+    CD_wing = wing_table.CD(aoa)
+    CD_hstab = hstab_polar.CD(aoa - np.rad2deg(e0))
     return CD_wing + bh**2 / (params['ARh'] * params['S']) * CD_hstab
 
 # Define function to calculate lift coefficient for a given angle of attack
-def CL(aoa, lh, bh, flap = False):
+def CL(aoa, lh, bh, flap = False, params = None):
+    if params is None:
+        params = get_params()
+    wing_flap_polar, wing_polar, hstab_polar = get_polars(params.get('polar_speed'))
     e0 = 2 * params['CL0wf'] / (np.pi * params['AR']) * (lh / np.sqrt(lh**2 + params['zh']**2))
-    if flap:
-        CL_wing = interpolate_value(aoa, 'alpha', 'CL', wing_flap_data)
-    else:
-        CL_wing = interpolate_value(aoa, 'alpha', 'CL', wing_data)
-    CL_hstab = interpolate_value(aoa - np.rad2deg(e0), 'alpha', 'CL', hstab_data)
+    wing_table = wing_flap_polar if flap else wing_polar
+    CL_wing = wing_table.CL(aoa)
+    CL_hstab = hstab_polar.CL(aoa - np.rad2deg(e0))
     return CL_wing + bh**2 / (params['ARh'] * params['S']) * CL_hstab
 
 # Define function to calculate static margin of the aircraft
-def SM(lh,bh):
+def SM(lh,bh,params=None):
+    if params is None:
+        params = get_params()
     deda = 2 * params['CLawf'] / (np.pi * params['AR']) * (lh / np.sqrt(lh**2 + params['zh']**2))
     x_cg = -params['SM_wing'] * params['MAC'] + params['x_acwf']
     x_ach = lh + x_cg
@@ -78,10 +72,10 @@ def verify(lh, bh, aoa_trim, params):
     if bh < params['bh_range'][0] or bh > params['bh_range'][1]:
         return False, {'aoa_L/TO': None, 'TW_req': None}
     # Calculate values
-    CLCruise = CL(aoa_trim, lh, bh)
+    CLCruise = CL(aoa_trim, lh, bh, params=params)
     aoa_L_TO = aoa(lh, bh, params['CLmaxL/TO'], params)
     aoa_CL_0 = aoa(lh, bh, 0, params)
-    TW = TW_req(CD(aoa_CL_0, lh, bh), params)
+    TW = TW_req(CD(aoa_CL_0, lh, bh, params=params), params)
     # Perform verification
     ver_cruise = CLCruise > params['CLCruise']
     ver_aoa = aoa_L_TO > params['aoa_L/TO_range'][0] and aoa_L_TO < params['aoa_L/TO_range'][1]
@@ -89,68 +83,167 @@ def verify(lh, bh, aoa_trim, params):
     # return True if all conditions are met, False otherwise
     return ver_cruise and ver_aoa and ver_TW, {'aoa_L/TO': aoa_L_TO, 'TW_req': TW}
 
-# Calculate horizontal stabilizer size for each moment arm and angle of attack
-lh_arr = np.linspace(params['lh_range'][0],params['lh_range'][1],1001)
-aoa_arr = np.linspace(params['aoa_trim_range'][0],params['aoa_trim_range'][1],11)
-bh_arr = np.zeros((len(lh_arr),len(aoa_arr)))
-
-# List to store verified data
-verified_data = []
-
-# Verify each horizontal stabilizer size
-for i in range(len(lh_arr)):
-    for j in range(len(aoa_arr)):
-        bh = calculate_bh(lh_arr[i], aoa_arr[j], params)
-        bh_arr[i,j] = np.real(bh)
-        
-        verified, data = verify(lh_arr[i], bh, aoa_arr[j], params)
-        if verified:
-            sm = SM(lh_arr[i],bh)
-            x_ac = (sm * 12 * params['MAC']) + (params['x_acwf'] - params['SM_wing'] * params['MAC'])
-            x_cg = x_ac - sm * 12 * params['MAC']
-            x_ach = lh_arr[i] * 12 + x_cg
-            
-            verified_data.append({
-                'lh (ft)': lh_arr[i],
-                'bh (ft)': bh,
-                'aoa_trim (deg)': aoa_arr[j],
-                'aoa_TO/L (deg)': data['aoa_L/TO'],
-                'T/W_req': data['TW_req'],
-                'SM': sm,
-                'X_AC (in)': x_ac,
-                'X_CG (in)': x_cg,
-                'X_ACH (in)': x_ach,
-                'X_ACWF (in)': params['x_acwf']
-            })
-            
-# Plot bh vs lh values in verified_data as a scatter plot
-for i in range(len(aoa_arr)):
-    plt.plot(lh_arr, bh_arr[:,i], label=f'aoa = {aoa_arr[i]}')
-plt.legend()
-plt.xlabel('lh')
-plt.ylabel('bh')
-plt.ylim(params['bh_range'])
-plt.xlim(params['lh_range'])
-plt.title('bh vs lh')
-plt.grid(True)
-plt.show()
-
-# Convert verified data to DataFrame and save to CSV
-verified_df = pd.DataFrame(verified_data)
-verified_df.to_csv('./data/solutions/hstab.csv', index=False)
-
-# Print the rows with the smallest values for each criterion
-print("Solution with smallest lh value:")
-print(verified_df.loc[verified_df['lh (ft)'].idxmin()])
-
-print("\nSolution with smallest bh value:")
-print(verified_df.loc[verified_df['bh (ft)'].idxmin()])
-
-print("\nSolution with smallest aoa_trim value:")
-print(verified_df.loc[verified_df['aoa_trim (deg)'].idxmin()])
-
-print("\nSolution with smallest aoa_TO/L value:")
-print(verified_df.loc[verified_df['aoa_TO/L (deg)'].idxmin()])
-
-print("\nSolution with smallest T/W_req value:")
-print(verified_df.loc[verified_df['T/W_req'].idxmin()])
\ No newline at end of file
+# Define function to calculate the trimmed tail size and the aerodynamics that do not depend on T/W or W/S:
+# bh, cruise CL, takeoff/landing aoa, CD at zero lift and static margin
+def trim_aerodynamics(lh, aoa_trim, params):
+    # Negative radicands give NaN bh, which fails every check
+    with np.errstate(invalid='ignore'):
+        bh = calculate_bh(lh, aoa_trim, params)
+        CLCruise = CL(aoa_trim, lh, bh, params=params)
+        aoa_L_TO = aoa(lh, bh, params['CLmaxL/TO'], params)
+        aoa_CL_0 = aoa(lh, bh, 0, params)
+        CD_CL_0 = CD(aoa_CL_0, lh, bh, params=params)
+        sm = SM(lh, bh, params)
+    return bh, CLCruise, aoa_L_TO, CD_CL_0, sm
+
+# Define function to evaluate the verify criteria for broadcastable arrays of lh and aoa_trim
+@instrumentation.timed('hstab_sizing.evaluate_points')
+def evaluate_points(lh, aoa_trim, params):
+    lh = np.asarray(lh, dtype=float)
+    aoa_trim = np.asarray(aoa_trim, dtype=float)
+    bh, CLCruise, aoa_L_TO, CD_CL_0, sm = trim_aerodynamics(lh, aoa_trim, params)
+    TW = TW_req(CD_CL_0, params)
+    # Same checks as verify, one array per criterion
+    checks = {
+        'bh_min': bh >= params['bh_range'][0],
+        'bh_max': bh <= params['bh_range'][1],
+        'cruise': CLCruise > params['CLCruise'],
+        'aoa_min': aoa_L_TO > params['aoa_L/TO_range'][0],
+        'aoa_max': aoa_L_TO < params['aoa_L/TO_range'][1],
+        'TW': TW < params['T/W'],
+    }
+    x_ac = (sm * 12 * params['MAC']) + (params['x_acwf'] - params['SM_wing'] * params['MAC'])
+    x_cg = x_ac - sm * 12 * params['MAC']
+    x_ach = lh * 12 + x_cg
+    shape = bh.shape
+    data = {
+        'lh (ft)': np.broadcast_to(lh, shape),
+        'bh (ft)': bh,
+        'aoa_trim (deg)': np.broadcast_to(aoa_trim, shape),
+        'aoa_TO/L (deg)': aoa_L_TO,
+        'T/W_req': TW,
+        'SM': sm,
+        'X_AC (in)': x_ac,
+        'X_CG (in)': x_cg,
+        'X_ACH (in)': x_ach,
+        'X_ACWF (in)': np.full(shape, params['x_acwf']),
+    }
+    return checks, data
+
+# Define function to evaluate every (lh, aoa_trim) pair of a grid at once
+def evaluate_grid(lh_arr, aoa_arr, params):
+    lh = np.asarray(lh_arr, dtype=float)[:, None]
+    aoa_trim = np.asarray(aoa_arr, dtype=float)[None, :]
+    checks, data = evaluate_points(lh, aoa_trim, params)
+    verified = np.logical_and.reduce(list(checks.values()))
+    return verified, data
+
+# Output columns of the h-stab solutions
+solution_columns = ['lh (ft)', 'bh (ft)', 'aoa_trim (deg)', 'aoa_TO/L (deg)', 'T/W_req', 'SM', 'X_AC (in)', 'X_CG (in)', 'X_ACH (in)', 'X_ACWF (in)']
+
+# Define function to evaluate the grid a block of lh rows at a time, yielding only the verified rows
+def stream_grid(lh_arr, aoa_arr, params, chunk_points=65536):
+    rows = max(1, chunk_points // len(aoa_arr))
+    for start in range(0, len(lh_arr), rows):
+        verified, data = evaluate_grid(lh_arr[start:start+rows], aoa_arr, params)
+        yield {col: data[col][verified] for col in solution_columns}
+
+# Track the solution with the smallest value of each criterion while rows are streamed
+class SolutionSummary:
+    criteria = [('lh (ft)', 'lh'), ('bh (ft)', 'bh'), ('aoa_trim (deg)', 'aoa_trim'), ('aoa_TO/L (deg)', 'aoa_TO/L'), ('T/W_req', 'T/W_req')]
+
+    def __init__(self):
+        self.rows = 0
+        self.best = {}
+
+    def update(self, data):
+        n = len(data[solution_columns[0]])
+        if n == 0:
+            return
+        for col, _ in self.criteria:
+            i = int(np.argmin(data[col]))
+            # Keep the first occurrence of the minimum, like idxmin
+            if col not in self.best or data[col][i] < self.best[col][0]:
+                self.best[col] = (data[col][i], self.rows + i, {c: data[c][i] for c in solution_columns})
+        self.rows += n
+
+    def print(self):
+        import pandas as pd
+        for k, (col, label) in enumerate(self.criteria):
+            if col not in self.best:
+                continue
+            _, index, row = self.best[col]
+            print(("\n" if k else "") + "Solution with smallest {} value:".format(label))
+            print(pd.Series(row, name=index))
+
+# Define function to build the default lh x aoa_trim sweep grid
+def sweep_grid(params, num_lh=1001, num_aoa=11):
+    lh_arr = np.linspace(params['lh_range'][0],params['lh_range'][1],num_lh)
+    aoa_arr = np.linspace(params['aoa_trim_range'][0],params['aoa_trim_range'][1],num_aoa)
+    return lh_arr, aoa_arr
+
+# Draw bh vs lh for each trim angle of attack
+def draw_bh(fig, lh_arr, aoa_arr, bh_arr, bh_range, lh_range):
+    ax = fig.add_subplot()
+    for i in range(len(aoa_arr)):
+        ax.plot(lh_arr, bh_arr[:,i], label=f'aoa = {aoa_arr[i]}')
+    ax.legend()
+    ax.set_xlabel('lh')
+    ax.set_ylabel('bh')
+    ax.set_ylim(bh_range)
+    ax.set_xlim(lh_range)
+    ax.set_title('bh vs lh')
+    ax.grid(True)
+
+# Plot bh vs lh for each trim angle of attack
+# Shown on screen, or rendered to out (.png, .svg or .pdf), in the background when a renderer is given
+def plot_bh(lh_arr, aoa_arr, bh_arr, params, out=None, max_points=None, renderer=None):
+    lh_arr, bh_arr = rendering.downsample(max_points, lh_arr, bh_arr)
+    return rendering.render(draw_bh, (lh_arr, aoa_arr, bh_arr, params['bh_range'], params['lh_range']), out, renderer)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Size the horizontal stabilizer over an lh x aoa_trim grid.')
+    parser.add_argument('--out', default='./data/solutions/hstab.csv', help='solutions file')
+    parser.add_argument('--format', choices=SolutionWriter.formats, default=None, help='output format (default: from the file extension)')
+    parser.add_argument('--num-lh', type=int, default=1001, help='number of lh grid points')
+    parser.add_argument('--num-aoa', type=int, default=11, help='number of aoa_trim grid points')
+    parser.add_argument('--chunk-points', type=int, default=65536, help='grid points evaluated per chunk')
+    parser.add_argument('--no-plot', action='store_true', help='skip the bh vs lh plot')
+    parser.add_argument('--store', default=None, metavar='DB', help='also add the verified rows to this solution store as a new run')
+    rendering.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.from_args(args), rendering.BackgroundRenderer() as renderer:
+        params = get_params()
+    
+        # Calculate horizontal stabilizer size for each moment arm and angle of attack
+        lh_arr, aoa_arr = sweep_grid(params, args.num_lh, args.num_aoa)
+
+        # Plot bh vs lh values in verified_data as a scatter plot
+        # A headless figure renders in the background while the sweep runs
+        if not args.no_plot:
+            with np.errstate(invalid='ignore'):
+                bh_arr = calculate_bh(lh_arr[:, None], aoa_arr[None, :], params)
+            plot_bh(lh_arr, aoa_arr, bh_arr, params, args.plot_out, args.max_points, renderer)
+
+        # Verify each horizontal stabilizer size, writing verified rows as they are produced
+        summary = SolutionSummary()
+        store = None
+        if args.store:
+            from solution_store import SolutionStore
+            store = SolutionStore(args.store, solution_columns)
+            run_id = store.add_run({**params, 'num_lh': args.num_lh, 'num_aoa': args.num_aoa}, 'hstab_sizing')
+        with SolutionWriter(args.out, solution_columns, args.format) as writer:
+            for data in stream_grid(lh_arr, aoa_arr, params, args.chunk_points):
+                writer.write(data)
+                if store is not None:
+                    store.insert(run_id, data)
+                summary.update(data)
+        if store is not None:
+            store.close()
+
+        summary.print()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import functools
+import json
+import time
+from contextlib import contextmanager
+
+# Opt-in call counters, cumulative timers and value histograms for the hot paths
+# While disabled an instrumented function only checks this flag before calling through
+enabled = False
+counters = {} # name -> [calls, seconds]
+histograms = {} # name -> {value: count}
+
+def reset():
+    counters.clear()
+    histograms.clear()
+
+def record(name, seconds=0.0, calls=1):
+    entry = counters.get(name)
+    if entry is None:
+        counters[name] = [calls, seconds]
+    else:
+        entry[0] += calls
+        entry[1] += seconds
+
+# Count calls without timing them
+def count(name, calls=1):
+    if enabled:
+        record(name, 0.0, calls)
+
+# Add one value, e.g. an iteration count, to a histogram
+def observe(name, value):
+    if enabled:
+        hist = histograms.setdefault(name, {})
+        hist[value] = hist.get(value, 0) + 1
+
+# Add an array of values to a histogram
+def observe_many(name, values):
+    if enabled:
+        import numpy as np
+        hist = histograms.setdefault(name, {})
+        for value, n in zip(*np.unique(values, return_counts=True)):
+            hist[value.item()] = hist.get(value.item(), 0) + int(n)
+
+# Decorator counting the calls of a function and their cumulative time
+def timed(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+# Time a block of code
+@contextmanager
+def timer(name):
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+# Counters and histograms as a JSON-friendly dict
+def summary():
+    return {
+        'counters': {
+            name: {'calls': calls, 'total_s': seconds, 'mean_s': seconds / calls if calls else 0.0}
+            for name, (calls, seconds) in sorted(counters.items())
+        },
+        'histograms': {
+            name: {str(value): n for value, n in sorted(hist.items())}
+            for name, hist in sorted(histograms.items())
+        },
+    }
+
+# Add a summary from another process, e.g. a trade study worker
+def merge(report):
+    for name, entry in report['counters'].items():
+        record(name, entry['total_s'], entry['calls'])
+    for name, hist in report['histograms'].items():
+        target = histograms.setdefault(name, {})
+        for value, n in hist.items():
+            value = json.loads(value)
+            target[value] = target.get(value, 0) + n
+
+# Record everything run inside the block; the yielded dict is filled with the summary on exit
+@contextmanager
+def instrumented(clear=True):
+    global enabled
+    previous = enabled
+    if clear:
+        reset()
+    enabled = True
+    report = {}
+    try:
+        yield report
+    finally:
+        enabled = previous
+        report.update(summary())
+
+def print_summary(report):
+    if report['counters']:
+        print("{:<45} {:>10} {:>12} {:>12}".format('instrumented call', 'calls', 'total (s)', 'mean (s)'))
+        for name, entry in report['counters'].items():
+            print("{:<45} {:>10} {:>12.6f} {:>12.3e}".format(name, entry['calls'], entry['total_s'], entry['mean_s']))
+    for name, hist in report['histograms'].items():
+        print("\n{} histogram:".format(name))
+        for value, n in hist.items():
+            print("  {:>8}: {}".format(value, n))
+
+def write_json(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+# Command line flags shared by the entry points
+def add_arguments(parser):
+    parser.add_argument('--instrument', action='store_true', help='print call counts, timings and iteration histograms at the end of the run')
+    parser.add_argument('--instrument-json', default=None, metavar='PATH', help='write the instrumentation summary to a JSON file')
+
+# Instrument the block when the command line asked for it, then report
+@contextmanager
+def from_args(args):
+    if not (args.instrument or args.instrument_json):
+        yield
+        return
+    with instrumented() as report:
+        yield
+    if args.instrument:
+        print()
+        print_summary(report)
+    if args.instrument_json:
+        write_json(report, args.instrument_json)
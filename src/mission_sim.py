@@ -0,0 +1,233 @@
+import numpy as np
+from constraint_params import params as constraint_defaults
+import instrumentation
+import weight_est
+
+# Mission energy of many designs at once, integrated over a segmented flight profile
+# The profile is a ground roll and a climb at full thrust, then laps of a racetrack flown until the endurance
+# runs out: straight legs at V_max and half turns of radius R_turn at V_turn. The thrust of each segment comes
+# from the drag polar of the constraint equations and the electrical power from the rated motor power scaled
+# by the throttle, so the battery carries the energy the mission draws instead of full rated power throughout.
+mission_params = {
+    'h_climb': 200, # ft, altitude gained before the laps
+    'mu_roll': 0.04, # unitless, rolling friction of the ground roll
+    'V_TO_factor': 1.2, # unitless, liftoff speed over the takeoff stall speed
+    'V_climb_factor': 1.3, # unitless, climb speed over the takeoff stall speed
+    'leg_length': 1000, # ft, straight between the turns of a lap
+    'power_exponent': 1.0, # unitless, electrical power scales with throttle**power_exponent
+    'dt': 0.5, # s, time step
+}
+
+# Takeoff weight search range of mission sizing; the lighter batteries move the weight closure
+# below the range of the constant-power sweep, and below the EDF data, see outside_motor_data
+# With power_exponent = 0 the closure is the constant-power closure: the same weights with the same range, and
+# within the bisection tolerance of both (relative residual 1e-4, about 5e-4 in weight) with this one
+search_range = {
+    'WTO_lower': 1, # lbs
+    'WTO_upper': 50, # lbs
+}
+
+# Segment codes of the simulated traces
+segments = ['takeoff', 'climb', 'cruise', 'turn', 'landed']
+
+# Designs whose thrust lies outside the EDF data, where the motor weight and power fits are extrapolated
+def outside_motor_data(WTO, TW_ratio):
+    low, high = weight_est.motor_thrust_range()
+    thrust = np.asarray(TW_ratio) * np.asarray(WTO)
+    return (thrust < low) | (thrust > high)
+
+def wing_area(params):
+    return params['b']**2 / params['AR']
+
+# T/W that holds speed V at load factor n, from the drag polar CD = CD0 + CL**2/(pi*e*AR)
+# velocity_constraint is the case V = V_max, n = 1
+def thrust_ratio(wing_loading, V, n, params):
+    q = params['rho_alt'] * V**2 / 2
+    return q * params['CD0'] / wing_loading + n**2 * wing_loading / (q * np.pi * params['e'] * params['AR'])
+
+# Load factor of a level turn of radius R_turn at V_turn, as in min_turn_radius_constraint
+def turn_load_factor(params):
+    return np.sqrt((params['V_turn']**2 / (params['R_turn'] * params['g']))**2 + 1)
+
+# Seconds of the ground roll and of the climb, both at full thrust
+# The ground roll neglects aerodynamic drag; a design that cannot roll or climb gets an infinite time
+def climb_out(wing_loading, TW_ratio, params, mission):
+    V_stall = np.sqrt(2 * wing_loading / (params['rho_alt'] * params['CLmaxTO']))
+    V_climb = mission['V_climb_factor'] * V_stall
+    accel = params['g'] * (TW_ratio - mission['mu_roll'])
+    sin_climb = np.minimum(TW_ratio - thrust_ratio(wing_loading, V_climb, 1, params), 1)
+    with np.errstate(divide='ignore'):
+        t_takeoff = np.where(accel > 0, mission['V_TO_factor'] * V_stall / accel, np.inf)
+        t_climb = np.where(sin_climb > 0, mission['h_climb'] / (V_climb * sin_climb), np.inf)
+    return t_takeoff, t_climb
+
+# Seconds of a lap spent on one straight leg and in one half turn
+def lap_times(params, mission):
+    return mission['leg_length'] / params['V_max'], np.pi * params['R_turn'] / params['V_turn']
+
+# Time spent turning in the first k*dt seconds of the laps, for k = 0..steps
+# The laps do not depend on the weight, so the table is integrated on the time grid once and looked up
+# for every weight iterate; per-design lap parameters give one row per design
+def turn_time_table(params, mission, duration):
+    dt = mission['dt']
+    steps = max(int(np.ceil(duration / dt)), 1)
+    leg, turn = (np.asarray(value, dtype=float)[..., None] for value in lap_times(params, mission))
+    t = (np.arange(steps) + 0.5) * dt
+    turning = np.fmod(t, leg + turn) >= leg
+    table = np.zeros(turning.shape[:-1] + (steps + 1,))
+    table[..., 1:] = np.cumsum(turning, axis=-1) * dt
+    return table
+
+# Turning time in the first d seconds of the laps, linear between grid points; NaN stays NaN
+def turn_time(table, d, dt):
+    steps = table.shape[-1] - 1
+    k = np.clip(d / dt, 0, steps)
+    i = np.minimum(np.where(np.isnan(k), 0, k).astype(int), steps - 1)
+    if table.ndim == 1:
+        return table[i] + (k - i) * (table[i + 1] - table[i])
+    lower = np.take_along_axis(table, i[:, None], axis=1)[:, 0]
+    upper = np.take_along_axis(table, i[:, None] + 1, axis=1)[:, 0]
+    return lower + (k - i) * (upper - lower)
+
+def mission_inputs(params, mission):
+    return {**constraint_defaults, **(params or {})}, {**mission_params, **(mission or {})}
+
+# Energy of the mission for 1-D arrays of designs; array entries of params hold one value per design
+# Returns the energy (Wh), its fraction of the constant-power energy Endurance * rated power, the time
+# and throttle of each segment, and whether every segment fits within full thrust and the endurance
+@instrumentation.timed('mission_sim.mission_energy')
+def mission_energy(WTO, TW_ratio, Endurance, params=None, mission=None, table=None):
+    params, mission = mission_inputs(params, mission)
+    WTO, TW_ratio, Endurance = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=float)) for x in (WTO, TW_ratio, Endurance)))
+    wing_loading = WTO / wing_area(params)
+    duration = Endurance * 3600
+    if table is None:
+        table = turn_time_table(params, mission, np.max(duration))
+    t_takeoff, t_climb = climb_out(wing_loading, TW_ratio, params, mission)
+    feasible = t_takeoff + t_climb < duration
+    t_takeoff = np.minimum(t_takeoff, duration)
+    t_climb = np.minimum(t_climb, duration - t_takeoff)
+    t_laps = duration - t_takeoff - t_climb
+    t_turn = turn_time(table, t_laps, mission['dt'])
+    t_cruise = t_laps - t_turn
+
+    throttle_cruise = thrust_ratio(wing_loading, params['V_max'], 1, params) / TW_ratio
+    throttle_turn = thrust_ratio(wing_loading, params['V_turn'], turn_load_factor(params), params) / TW_ratio
+    feasible &= (throttle_cruise <= 1) & (throttle_turn <= 1)
+    # Seconds at rated power that draw the same energy; a segment never draws more than rated power
+    k = mission['power_exponent']
+    full_power = t_takeoff + t_climb + t_cruise * np.minimum(throttle_cruise, 1)**k + t_turn * np.minimum(throttle_turn, 1)**k
+    power = weight_est.motor_power_estimate(TW_ratio * WTO)
+    return {
+        'energy': power * full_power / 3600,
+        'fraction': full_power / duration,
+        'power': power,
+        'times': {'takeoff': t_takeoff, 'climb': t_climb, 'cruise': t_cruise, 'turn': t_turn},
+        'throttle': {'takeoff': np.ones_like(TW_ratio), 'climb': np.ones_like(TW_ratio), 'cruise': throttle_cruise, 'turn': throttle_turn},
+        'feasible': feasible,
+    }
+
+# Power and energy traces on the time grid, designs along the first axis and time steps along the second
+# Each step takes the segment at its midpoint; the last step of a design is cut at its endurance
+@instrumentation.timed('mission_sim.simulate_mission')
+def simulate_mission(WTO, TW_ratio, Endurance, params=None, mission=None):
+    params, mission = mission_inputs(params, mission)
+    WTO, TW_ratio, Endurance = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=float)) for x in (WTO, TW_ratio, Endurance)))
+    wing_loading = WTO / wing_area(params)
+    duration = Endurance[:, None] * 3600
+    dt = mission['dt']
+    steps = max(int(np.ceil(np.max(duration) / dt)), 1)
+    t = np.arange(steps) * dt
+    t_takeoff, t_climb = climb_out(wing_loading, TW_ratio, params, mission)
+    laps = (t_takeoff + t_climb)[:, None]
+    leg, turn = (np.asarray(value, dtype=float)[..., None] for value in lap_times(params, mission))
+
+    mid = t + dt / 2
+    with np.errstate(invalid='ignore'):
+        turning = np.fmod(mid - laps, leg + turn) >= leg
+    segment = np.select([mid >= duration, mid < t_takeoff[:, None], mid < laps, turning], [4, 0, 1, 3], 2)
+    throttle = np.stack([
+        np.ones_like(TW_ratio),
+        np.ones_like(TW_ratio),
+        thrust_ratio(wing_loading, params['V_max'], 1, params) / TW_ratio,
+        thrust_ratio(wing_loading, params['V_turn'], turn_load_factor(params), params) / TW_ratio,
+        np.zeros_like(TW_ratio),
+    ], axis=1)
+    throttle = np.take_along_axis(np.minimum(throttle, 1), segment, axis=1)
+    power = weight_est.motor_power_estimate(TW_ratio * WTO)[:, None] * throttle**mission['power_exponent']
+    step = np.clip(duration - t, 0, dt)
+    instrumentation.count('simulate_mission steps', power.size)
+    return {
+        't': t,
+        'segment': segment,
+        'power': power,
+        'energy': np.cumsum(power * step, axis=1) / 3600,
+    }
+
+# Mission energy over the constant-power energy, as the energy_fraction of batch_weight_estimate
+# Array entries of params hold one value per flattened point and are looked up with the point indices.
+# Iterates get the clamped fraction so the search can pass through infeasible weights; at the converged
+# weights a design that cannot climb out within the endurance or needs more than full throttle gets NaN
+def energy_fraction(params=None, mission=None):
+    params, mission = mission_inputs(params, mission)
+    lap_arrays = any(np.ndim(value) for value in lap_times(params, mission))
+    cache = {}
+    def fraction(WTO, TW_ratio, Endurance, idx, converged=False):
+        duration = np.max(Endurance) * 3600
+        if cache.get('duration', -1) < duration:
+            cache['duration'] = duration
+            cache['table'] = turn_time_table(params, mission, duration)
+        table = cache['table'][idx] if lap_arrays else cache['table']
+        p = {key: value[idx] if np.ndim(value) else value for key, value in params.items()}
+        result = mission_energy(WTO, TW_ratio, Endurance, p, mission, table)
+        return np.where(result['feasible'], result['fraction'], np.nan) if converged else result['fraction']
+    return fraction
+
+# Takeoff weight closure with the battery sized for the mission energy, for every (T/W, endurance) pair at once
+# Array entries of params are broadcast against the points; returns WTO, motor weight, battery weight and rated power,
+# NaN where the closure fails or the converged design cannot fly the mission
+@instrumentation.timed('mission_sim.mission_weight_estimate')
+def mission_weight_estimate(TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, params=None, mission=None, max_iter=200):
+    params, mission = mission_inputs(params, mission)
+    varying = [key for key, value in params.items() if np.ndim(value)]
+    arrays = np.broadcast_arrays(np.asarray(TW_ratio, dtype=float), np.asarray(Endurance, dtype=float), *(np.asarray(params[key], dtype=float) for key in varying))
+    shape = arrays[0].shape
+    flat = {**params, **{key: value.ravel() for key, value in zip(varying, arrays[2:])}}
+    results = weight_est.batch_weight_estimate(arrays[0].ravel(), arrays[1].ravel(), WTO_guess, WTO_lower, WTO_upper, max_iter,
+                                               energy_fraction=energy_fraction(flat, mission))
+    return [value.reshape(shape) for value in results]
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Mission energy and battery sizing against the constant-power estimate.')
+    parser.add_argument('--tw', type=float, nargs='+', default=[0.6, 0.7, 0.8, 0.9, 1.0], help='thrust-to-weight ratios')
+    parser.add_argument('--endurance', type=float, default=weight_est.constraint_params['endurance'], help='endurance (hrs)')
+    parser.add_argument('--leg-length', type=float, default=mission_params['leg_length'], help='straight leg of a lap (ft)')
+    parser.add_argument('--power-exponent', type=float, default=mission_params['power_exponent'], help='power scales with throttle**exponent')
+    parser.add_argument('--dt', type=float, default=mission_params['dt'], help='time step (s)')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.from_args(args):
+        sp = weight_est.sweep_params
+        mission = {'leg_length': args.leg_length, 'power_exponent': args.power_exponent, 'dt': args.dt}
+        TW_ratio = np.array(args.tw)
+        constant = weight_est.batch_weight_estimate(TW_ratio, args.endurance, sp['WTO_guess'], sp['WTO_lower'], sp['WTO_upper'])
+        WTO, W_motor, W_battery, Power = mission_weight_estimate(TW_ratio, args.endurance, sp['WTO_guess'], search_range['WTO_lower'], search_range['WTO_upper'], mission=mission)
+        energy = mission_energy(WTO, TW_ratio, args.endurance, mission=mission)
+        extrapolated = outside_motor_data(WTO, TW_ratio)
+
+        print("Endurance: {:.2f} mins".format(args.endurance * 60))
+        print("{:>6} {:>12} {:>12} {:>14} {:>14} {:>10} {:>9} {:>8}".format('T/W', 'WTO const', 'WTO mission', 'W_bat const', 'W_bat mission', 'Energy', 'Feasible', 'In data'))
+        for k, tw in enumerate(TW_ratio):
+            print("{:>6.3f} {:>12.4f} {:>12.4f} {:>14.4f} {:>14.4f} {:>8.2f}Wh {:>9} {:>8}".format(
+                tw, constant[0][k], WTO[k], constant[2][k], W_battery[k], energy['energy'][k], str(bool(energy['feasible'][k])), '-' if np.isnan(WTO[k]) else str(not extrapolated[k])))
+        if extrapolated.any():
+            print("Warning: {} design(s) have thrust outside the EDF data ({:.2f} to {:.2f} lbs); their motor weight and power are extrapolated".format(
+                int(extrapolated.sum()), *weight_est.motor_thrust_range()))
+        print("\nSegments (s, throttle):")
+        for k, tw in enumerate(TW_ratio):
+            print("{:>6.3f}  ".format(tw) + "  ".join("{} {:.1f} s @ {:.3f}".format(name, energy['times'][name][k], energy['throttle'][name][k]) for name in segments[:4]))
+
+if __name__ == '__main__':
+    main()
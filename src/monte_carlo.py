@@ -0,0 +1,172 @@
+import numpy as np
+from constraint_params import params as constraint_defaults
+from constraints import evaluate_constraints
+import instrumentation
+import weight_est
+
+# Relative spread (lognormal sigma) of the constraint point estimates, sampled around their nominal values
+constraint_uncertainty = {
+    'e': 0.05,
+    'CD0': 0.20,
+    'CLmaxTO': 0.10,
+    'CLmaxL': 0.10,
+    'CLmaxCruise': 0.10,
+}
+
+# The aircraft weight table has 2 rows for 3 coefficients, so its residuals cannot be estimated from the data;
+# the fitted model is scaled by a lognormal factor with this sigma instead
+aircraft_uncertainty = 0.05
+
+# Weight closure inputs
+# The search range is wider than the sweep's so the upper tail of the weight is not cut off;
+# samples without a fixed point in it are reported as not converged
+weight_inputs = {
+    'TW_ratio': weight_est.constraint_params['tw_range'],
+    'Endurance': weight_est.constraint_params['endurance'], # hrs
+    'WTO_guess': weight_est.sweep_params['WTO_guess'], # lbs
+    'WTO_lower': 1, # lbs
+    'WTO_upper': 50, # lbs
+}
+
+percentile_levels = [5, 25, 50, 75, 95]
+
+# Condition the statistics of each output are taken under: the weight outputs need the weight closure
+# to converge, and the constraint outputs need the constraint diagram to be feasible at the closed weight
+output_conditions = {
+    'WTO': 'converged',
+    'W_motor': 'converged',
+    'W_battery': 'converged',
+    'Power': 'converged',
+    'tw_min': 'feasible',
+    'ws_opt': 'feasible',
+}
+
+# Sample a straight-line regression y = b0 + b1*x fitted to the data, n times
+# The coefficients are drawn from their OLS sampling distribution, and one residual draw per sample
+# is added to the intercept, so each sample is a plausible model of a new component
+def sample_regression(x, y, n, rng):
+    X = np.column_stack((np.ones(len(x)), x))
+    beta, rss, _, _ = np.linalg.lstsq(X, y, rcond=None)
+    dof = len(x) - X.shape[1]
+    s2 = rss[0] / dof
+    cov = s2 * np.linalg.inv(X.T @ X)
+    b = beta + rng.standard_normal((n, 2)) @ np.linalg.cholesky(cov).T
+    b[:, 0] += np.sqrt(s2) * rng.standard_normal(n)
+    return b[:, 0], b[:, 1]
+
+# Sample the coefficients of the linear weight models, in the form used by weight_est.component_estimates
+def sample_weight_coeffs(n, rng, aircraft_sigma=None):
+    aircraft_sigma = aircraft_uncertainty if aircraft_sigma is None else aircraft_sigma
+    data = weight_est.load_weight_data()
+    edf_data = data['edf_data']
+    lipo_data = data['lipo_data']
+    c = weight_est.linear_coefficients()
+
+    m0, m1 = sample_regression(edf_data['Thrust (lbs)'].values, edf_data['Weight (lbs)'].values, n, rng)
+    p0, p1 = sample_regression(edf_data['Thrust (lbs)'].values, edf_data['Power (W)'].values, n, rng)
+    d0, d1 = sample_regression(lipo_data['Energy (Wh)'].values, lipo_data['Energy Density (Wh/lb)'].values, n, rng)
+    scale = np.exp(aircraft_sigma * rng.standard_normal(n))
+    return {
+        'a0': c['a0'] * scale, 'a_b': c['a_b'] * scale, 'a_m': c['a_m'] * scale,
+        'm0': m0, 'm1': m1,
+        'p0': p0, 'p1': p1,
+        'd0': d0, 'd1': d1,
+    }
+
+# Sample the constraint parameters with a lognormal spread around the nominal values
+def sample_constraint_params(n, rng, uncertainty=None, params=None):
+    uncertainty = constraint_uncertainty if uncertainty is None else uncertainty
+    params = constraint_defaults if params is None else params
+    return {key: params[key] * np.exp(sigma * rng.standard_normal(n)) for key, sigma in uncertainty.items()}
+
+# Run one batch of samples through the weight closure and the constraint equations
+# Each sample's constraints use its own closed takeoff weight for the size constraint; samples that do not
+# converge are infeasible, and tw_min and ws_opt are NaN wherever the constraint diagram is infeasible
+def sample_batch(n, rng, inputs, uncertainty, aircraft_sigma):
+    coeffs = sample_weight_coeffs(n, rng, aircraft_sigma)
+    # Some sampled battery models pass through zero energy density inside the search range
+    with np.errstate(divide='ignore', invalid='ignore'):
+        WTO, W_motor, W_battery, Power = weight_est.batch_weight_estimate(
+            inputs['TW_ratio'], inputs['Endurance'], inputs['WTO_guess'], inputs['WTO_lower'], inputs['WTO_upper'], coeffs=coeffs)
+    with np.errstate(invalid='ignore'):
+        constraints = evaluate_constraints({**sample_constraint_params(n, rng, uncertainty), 'WTO_estimate': WTO})
+    feasible = constraints['feasible']
+    return {
+        'WTO': WTO,
+        'W_motor': W_motor,
+        'W_battery': W_battery,
+        'Power': Power,
+        'tw_min': np.where(feasible, constraints['tw_min'], np.nan),
+        'ws_opt': np.where(feasible, constraints['ws_opt'], np.nan),
+        'feasible': feasible,
+    }
+
+# Monte Carlo propagation of the regression and constraint parameter uncertainty
+# Samples are processed in vectorized batches of batch_size; returns one array per output
+@instrumentation.timed('monte_carlo.monte_carlo')
+def monte_carlo(n=100000, seed=None, inputs=None, uncertainty=None, aircraft_sigma=None, batch_size=100000):
+    if n < 1:
+        raise ValueError("Number of samples must be positive, got {}".format(n))
+    if batch_size < 1:
+        raise ValueError("Batch size must be positive, got {}".format(batch_size))
+    rng = np.random.default_rng(seed)
+    inputs = {**weight_inputs, **(inputs or {})}
+    batches = []
+    for start in range(0, n, batch_size):
+        batches.append(sample_batch(min(batch_size, n - start), rng, inputs, uncertainty, aircraft_sigma))
+    return {key: np.concatenate([b[key] for b in batches]) for key in batches[0]}
+
+# Percentiles of each sampled output over the samples where it is defined (not NaN), which is the condition
+# in output_conditions; 'valid' is the fraction of samples the statistics cover
+def summarize(samples, levels=None):
+    levels = percentile_levels if levels is None else levels
+    summary = {}
+    for key, values in samples.items():
+        if values.dtype == bool:
+            continue
+        valid = values[~np.isnan(values)]
+        summary[key] = {
+            'valid': valid.size / values.size,
+            'mean': valid.mean() if valid.size else np.nan,
+            'std': valid.std() if valid.size else np.nan,
+            **{'p{}'.format(q): v for q, v in zip(levels, np.percentile(valid, levels) if valid.size else [np.nan]*len(levels))},
+        }
+    return summary
+
+def print_summary(samples, levels=None):
+    levels = percentile_levels if levels is None else levels
+    summary = summarize(samples, levels)
+    n = len(samples['WTO'])
+    print("Samples: {}".format(n))
+    print("Weight closure converged: {:.2%}".format(np.mean(~np.isnan(samples['WTO']))))
+    print("Constraint diagram feasible at the closed weight: {:.2%}".format(np.mean(samples['feasible'])))
+    columns = ['valid', 'mean', 'std'] + ['p{}'.format(q) for q in levels]
+    titles = {
+        'converged': "Weight statistics over the valid samples only, conditional on convergence",
+        'feasible': "Constraint statistics over the valid samples only, conditional on feasibility",
+    }
+    for condition, title in titles.items():
+        print(title)
+        print("{:<10}".format('') + ''.join("{:>10}".format(c) for c in columns))
+        for key, stats in summary.items():
+            if output_conditions.get(key) == condition:
+                print("{:<10}".format(key) + ''.join("{:>10.4f}".format(stats[c]) for c in columns))
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Monte Carlo uncertainty of the takeoff weight and the minimum feasible T/W.')
+    parser.add_argument('--samples', type=int, default=100000, help='number of Monte Carlo samples')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    parser.add_argument('--batch-size', type=int, default=100000, help='samples evaluated per vectorized batch')
+    parser.add_argument('--out', default=None, help='save the samples to an .npz file')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.from_args(args):
+        samples = monte_carlo(args.samples, args.seed, batch_size=args.batch_size)
+        print_summary(samples)
+        if args.out:
+            np.savez(args.out, **samples)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import json
+import os
+import numpy as np
+from coeff_cache import cache_key
+import instrumentation
+from polar_tables import PolarTable
+
+# Polars of every surface, flap state and speed in one flat binary file with a JSON index
+# Each group (surface, flap state) holds a shared grid of the independent variable (alpha, or Beta for
+# side-slip sweeps) and a (speeds, columns, grid) float64 block that is read through a memory map
+# Speeds are stored in ft/s like the rest of the sizing code; the exports give QInf in m/s
+# The index names the binary file it describes, so replacing the index switches both at once
+STORE_DIR = 'data/polar_store'
+STORE_VERSION = 2
+FT_PER_M = 1 / 0.3048
+
+# Surface name and flap state from an export file name: 'Wing-Flap@30.csv' -> ('Wing', True)
+# Anything after '@' only tells exports of the same surface apart; the speed is read from QInf
+def polar_name(path):
+    name = os.path.splitext(os.path.basename(path))[0].split('@')[0]
+    tokens = name.split('-')
+    return '-'.join(t for t in tokens if t != 'Flap'), 'Flap' in tokens
+
+# Read one exported polar: its independent variable, speed (ft/s) and numeric columns
+def read_polar(path):
+    import pandas as pd
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+    ind = 'alpha' if df['alpha'].nunique() > 1 else 'Beta'
+    speeds = df['QInf'].unique()
+    if len(speeds) != 1:
+        raise ValueError("Polar '{}' mixes several speeds {}".format(path, list(speeds)))
+    df = df.drop(columns=['QInf'])
+    return ind, float(speeds[0]) * FT_PER_M, df
+
+# Ingest exported polars and write the store; exports of one group are resampled onto the union of their grids
+@instrumentation.timed('polar_store.build_store')
+def build_store(paths, store_dir=None):
+    store_dir = STORE_DIR if store_dir is None else store_dir
+    groups = {}
+    for path in sorted(paths):
+        surface, flap = polar_name(path)
+        ind, speed, df = read_polar(path)
+        group = groups.setdefault((surface, flap), {'ind': ind, 'polars': {}})
+        if ind != group['ind']:
+            raise ValueError("Polar '{}' is indexed by {}, other {} polars by {}".format(path, ind, surface, group['ind']))
+        if speed in group['polars']:
+            raise ValueError("Two {} polars at speed {}".format(surface, speed))
+        group['polars'][speed] = PolarTable(df, ind)
+
+    os.makedirs(store_dir, exist_ok=True)
+    key = cache_key(sorted(paths), {'version': STORE_VERSION})
+    data_name = 'polars-{}.bin'.format(key[:16])
+    index = {'version': STORE_VERSION, 'key': key, 'data': data_name, 'groups': []}
+    offset = 0
+    tmp_path = os.path.join(store_dir, '{}.{}.tmp'.format(data_name, os.getpid()))
+    with open(tmp_path, 'wb') as f:
+        for (surface, flap), group in sorted(groups.items()):
+            speeds = sorted(group['polars'])
+            tables = [group['polars'][speed] for speed in speeds]
+            x = np.unique(np.concatenate([t.x for t in tables]))
+            columns = [col for col in tables[0].columns if all(col in t.columns for t in tables)]
+            block = np.array([[t.lookup(x, col) for col in columns] for t in tables], dtype='<f8')
+            # Keep the exported values exactly at each polar's own points
+            for k, t in enumerate(tables):
+                own = np.searchsorted(x, t.x)
+                for i, col in enumerate(columns):
+                    block[k, i, own] = t.columns[col]
+            f.write(x.astype('<f8').tobytes())
+            f.write(block.tobytes())
+            index['groups'].append({
+                'surface': surface, 'flap': flap, 'ind': group['ind'],
+                'speeds': speeds, 'columns': columns,
+                'offset': offset, 'points': len(x),
+            })
+            offset += x.size + block.size
+    # The binary is in place before the index that points to it; readers of the old index keep the old binary
+    os.replace(tmp_path, os.path.join(store_dir, data_name))
+    tmp_path = os.path.join(store_dir, 'index.json.{}.tmp'.format(os.getpid()))
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, os.path.join(store_dir, 'index.json'))
+    for name in os.listdir(store_dir):
+        if name.startswith('polars') and name.endswith('.bin') and name != data_name:
+            os.remove(os.path.join(store_dir, name))
+    return PolarStore(store_dir)
+
+# Read access to a built store
+class PolarStore:
+    def __init__(self, store_dir=None):
+        self.store_dir = STORE_DIR if store_dir is None else store_dir
+        with open(os.path.join(self.store_dir, 'index.json')) as f:
+            self.index = json.load(f)
+        if self.index.get('version') != STORE_VERSION:
+            raise ValueError("Polar store '{}' has version {}, expected {}; rebuild it".format(self.store_dir, self.index.get('version'), STORE_VERSION))
+        self.data = np.memmap(os.path.join(self.store_dir, self.index['data']), dtype='<f8', mode='r')
+        self.groups = {(g['surface'], g['flap']): g for g in self.index['groups']}
+
+    def surfaces(self):
+        return sorted(self.groups)
+
+    def group(self, surface, flap=False):
+        if (surface, flap) not in self.groups:
+            raise ValueError("No {}polar for surface '{}' in the store, expected one of {}".format(
+                'flapped ' if flap else '', surface, self.surfaces()))
+        return self.groups[(surface, flap)]
+
+    def speeds(self, surface, flap=False):
+        return np.array(self.group(surface, flap)['speeds'])
+
+    # Grid and (speeds, columns, grid) block of a group, as views of the memory map
+    def arrays(self, surface, flap=False):
+        g = self.group(surface, flap)
+        n = g['points']
+        x = self.data[g['offset']:g['offset'] + n]
+        block = self.data[g['offset'] + n:g['offset'] + n + len(g['speeds']) * len(g['columns']) * n]
+        return x, block.reshape(len(g['speeds']), len(g['columns']), n)
+
+    # Bilinear lookup of a column at arrays of the independent variable and speed (ft/s)
+    # Linear in the independent variable with extrapolation like PolarTable; speed is clamped to the stored range
+    @instrumentation.timed('PolarStore.lookup')
+    def lookup(self, surface, column, x_new, speed=None, flap=False):
+        g = self.group(surface, flap)
+        if column not in g['columns']:
+            raise ValueError("Unknown polar column '{}', expected one of {}".format(column, g['columns']))
+        x, block = self.arrays(surface, flap)
+        y = block[:, g['columns'].index(column)]
+        speeds = np.array(g['speeds'])
+        x_new = np.asarray(x_new, dtype=float)
+        lo = np.clip(np.searchsorted(x, x_new), 1, len(x) - 1) - 1
+        if len(speeds) == 1 or speed is None:
+            if len(speeds) > 1:
+                raise ValueError("Surface '{}' has polars at several speeds, give a speed".format(surface))
+            return (y[0, lo + 1] - y[0, lo]) / (x[lo + 1] - x[lo]) * (x_new - x[lo]) + y[0, lo]
+        speed = np.clip(np.asarray(speed, dtype=float), speeds[0], speeds[-1])
+        j = np.clip(np.searchsorted(speeds, speed), 1, len(speeds) - 1) - 1
+        w = (speed - speeds[j]) / (speeds[j + 1] - speeds[j])
+        v0 = (y[j, lo + 1] - y[j, lo]) / (x[lo + 1] - x[lo]) * (x_new - x[lo]) + y[j, lo]
+        v1 = (y[j + 1, lo + 1] - y[j + 1, lo]) / (x[lo + 1] - x[lo]) * (x_new - x[lo]) + y[j + 1, lo]
+        return (1 - w) * v0 + w * v1
+
+    # PolarTable of a surface at one speed (ft/s), interpolated between the stored speeds
+    def polar_table(self, surface, speed=None, flap=False):
+        g = self.group(surface, flap)
+        x, block = self.arrays(surface, flap)
+        speeds = np.array(g['speeds'])
+        if len(speeds) == 1 or speed is None:
+            if len(speeds) > 1:
+                raise ValueError("Surface '{}' has polars at several speeds, give a speed".format(surface))
+            values = block[0]
+        else:
+            speed = min(max(float(speed), speeds[0]), speeds[-1])
+            j = min(max(int(np.searchsorted(speeds, speed)), 1), len(speeds) - 1) - 1
+            w = (speed - speeds[j]) / (speeds[j + 1] - speeds[j])
+            values = (1 - w) * block[j] + w * block[j + 1]
+        return PolarTable.from_arrays(x, dict(zip(g['columns'], values)), g['ind'])
+
+# Open the store, building it first when it is missing or older than the given export files
+def open_store(paths=None, store_dir=None):
+    store_dir = STORE_DIR if store_dir is None else store_dir
+    index_path = os.path.join(store_dir, 'index.json')
+    if paths is not None:
+        key = cache_key(sorted(paths), {'version': STORE_VERSION})
+        stale = True
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                stale = json.load(f).get('key') != key
+        if stale:
+            return build_store(paths, store_dir)
+    return PolarStore(store_dir)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Build the binary polar store from exported polar CSV files.')
+    parser.add_argument('paths', nargs='+', help="exported polars, named '<surface>[-Flap][@<tag>].csv'")
+    parser.add_argument('--store', default=STORE_DIR, help='store directory')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.from_args(args):
+        store = build_store(args.paths, args.store)
+        for surface, flap in store.surfaces():
+            g = store.group(surface, flap)
+            print("{:<16} {:<5} {:>4} {} points at speeds {} ft/s".format(surface, 'flap' if flap else '', g['points'], g['ind'], g['speeds']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import numpy as np
+import instrumentation
+
+# Polar data loaded once and kept as sorted contiguous arrays for repeated lookups
+class PolarTable:
+    @instrumentation.timed('PolarTable.build')
+    def __init__(self, df, ind='alpha'):
+        # Sort the dataframe by the independent variable to ensure correct interpolation
+        df_sorted = df.sort_values(by=ind)
+        self.set_arrays(ind, df_sorted[ind].values, {col: df_sorted[col].values for col in df_sorted.columns if col != ind})
+
+    def set_arrays(self, ind, x, columns):
+        self.ind = ind
+        self.x = np.ascontiguousarray(x, dtype=float)
+        self.columns = {col: np.ascontiguousarray(y, dtype=float) for col, y in columns.items()}
+        # Per-segment slopes, evaluated the same way as interp1d
+        self.slopes = {
+            col: (y[1:] - y[:-1]) / (self.x[1:] - self.x[:-1])
+            for col, y in self.columns.items()
+        }
+
+    @classmethod
+    def from_csv(cls, path, ind='alpha'):
+        import pandas as pd
+        return cls(pd.read_csv(path), ind)
+
+    # Table from arrays already sorted by the independent variable
+    @classmethod
+    def from_arrays(cls, x, columns, ind='alpha'):
+        table = cls.__new__(cls)
+        table.set_arrays(ind, x, columns)
+        return table
+
+    # Linear interpolation that extrapolates past either end, like interp1d(fill_value="extrapolate")
+    @instrumentation.timed('PolarTable.lookup')
+    def lookup(self, target, dep):
+        x_new = np.asarray(target, dtype=float)
+        lo = np.clip(np.searchsorted(self.x, x_new), 1, len(self.x) - 1) - 1
+        return self.slopes[dep][lo] * (x_new - self.x[lo]) + self.columns[dep][lo]
+
+    def CL(self, alpha):
+        return self.lookup(alpha, 'CL')
+
+    def CD(self, alpha):
+        return self.lookup(alpha, 'CD')
+
+    def Cm(self, alpha):
+        return self.lookup(alpha, 'Cm')
+
+    def Cl(self, alpha):
+        return self.lookup(alpha, 'Cl')
+
+    def Cn(self, alpha):
+        return self.lookup(alpha, 'Cn')
+
+    def CY(self, alpha):
+        return self.lookup(alpha, 'CY')
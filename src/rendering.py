@@ -0,0 +1,82 @@
+import os
+import numpy as np
+
+# Figures are drawn by draw(fig, *args) functions so the same code can show a figure on screen
+# or render it headless to a file with a non-interactive backend
+formats = ('png', 'svg', 'pdf')
+
+# Keep at most max_points evenly spaced samples of curves sharing the x array, always keeping both ends
+# Arrays in ys are indexed along their first axis like x
+def downsample(max_points, x, *ys):
+    if max_points is None or len(x) <= max_points:
+        return (x, *ys)
+    idx = np.unique(np.linspace(0, len(x) - 1, max(2, max_points)).round().astype(int))
+    return (np.asarray(x)[idx], *(np.asarray(y)[idx] for y in ys))
+
+def check_format(path):
+    format = os.path.splitext(path)[1].lstrip('.').lower()
+    if format not in formats:
+        raise ValueError("Unknown figure format '{}', expected one of {}".format(format, list(formats)))
+    return format
+
+# Draw a figure without pyplot and save it; the format follows the file extension
+def save_figure(draw, args, path):
+    from matplotlib.figure import Figure
+    fig = Figure()
+    draw(fig, *args)
+    fig.savefig(path, format=check_format(path))
+    return path
+
+# Renders figures in a background process so the sweep does not wait for its plots
+class BackgroundRenderer:
+    def __init__(self):
+        self.executor = None
+        self.futures = []
+
+    def submit(self, draw, args, path):
+        check_format(path)
+        if self.executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=1)
+        future = self.executor.submit(save_figure, draw, args, path)
+        self.futures.append(future)
+        return future
+
+    # Wait for every submitted figure, raising the first rendering error
+    def close(self):
+        if self.executor is None:
+            return
+        try:
+            for future in self.futures:
+                future.result()
+        finally:
+            self.executor.shutdown()
+            self.executor = None
+            self.futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Show the figure on screen, or render it to out, in the background when a renderer is given
+def render(draw, args, out=None, renderer=None):
+    if out is None:
+        import matplotlib.pyplot as plt
+        draw(plt.figure(), *args)
+        plt.show()
+    elif renderer is not None:
+        return renderer.submit(draw, args, out)
+    else:
+        return save_figure(draw, args, out)
+
+# Argument type for figure paths, so a bad extension fails before the sweep runs
+def figure_path(path):
+    check_format(path)
+    return path
+
+# Command line flags shared by the plotting entry points
+def add_arguments(parser):
+    parser.add_argument('--plot-out', type=figure_path, default=None, metavar='PATH', help='render the figure to a PNG, SVG or PDF file instead of showing it')
+    parser.add_argument('--max-points', type=int, default=None, help='down-sample each plotted curve to at most this many points')
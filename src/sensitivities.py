@@ -0,0 +1,186 @@
+import numpy as np
+import instrumentation
+import weight_est
+
+# Forward-mode automatic differentiation for the closed-form sizing functions
+# A Dual carries a value and its derivatives with respect to every seeded input along a trailing axis,
+# so one evaluation gives the value and the full gradient; values and tangents broadcast like arrays.
+class Dual:
+    def __init__(self, value, tangent):
+        self.value = np.asarray(value, dtype=float)
+        self.tangent = np.asarray(tangent, dtype=float)
+
+    # Value and tangent of an operand; constants have zero derivatives
+    @staticmethod
+    def parts(x, n):
+        if isinstance(x, Dual):
+            return x.value, x.tangent
+        x = np.asarray(x, dtype=float)
+        return x, np.zeros(x.shape + (n,))
+
+    def __add__(self, other):
+        b, db = Dual.parts(other, self.tangent.shape[-1])
+        return Dual(self.value + b, self.tangent + db)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        b, db = Dual.parts(other, self.tangent.shape[-1])
+        return Dual(self.value - b, self.tangent - db)
+
+    def __rsub__(self, other):
+        b, db = Dual.parts(other, self.tangent.shape[-1])
+        return Dual(b - self.value, db - self.tangent)
+
+    def __mul__(self, other):
+        b, db = Dual.parts(other, self.tangent.shape[-1])
+        return Dual(self.value * b, self.tangent * b[..., None] + self.value[..., None] * db)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        b, db = Dual.parts(other, self.tangent.shape[-1])
+        return Dual(self.value / b, (self.tangent * b[..., None] - self.value[..., None] * db) / (b**2)[..., None])
+
+    def __rtruediv__(self, other):
+        b, db = Dual.parts(other, self.tangent.shape[-1])
+        return Dual(b / self.value, (db * self.value[..., None] - b[..., None] * self.tangent) / (self.value**2)[..., None])
+
+    def __neg__(self):
+        return Dual(-self.value, -self.tangent)
+
+    # Constant exponents only
+    def __pow__(self, p):
+        if isinstance(p, Dual):
+            raise ValueError("Dual exponents are not supported")
+        return Dual(self.value**p, (p * self.value**(p - 1))[..., None] * self.tangent)
+
+    # numpy functions applied to Duals, and numpy scalars or arrays on the left of an operator
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs:
+            return NotImplemented
+        if ufunc in binary_ufuncs:
+            a, b = inputs
+            if not isinstance(a, Dual):
+                return getattr(b, binary_ufuncs[ufunc][1])(a)
+            return getattr(a, binary_ufuncs[ufunc][0])(b)
+        if ufunc in unary_ufuncs:
+            x = inputs[0]
+            value, slope = unary_ufuncs[ufunc](x.value)
+            return Dual(value, slope[..., None] * x.tangent)
+        return NotImplemented
+
+binary_ufuncs = {
+    np.add: ('__add__', '__radd__'),
+    np.subtract: ('__sub__', '__rsub__'),
+    np.multiply: ('__mul__', '__rmul__'),
+    np.true_divide: ('__truediv__', '__rtruediv__'),
+}
+
+# Value and derivative of each supported one-argument function
+unary_ufuncs = {
+    np.negative: lambda x: (-x, -np.ones_like(x)),
+    np.sqrt: lambda x: (np.sqrt(x), 0.5 / np.sqrt(x)),
+    np.square: lambda x: (x**2, 2 * x),
+    np.exp: lambda x: (np.exp(x), np.exp(x)),
+    np.log: lambda x: (np.log(x), 1 / x),
+    np.deg2rad: lambda x: (np.deg2rad(x), np.full_like(x, np.pi / 180)),
+    np.rad2deg: lambda x: (np.rad2deg(x), np.full_like(x, 180 / np.pi)),
+}
+
+# Duals for a dict of inputs, one derivative direction per input in order
+def seed(values):
+    n = len(values)
+    return {name: Dual(value, np.eye(n)[k] * np.ones(np.shape(value) + (1,))) for k, (name, value) in enumerate(values.items())}
+
+# Value and {input: derivative} of a Dual result, for inputs named in seeding order
+def split(result, names):
+    if not isinstance(result, Dual):
+        value = np.asarray(result, dtype=float)
+        return value, {name: np.zeros(value.shape) for name in names}
+    return result.value, {name: result.tangent[..., k] for k, name in enumerate(names)}
+
+# Value and derivatives of fn(*args, params) with respect to params entries and positional arguments
+# wrt holds params keys and integer positions in args; e.g. sensitivities(TW_req, [CD0], params, [0, 'AR', 'e'])
+def sensitivities(fn, args, params, wrt):
+    for name in wrt:
+        if isinstance(name, int):
+            if not 0 <= name < len(args):
+                raise ValueError("No positional argument {}, fn takes {} before params".format(name, len(args)))
+        elif name not in params:
+            raise ValueError("Unknown parameter '{}'".format(name))
+    duals = seed({name: args[name] if isinstance(name, int) else params[name] for name in wrt})
+    args = [duals.get(k, arg) for k, arg in enumerate(args)]
+    params = {**params, **{name: dual for name, dual in duals.items() if not isinstance(name, int)}}
+    instrumentation.count('sensitivities evaluations')
+    return split(fn(*args, params), list(wrt))
+
+# Names of the weight closure inputs that can be differentiated: the closure inputs and the linear model coefficients
+weight_inputs = ['TW_ratio', 'Endurance', 'a0', 'a_b', 'a_m', 'm0', 'm1', 'p0', 'p1', 'd0', 'd1']
+
+# Derivatives of the converged takeoff weight closure by implicit differentiation
+# At the fixed point WTO = f(WTO, x), dWTO/dx = (df/dx) / (1 - df/dWTO), with both partials from one
+# dual evaluation of the component models at the converged WTO (a scalar or an array from batch_weight_estimate).
+# The derivative is that of the exact fixed point, so it does not depend on the solver tolerance.
+# Returns {output: {input: derivative}} for WTO, W_motor, W_battery and Power
+def weight_sensitivities(WTO, TW_ratio, Endurance, wrt=None, coeffs=None):
+    wrt = weight_inputs if wrt is None else list(wrt)
+    for name in wrt:
+        if name not in weight_inputs:
+            raise ValueError("Unknown weight input '{}', expected one of {}".format(name, weight_inputs))
+    values = {'TW_ratio': TW_ratio, 'Endurance': Endurance, **weight_est.linear_coefficients(), **(coeffs or {})}
+    duals = seed({**{name: values[name] for name in wrt}, 'WTO': WTO})
+    inputs = {**values, **duals}
+    c = {key: inputs[key] for key in weight_inputs[2:]}
+    Wmotor, Wbattery, Power, WTO_calc = weight_est.component_estimates(inputs['TW_ratio'] * duals['WTO'], inputs['Endurance'], c)
+
+    n = len(wrt)
+    dWTO = WTO_calc.tangent[..., :n] / (1 - WTO_calc.tangent[..., n])[..., None]
+    result = {'WTO': {name: dWTO[..., k] for k, name in enumerate(wrt)}}
+    for output, value in (('W_motor', Wmotor), ('W_battery', Wbattery), ('Power', Power)):
+        total = value.tangent[..., :n] + value.tangent[..., n:] * dWTO
+        result[output] = {name: total[..., k] for k, name in enumerate(wrt)}
+    instrumentation.count('sensitivities evaluations')
+    return result
+
+# H-stab parameters that main reports derivatives for
+hstab_inputs = ['AR', 'zh', 'SM_wing', 'S', 'MAC', 'ARh', 'CL0wf', 'CLawf', 'CL0h', 'CLah']
+
+# Print a value and its derivatives; arg_names labels the positional arguments
+def print_gradients(label, value, gradients, arg_names=()):
+    print("{} = {:.6g}".format(label, float(value)))
+    for name, d in gradients.items():
+        print("  d/d{:<10} {: .6e}".format(arg_names[name] if isinstance(name, int) else name, float(d)))
+
+def main():
+    import argparse
+    from hstab_params import get_params
+    from hstab_sizing import SM, TW_req, aoa, calculate_bh
+    parser = argparse.ArgumentParser(description='Exact derivatives of the sizing functions at a design point.')
+    parser.add_argument('--lh', type=float, default=1.702, help='tail moment arm (ft)')
+    parser.add_argument('--aoa-trim', type=float, default=5.0, help='trim angle of attack (deg)')
+    parser.add_argument('--cd0', type=float, default=0.012, help='zero-lift drag coefficient for T/W_req')
+    parser.add_argument('--tw', type=float, default=weight_est.constraint_params['tw_range'], help='thrust-to-weight ratio of the weight closure')
+    parser.add_argument('--endurance', type=float, default=weight_est.constraint_params['endurance'], help='endurance of the weight closure (hrs)')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.from_args(args):
+        params = get_params()
+        bh = calculate_bh(args.lh, args.aoa_trim, params)
+        # Partial derivatives: bh is an input of aoa and SM
+        print_gradients('bh', *sensitivities(calculate_bh, [args.lh, args.aoa_trim], params, [0, 1] + hstab_inputs), ['lh', 'aoa_trim'])
+        print_gradients('aoa_TO/L', *sensitivities(aoa, [args.lh, bh, params['CLmaxL/TO']], params, [0, 1] + hstab_inputs), ['lh', 'bh'])
+        print_gradients('SM', *sensitivities(SM, [args.lh, bh], params, [0, 1] + hstab_inputs), ['lh', 'bh'])
+        print_gradients('T/W_req', *sensitivities(TW_req, [args.cd0], params, [0, 'W/S', 'rho_alt', 'Vmax', 'e', 'AR']), ['CD0'])
+
+        result = weight_est.weight_estimate(args.tw, args.endurance, weight_est.sweep_params['WTO_guess'], weight_est.sweep_params['WTO_lower'],
+                                            weight_est.sweep_params['WTO_upper'], method='newton', rtol=1e-12)
+        if result is None:
+            print("Weight closure did not converge")
+            return
+        for output, gradients in weight_sensitivities(result[0], args.tw, args.endurance).items():
+            print_gradients(output, result[['WTO', 'W_motor', 'W_battery', 'Power'].index(output)], gradients)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import numpy as np
+import instrumentation
+from constraint_params import params as constraint_defaults
+from constraints import evaluate_constraints
+import hstab_params
+from hstab_sizing import evaluate_points
+import stability_params
+from stability_coeffs import stability_maps, statically_stable
+import weight_est
+
+# Local sizing service: one JSON request per line over TCP, one JSON response per line carrying the request id
+# e.g. {"id": 1, "op": "weight_estimate", "TW_ratio": 0.8, "Endurance": 0.1}
+# Requests of the same kind that arrive together are answered by one vectorized evaluation
+HOST = '127.0.0.1'
+PORT = 8765
+
+# JSON value of a result entry; NaN and infinity become null
+def to_json(value):
+    value = value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+# Batched evaluations, each taking a list of complete requests and returning one result per request
+
+# Takeoff weight closure; requests are grouped by search bracket since batch_weight_estimate takes one bracket
+def weight_batch(requests):
+    results = [None] * len(requests)
+    groups = {}
+    for k, request in enumerate(requests):
+        groups.setdefault((request['WTO_guess'], request['WTO_lower'], request['WTO_upper']), []).append(k)
+    for bracket, idx in groups.items():
+        TW_ratio = np.array([requests[k]['TW_ratio'] for k in idx], dtype=float)
+        Endurance = np.array([requests[k]['Endurance'] for k in idx], dtype=float)
+        WTO, W_motor, W_battery, Power = weight_est.batch_weight_estimate(TW_ratio, Endurance, *bracket)
+        for j, k in enumerate(idx):
+            results[k] = {
+                'converged': bool(np.isfinite(WTO[j])),
+                'WTO': to_json(WTO[j]),
+                'W_motor': to_json(W_motor[j]),
+                'W_battery': to_json(W_battery[j]),
+                'Power': to_json(Power[j]),
+            }
+    return results
+
+# H-stab verify checks at the trim bh of each (lh, aoa_trim)
+def verify_batch(requests):
+    lh = np.array([request['lh'] for request in requests], dtype=float)
+    aoa_trim = np.array([request['aoa_trim'] for request in requests], dtype=float)
+    checks, data = evaluate_points(lh, aoa_trim, hstab_params.get_params())
+    verified = np.logical_and.reduce(list(checks.values()))
+    return [{
+        'verified': bool(verified[k]),
+        'checks': {name: bool(passed[k]) for name, passed in checks.items()},
+        **{column: to_json(values[k]) for column, values in data.items()},
+    } for k in range(len(requests))]
+
+# Parameters that differ between requests become arrays, the rest stay scalars
+def stack_params(requests):
+    return {key: np.array([request[key] for request in requests], dtype=float) if any(request[key] != requests[0][key] for request in requests) else requests[0][key]
+            for key in requests[0] if key != 'op'}
+
+# Constraint diagram design point and feasibility
+def constraints_batch(requests):
+    result = evaluate_constraints(stack_params(requests))
+    n = len(requests)
+    result = {key: np.broadcast_to(value, (n,)) for key, value in result.items()}
+    return [{key: to_json(value[k]) for key, value in result.items()} for k in range(n)]
+
+# Stability coefficients and static stability
+def stability_batch(requests):
+    arrays = {key: value for key, value in stack_params(requests).items() if np.ndim(value)}
+    n = len(requests)
+    params = {**stability_params.params, **{key: value for key, value in requests[0].items() if key != 'op'}}
+    coefficients = stability_maps(params, **arrays)
+    stable = np.broadcast_to(statically_stable(coefficients), (n,))
+    coefficients = {key: np.broadcast_to(value, (n,)) for key, value in coefficients.items()}
+    return [{'stable': bool(stable[k]), **{key: to_json(value[k]) for key, value in coefficients.items()}} for k in range(n)]
+
+# Request kinds: required fields, optional fields with their defaults and the batched evaluation
+operations = {
+    'weight_estimate': {
+        'required': ['TW_ratio', 'Endurance'],
+        'optional': {key: weight_est.sweep_params[key] for key in ('WTO_guess', 'WTO_lower', 'WTO_upper')},
+        'evaluate': weight_batch,
+        'example': {'TW_ratio': weight_est.constraint_params['tw_range'], 'Endurance': weight_est.constraint_params['endurance']},
+    },
+    'verify': {
+        'required': ['lh', 'aoa_trim'],
+        'optional': {},
+        'evaluate': verify_batch,
+        'example': {'lh': stability_params.params['lh'], 'aoa_trim': stability_params.params['aoa_trim']},
+    },
+    'constraints': {
+        'required': [],
+        'optional': constraint_defaults,
+        'evaluate': constraints_batch,
+        'example': {},
+    },
+    'stability': {
+        'required': [],
+        'optional': stability_params.params,
+        'evaluate': stability_batch,
+        'example': {},
+    },
+}
+
+# Check a request and fill in its defaults; returns the operation name and the complete request
+def parse_request(message):
+    op = message.get('op')
+    if op not in operations:
+        raise ValueError("Unknown op '{}', expected one of {}".format(op, list(operations) + ['stats']))
+    spec = operations[op]
+    fields = {key: value for key, value in message.items() if key not in ('op', 'id')}
+    for key in spec['required']:
+        if key not in fields:
+            raise ValueError("Missing field '{}' for op '{}'".format(key, op))
+    for key, value in fields.items():
+        if key not in spec['required'] and key not in spec['optional']:
+            raise ValueError("Unknown field '{}' for op '{}', expected one of {}".format(key, op, spec['required'] + list(spec['optional'])))
+        if not isinstance(value, (int, float)):
+            raise ValueError("Field '{}' must be a number".format(key))
+    return op, {'op': op, **spec['optional'], **fields}
+
+# Collects requests of one kind and evaluates them together once the event loop has
+# taken in every request that is already waiting, or after max_wait seconds
+class Batcher:
+    def __init__(self, evaluate, max_batch=4096, max_wait=0.0):
+        self.evaluate = evaluate
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = []
+        self.handle = None
+        self.batches = 0
+        self.requests = 0
+
+    def submit(self, request):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((request, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.handle is None:
+            self.handle = loop.call_later(self.max_wait, self.flush) if self.max_wait else loop.call_soon(self.flush)
+        return future
+
+    def flush(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        instrumentation.observe('sizing_service batch size', len(batch))
+        try:
+            results = self.evaluate([request for request, _ in batch])
+        except Exception as error:
+            if len(batch) == 1:
+                self.resolve(batch[0][1], error=error)
+                return
+            # One failing request fails the whole evaluation; evaluating the requests one by one
+            # gives every other request its result and each failing one its own error
+            instrumentation.count('sizing_service batch fallback')
+            for request, future in batch:
+                try:
+                    self.resolve(future, self.evaluate([request])[0])
+                except Exception as error:
+                    self.resolve(future, error=error)
+            return
+        for (_, future), result in zip(batch, results):
+            self.resolve(future, result)
+
+    # Futures of clients that went away may already be cancelled
+    def resolve(self, future, result=None, error=None):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+class SizingService:
+    def __init__(self, max_batch=4096, max_wait=0.0):
+        self.batchers = {op: Batcher(spec['evaluate'], max_batch, max_wait) for op, spec in operations.items()}
+
+    # Load the data, fit the models and build the polar tables before the first request
+    def warm_up(self):
+        for op, spec in operations.items():
+            spec['evaluate']([parse_request({'op': op, **spec['example']})[1]])
+
+    # Requests and batches evaluated so far
+    def stats(self):
+        return {op: {'requests': b.requests, 'batches': b.batches} for op, b in self.batchers.items()}
+
+    # Future of the result of one request; bad requests raise ValueError right away
+    def submit(self, message):
+        op, request = parse_request(message)
+        return self.batchers[op].submit(request)
+
+    # Answer one request in process
+    async def query(self, message):
+        return await self.respond(message, self.submit(message))
+
+    async def respond(self, message, future):
+        try:
+            return {'id': message.get('id'), 'result': await future}
+        except Exception as error:
+            return {'id': message.get('id'), 'error': "{}: {}".format(type(error).__name__, error)}
+
+    async def write_response(self, writer, message, future):
+        response = await self.respond(message, future)
+        writer.write((json.dumps(response) + '\n').encode())
+
+    async def handle_connection(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                # Requests are submitted as they are read, so every line already received joins the next batch
+                message = None
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("Request must be a JSON object")
+                    if message.get('op') == 'stats':
+                        writer.write((json.dumps({'id': message.get('id'), 'result': self.stats()}) + '\n').encode())
+                        continue
+                    future = self.submit(message)
+                except ValueError as error:
+                    message = message if isinstance(message, dict) else {}
+                    writer.write((json.dumps({'id': message.get('id'), 'error': "ValueError: {}".format(error)}) + '\n').encode())
+                    continue
+                task = asyncio.ensure_future(self.write_response(writer, message, future))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=HOST, port=PORT):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+# Send requests over one connection and return the responses in request order
+# Requests without an id are numbered by position
+async def request_many(messages, host=HOST, port=PORT):
+    messages = [{'id': k, **message} for k, message in enumerate(messages)]
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(''.join(json.dumps(message) + '\n' for message in messages).encode())
+        await writer.drain()
+        responses = {}
+        for _ in messages:
+            response = json.loads(await reader.readline())
+            responses[response['id']] = response
+        return [responses[message['id']] for message in messages]
+    finally:
+        writer.close()
+
+def main():
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Local JSON sizing service with warm caches and batched evaluation.')
+    parser.add_argument('--host', default=HOST, help='address to listen on or connect to')
+    parser.add_argument('--port', type=int, default=PORT, help='port to listen on or connect to')
+    parser.add_argument('--max-batch', type=int, default=4096, help='largest number of requests evaluated together')
+    parser.add_argument('--max-wait', type=float, default=0.0, help='seconds to wait for more requests before evaluating a batch')
+    parser.add_argument('--query', nargs='+', metavar='JSON', default=None, help='send requests to a running service and print the responses')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.query:
+        for response in asyncio.run(request_many([json.loads(q) for q in args.query], args.host, args.port)):
+            print(json.dumps(response))
+        return
+
+    async def serve():
+        service = SizingService(args.max_batch, args.max_wait)
+        start = time.perf_counter()
+        service.warm_up()
+        server = await service.start(args.host, args.port)
+        print("Warm-up: {:.3f} s".format(time.perf_counter() - start))
+        print("Serving {} on {}:{}".format(', '.join(operations), args.host, args.port), flush=True)
+        async with server:
+            await server.serve_forever()
+
+    with instrumentation.from_args(args):
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+import json
+import os
+import re
+import sqlite3
+import time
+import numpy as np
+import instrumentation
+
+# Solutions of many runs in one SQLite file, with the parameters of each run and indexes for range and top-k queries
+# Columns keep their solution names ('T/W_req', 'bh (ft)', ...); the SQL names are derived from them
+STORE_PATH = 'data/solutions/solutions.db'
+
+# Columns indexed when the store is created; indexes speed up range and order-by queries on them
+# at the cost of slower inserts
+default_indexed = ['lh (ft)', 'bh (ft)', 'aoa_trim (deg)', 'T/W_req', 'SM']
+
+# SQL identifier of a solution column: 'T/W_req' -> 'T_W_req', 'lh (ft)' -> 'lh_ft'
+def sql_name(column):
+    return re.sub(r'[^0-9A-Za-z]+', '_', column).strip('_')
+
+# JSON value of a run parameter; numpy values become Python numbers and tuples become lists
+def json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError("Cannot store {!r} as a run parameter".format(value))
+
+class SolutionStore:
+    # columns is needed to create a new store; an existing store keeps the columns it was created with
+    def __init__(self, path=None, columns=None, indexed=None):
+        self.path = STORE_PATH if path is None else path
+        # Connecting creates the file, so a mistyped path would leave an empty store behind
+        if columns is None and self.path != ':memory:' and not os.path.exists(self.path):
+            raise ValueError("Store '{}' does not exist yet, give its columns".format(self.path))
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        # A larger page cache keeps index pages in memory during bulk inserts
+        self.db.execute('PRAGMA cache_size=-65536')
+        stored = [row[0] for row in self.db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='columns'")]
+        if stored:
+            self.columns = [row[0] for row in self.db.execute('SELECT name FROM columns ORDER BY position')]
+            if columns is not None and list(columns) != self.columns:
+                raise ValueError("Store '{}' holds columns {}, not {}".format(self.path, self.columns, list(columns)))
+        else:
+            if columns is None:
+                raise ValueError("Store '{}' does not exist yet, give its columns".format(self.path))
+            self.columns = list(columns)
+            self.create(default_indexed if indexed is None else indexed)
+        self.sql_names = {column: sql_name(column) for column in self.columns}
+        self.indexed = {row[0][len('solutions_'):] for row in self.db.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='solutions'")}
+
+    def create(self, indexed):
+        names = [sql_name(column) for column in self.columns]
+        if len(set(names)) != len(names):
+            raise ValueError("Columns {} do not map to distinct SQL names".format(self.columns))
+        for column in indexed:
+            if column not in self.columns:
+                raise ValueError("Unknown column '{}' to index, expected one of {}".format(column, self.columns))
+        with self.db:
+            self.db.execute('CREATE TABLE columns (position INTEGER PRIMARY KEY, name TEXT, sql_name TEXT)')
+            self.db.executemany('INSERT INTO columns VALUES (?, ?, ?)', [(k, column, name) for k, (column, name) in enumerate(zip(self.columns, names))])
+            self.db.execute('CREATE TABLE runs (run_id INTEGER PRIMARY KEY, created REAL, source TEXT, params TEXT, rows INTEGER)')
+            self.db.execute('CREATE TABLE solutions (run_id INTEGER REFERENCES runs, {})'.format(', '.join('{} REAL'.format(name) for name in names)))
+            self.db.execute('CREATE INDEX solutions_run_id ON solutions (run_id)')
+            for column in indexed:
+                self.db.execute('CREATE INDEX solutions_{0} ON solutions ({0})'.format(sql_name(column)))
+
+    # Register a run and return its id; params is any JSON-serializable dict, e.g. the sizing parameters
+    def add_run(self, params=None, source=None):
+        with self.db:
+            cursor = self.db.execute('INSERT INTO runs (created, source, params, rows) VALUES (?, ?, ?, 0)',
+                                     (time.time(), source, json.dumps(params or {}, default=json_default)))
+        return cursor.lastrowid
+
+    # Bulk insert one chunk of rows given as a dict of equal-length 1-D arrays, in one transaction
+    @instrumentation.timed('SolutionStore.insert')
+    def insert(self, run_id, data):
+        arrays = [np.asarray(data[column], dtype=np.float64) for column in self.columns]
+        n = len(arrays[0]) if arrays else 0
+        if n == 0:
+            return 0
+        # NaN is stored as NULL, which never matches a range
+        rows = zip([run_id] * n, *(np.where(np.isnan(a), None, a).tolist() if np.isnan(a).any() else a.tolist() for a in arrays))
+        with self.db:
+            self.db.executemany('INSERT INTO solutions VALUES ({})'.format(', '.join('?' * (len(self.columns) + 1))), rows)
+            self.db.execute('UPDATE runs SET rows = rows + ? WHERE run_id = ?', (n, run_id))
+        return n
+
+    def check_column(self, column):
+        if column not in self.sql_names:
+            raise ValueError("Unknown solution column '{}', expected one of {}".format(column, self.columns))
+        return self.sql_names[column]
+
+    # Rows with every column in where inside its (low, high) range, bounds inclusive and None for an open end,
+    # sorted by order_by and cut to limit rows; returns a dict of arrays with the run_id of each row
+    @instrumentation.timed('SolutionStore.query')
+    def query(self, where=None, order_by=None, descending=False, limit=None, runs=None, columns=None):
+        columns = self.columns if columns is None else list(columns)
+        select = ['run_id'] + [self.check_column(column) for column in columns]
+        ranges = {}
+        for column, (low, high) in (where or {}).items():
+            name = self.check_column(column)
+            clauses, values = ranges.setdefault(name, ([], []))
+            if low is not None:
+                clauses.append('{} >= ?'.format(name))
+                values.append(float(low))
+            if high is not None:
+                clauses.append('{} <= ?'.format(name))
+                values.append(float(high))
+        clauses = [clause for c, _ in ranges.values() for clause in c]
+        values = [value for _, v in ranges.values() for value in v]
+        if runs is not None:
+            runs = [int(run) for run in runs]
+            clauses.append('run_id IN ({})'.format(', '.join('?' * len(runs))))
+            values.extend(runs)
+        sql = 'SELECT {} FROM solutions'.format(', '.join(select))
+        if order_by is not None and limit is not None and self.walk_order_index(self.check_column(order_by), ranges, limit):
+            sql += ' INDEXED BY solutions_{}'.format(self.check_column(order_by))
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        if order_by is not None:
+            sql += ' ORDER BY {} {}'.format(self.check_column(order_by), 'DESC' if descending else 'ASC')
+        if limit is not None:
+            sql += ' LIMIT ?'
+            values.append(int(limit))
+        rows = self.db.execute(sql, values).fetchall()
+        data = np.array(rows, dtype=float).reshape(len(rows), len(select))
+        return {'run_id': data[:, 0].astype(int), **{column: data[:, k + 1] for k, column in enumerate(columns)}}
+
+    # Whether a top-k query should walk the index of the sort column instead of a range index
+    # SQLite fetches and sorts every row in the narrowest indexed range. Walking the sort order instead reads
+    # about limit * N / M rows when M rows match, which is fewer once M > sqrt(limit * N). Each range is
+    # counted only up to that threshold, so the check costs at most that many index entries.
+    def walk_order_index(self, order_name, ranges, limit):
+        ranged = [name for name in ranges if name in self.indexed and ranges[name][0]]
+        if order_name not in self.indexed or not ranged:
+            return False
+        total = self.db.execute('SELECT COALESCE(SUM(rows), 0) FROM runs').fetchone()[0]
+        threshold = int(np.sqrt(max(int(limit), 1) * total)) + 1
+        for name in ranged:
+            clauses, values = ranges[name]
+            count = self.db.execute('SELECT COUNT(*) FROM (SELECT 1 FROM solutions INDEXED BY solutions_{} WHERE {} LIMIT ?)'.format(
+                name, ' AND '.join(clauses)), values + [threshold]).fetchone()[0]
+            if count < threshold:
+                return False
+        return True
+
+    # The k rows with the smallest (or largest) value of column among those matching where
+    def top_k(self, column, k, where=None, descending=False, runs=None):
+        return self.query(where, column, descending, k, runs)
+
+    # Metadata of every run, oldest first
+    def runs(self):
+        return [{'run_id': run_id, 'created': created, 'source': source, 'params': json.loads(params), 'rows': rows}
+                for run_id, created, source, params, rows in self.db.execute('SELECT run_id, created, source, params, rows FROM runs ORDER BY run_id')]
+
+    def delete_run(self, run_id):
+        with self.db:
+            self.db.execute('DELETE FROM solutions WHERE run_id = ?', (run_id,))
+            self.db.execute('DELETE FROM runs WHERE run_id = ?', (run_id,))
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Parse 'column=low:high' into a where entry; either bound may be left out, e.g. 'bh (ft)=:2'
+def parse_range(text):
+    column, _, bounds = text.rpartition('=')
+    low, sep, high = bounds.partition(':')
+    if not column or not sep:
+        raise ValueError("Expected 'column=low:high', got '{}'".format(text))
+    return column, (float(low) if low else None, float(high) if high else None)
+
+def main():
+    import argparse
+    import datetime
+    import pandas as pd
+    parser = argparse.ArgumentParser(description='Query the solution store, or load solution files into it.')
+    parser.add_argument('--db', default=STORE_PATH, help='store file')
+    parser.add_argument('--load', nargs='+', default=None, metavar='CSV', help='add solution csv files to the store, one run each')
+    parser.add_argument('--runs', action='store_true', help='list the stored runs')
+    parser.add_argument('--where', nargs='+', default=[], metavar='RANGE', help="column ranges such as 'SM=0.05:0.15' 'bh (ft)=:2'")
+    parser.add_argument('--run', type=int, nargs='+', default=None, help='only these run ids')
+    parser.add_argument('--order-by', default=None, help='column to sort by')
+    parser.add_argument('--desc', action='store_true', help='sort in descending order')
+    parser.add_argument('--limit', type=int, default=20, help='largest number of rows to print')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.from_args(args):
+        if args.load:
+            columns = list(pd.read_csv(args.load[0], nrows=0).columns)
+            with SolutionStore(args.db, columns) as store:
+                for path in args.load:
+                    df = pd.read_csv(path)
+                    run_id = store.add_run({'file': path}, 'csv')
+                    store.insert(run_id, {column: df[column].values for column in store.columns})
+                    print("Run {}: {} rows from {}".format(run_id, len(df), path))
+            return
+
+        try:
+            store = SolutionStore(args.db)
+        except ValueError as error:
+            parser.exit(1, "{}\n".format(error))
+        with store:
+            if args.runs:
+                for run in store.runs():
+                    created = datetime.datetime.fromtimestamp(run['created']).isoformat(timespec='seconds')
+                    print("{:>5}  {}  {:<14} {:>9} rows".format(run['run_id'], created, run['source'] or '', run['rows']))
+                return
+            try:
+                where = dict(parse_range(text) for text in args.where)
+                start = time.perf_counter()
+                result = store.query(where, args.order_by, args.desc, args.limit, args.run)
+            except ValueError as error:
+                parser.exit(1, "{}\n".format(error))
+            elapsed = time.perf_counter() - start
+            with pd.option_context('display.max_rows', None, 'display.width', 200):
+                print(pd.DataFrame(result).to_string(index=False))
+            print("{} rows in {:.2f} ms".format(len(result['run_id']), elapsed * 1e3))
+
+if __name__ == '__main__':
+    main()
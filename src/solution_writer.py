@@ -0,0 +1,77 @@
+import csv
+import os
+import shutil
+import tempfile
+import zipfile
+import numpy as np
+import instrumentation
+
+# Streams solution rows to disk in chunks so memory stays flat as the grid grows
+# Formats: 'csv', 'npz' (one float64 array per column) and 'parquet' (needs pyarrow)
+class SolutionWriter:
+    formats = ('csv', 'npz', 'parquet')
+
+    def __init__(self, path, columns, format=None):
+        if format is None:
+            format = os.path.splitext(path)[1].lstrip('.').lower()
+        if format not in self.formats:
+            raise ValueError("Unknown solution format '{}', expected one of {}".format(format, list(self.formats)))
+        self.path = path
+        self.columns = list(columns)
+        self.format = format
+        self.rows = 0
+        if format == 'csv':
+            self.file = open(path, 'w', newline='')
+            self.writer = csv.writer(self.file, lineterminator='\n')
+            self.writer.writerow(self.columns)
+        elif format == 'npz':
+            # Raw column data goes to temporary files and is packed into the .npz on close
+            self.tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)))
+            self.files = [open(os.path.join(self.tmp_dir, '{}.bin'.format(i)), 'wb') for i in range(len(self.columns))]
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Parquet output requires pyarrow; use the 'npz' or 'csv' format instead")
+            self.pa = pa
+            self.schema = pa.schema([(col, pa.float64()) for col in self.columns])
+            self.writer = pq.ParquetWriter(path, self.schema)
+
+    # Append one chunk of rows given as a dict of equal-length 1-D arrays
+    @instrumentation.timed('SolutionWriter.write')
+    def write(self, data):
+        arrays = [np.ascontiguousarray(data[col], dtype=np.float64) for col in self.columns]
+        n = len(arrays[0]) if arrays else 0
+        if n == 0:
+            return
+        if self.format == 'csv':
+            self.writer.writerows(zip(*(a.tolist() for a in arrays)))
+        elif self.format == 'npz':
+            for f, a in zip(self.files, arrays):
+                f.write(a.astype('<f8', copy=False).tobytes())
+        else:
+            self.writer.write_table(self.pa.Table.from_arrays([self.pa.array(a) for a in arrays], schema=self.schema))
+        self.rows += n
+
+    def close(self):
+        if self.format == 'csv':
+            self.file.close()
+        elif self.format == 'npz':
+            for f in self.files:
+                f.close()
+            with zipfile.ZipFile(self.path, 'w', allowZip64=True) as zf:
+                for i, col in enumerate(self.columns):
+                    with zf.open('{}.npy'.format(col), 'w', force_zip64=True) as out, \
+                         open(os.path.join(self.tmp_dir, '{}.bin'.format(i)), 'rb') as raw:
+                        np.lib.format.write_array_header_1_0(out, {'descr': '<f8', 'fortran_order': False, 'shape': (self.rows,)})
+                        shutil.copyfileobj(raw, out)
+            shutil.rmtree(self.tmp_dir)
+        else:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,22 +1,85 @@
-from stability_params import wing, h_stab, v_stab, params
-
-# Tail Volume Coefficients
-Vh_long = params['Sh']/params['S'] * params['lh']/params['MAC']
-Vh_lat = params['Sh']/params['S'] * params['bh']/params['b']
-Vv_lat = params['Sv']/params['S'] * params['z_MAC']/params['b']
-Vv_long = params['Sv']/params['S'] * params['lv']/params['b']
-# Longitudinal Stability Coefficients
-CL0 = wing['CL0wf'] - h_stab['CLah'] * params['Sh']/params['S'] * (h_stab['e0'] - h_stab['CL0h']/h_stab['CLah'])
-CLa = wing['CLawf'] - h_stab['CLah'] * params['Sh']/params['S']
-Cm0 = wing['Cmacwf'] - wing['CL0wf'] * params['SM_wing'] - (h_stab['CL0h'] - h_stab['CLah']*h_stab['e0']) * Vh_long
-Cma = - wing['CLawf'] * params['SM_wing'] - h_stab['CLah'] * (1 - h_stab['deda']) * Vh_long * params['lh']/params['MAC']
-CD0 = wing['CD0wf'] + params['Sh']/params['S']*h_stab['CD0h'] + params['Sv']/params['S']*v_stab['CD0v']
-CDa = wing['CDawf'] + params['Sh']/params['S']*h_stab['CDah'] + params['Sv']/params['S']*v_stab['CDav']
-# Lat/d Stability Coefficients
-num_fins = params['twin'] if 2 else 1
-Cl0 = 0
-ClB = wing['ClBwf'] + Vh_lat*h_stab['ClBh'] + num_fins*Vv_lat*(1-v_stab['dsdB'])*v_stab['CLav']
-Cn0 = 0
-CnB = num_fins*Vv_long*(1-v_stab['dsdB'])*v_stab['CLav']
-CY0 = 0
-CYB = -num_fins*params['Sv']/params['S']*(1-v_stab['dsdB'])*v_stab['CLav']
\ No newline at end of file
+import numpy as np
+import instrumentation
+import stability_params
+
+# Compute the stability coefficients for a parameter set and its surface coefficients
+@instrumentation.timed('stability_coeffs.stability_coefficients')
+def stability_coefficients(params=None, wing=None, h_stab=None, v_stab=None):
+    if params is None:
+        params = stability_params.params
+    if wing is None or h_stab is None or v_stab is None:
+        wing, h_stab, v_stab = stability_params.get_coeffs()
+
+    # Tail Volume Coefficients
+    Vh_long = params['Sh']/params['S'] * params['lh']/params['MAC']
+    Vh_lat = params['Sh']/params['S'] * params['bh']/params['b']
+    Vv_lat = params['Sv']/params['S'] * params['z_MAC']/params['b']
+    Vv_long = params['Sv']/params['S'] * params['lv']/params['b']
+    # Longitudinal Stability Coefficients
+    CL0 = wing['CL0wf'] - h_stab['CLah'] * params['Sh']/params['S'] * (h_stab['e0'] - h_stab['CL0h']/h_stab['CLah'])
+    CLa = wing['CLawf'] - h_stab['CLah'] * params['Sh']/params['S']
+    Cm0 = wing['Cmacwf'] - wing['CL0wf'] * params['SM_wing'] - (h_stab['CL0h'] - h_stab['CLah']*h_stab['e0']) * Vh_long
+    Cma = - wing['CLawf'] * params['SM_wing'] - h_stab['CLah'] * (1 - h_stab['deda']) * Vh_long * params['lh']/params['MAC']
+    CD0 = wing['CD0wf'] + params['Sh']/params['S']*h_stab['CD0h'] + params['Sv']/params['S']*v_stab['CD0v']
+    CDa = wing['CDawf'] + params['Sh']/params['S']*h_stab['CDah'] + params['Sv']/params['S']*v_stab['CDav']
+    # Lat/d Stability Coefficients
+    num_fins = params['twin'] if 2 else 1
+    Cl0 = 0
+    ClB = wing['ClBwf'] + Vh_lat*h_stab['ClBh'] + num_fins*Vv_lat*(1-v_stab['dsdB'])*v_stab['CLav']
+    Cn0 = 0
+    CnB = num_fins*Vv_long*(1-v_stab['dsdB'])*v_stab['CLav']
+    CY0 = 0
+    CYB = -num_fins*params['Sv']/params['S']*(1-v_stab['dsdB'])*v_stab['CLav']
+
+    return {
+        'Vh_long': Vh_long, 'Vh_lat': Vh_lat, 'Vv_lat': Vv_lat, 'Vv_long': Vv_long,
+        'CL0': CL0, 'CLa': CLa, 'Cm0': Cm0, 'Cma': Cma, 'CD0': CD0, 'CDa': CDa,
+        'Cl0': Cl0, 'ClB': ClB, 'Cn0': Cn0, 'CnB': CnB, 'CY0': CY0, 'CYB': CYB,
+    }
+
+# Stability coefficient maps over arrays of tail geometry and trim angle of attack in one broadcasted pass
+# Keyword arrays (Sh, lh, zh, Sv, lv, z_MAC, aoa_trim or any other parameter) override the parameter set;
+# the drag derivatives come from the CD polar coefficients, fitted once for every aoa_trim
+@instrumentation.timed('stability_coeffs.stability_maps')
+def stability_maps(params=None, **arrays):
+    if params is None:
+        params = stability_params.params
+    for name in arrays:
+        if name not in params:
+            raise ValueError("Unknown stability parameter '{}'".format(name))
+    params = {**params, **{name: np.asarray(value, dtype=float) for name, value in arrays.items()}}
+    coefficients = stability_coefficients(params, *stability_params.surface_coeffs(params))
+    shape = np.broadcast_shapes(*(np.shape(value) for value in coefficients.values()))
+    return {name: np.broadcast_to(value, shape) for name, value in coefficients.items()}
+
+# Static pitch (Cma < 0) and weathercock (CnB > 0) stability of each configuration
+def statically_stable(coefficients):
+    return (coefficients['Cma'] < 0) & (coefficients['CnB'] > 0)
+
+# Coefficients for the module parameters, computed on first use
+cache = {}
+
+def get_coefficients():
+    if 'coefficients' not in cache:
+        cache['coefficients'] = stability_coefficients()
+    return cache['coefficients']
+
+# Expose the coefficients as module attributes on first access
+def __getattr__(name):
+    if not name.startswith('__'):
+        coefficients = get_coefficients()
+        if name in coefficients:
+            return coefficients[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Stability coefficients for the aircraft in stability_params.')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.from_args(args):
+        for name, value in get_coefficients().items():
+            print("{}: {}".format(name, value))
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,6 @@
-import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
+from coeff_cache import cached_coeffs
+import instrumentation
 
 # Function to remove whitespace from DataFrame
 def remove_whitespace(df):
@@ -10,13 +9,6 @@ def remove_whitespace(df):
         df[col] = df[col].str.strip()  # Strip whitespace from string data
     return df
 
-# Import CSV data
-wing_data = pd.read_csv('data/polars/Wing.csv')
-hstab_data = pd.read_csv('data/polars/Hstab.csv')
-vstab_data = pd.read_csv('data/polars/Vstab.csv')
-wing_side_data = pd.read_csv('data/polars/Wing-Side-Slip.csv')
-hstab_side_data = pd.read_csv('data/polars/Hstab-Side-Slip.csv')
-
 # General Params UPDATE THESE
 params = {
     # Trim Angle of Attack
@@ -45,64 +37,147 @@ params = {
     'twin': True,
 }
 
-# Get the CL0 coefficients
-CL0wf = wing_data.loc[wing_data['alpha'] == 0, 'CL'].values[0]
-CL0h = hstab_data.loc[hstab_data['alpha'] == 0, 'CL'].values[0]
-CL0v = vstab_data.loc[vstab_data['alpha'] == 0, 'CL'].values[0]
-# Get the CLa coefficients
-CLawf = LinearRegression().fit(wing_data['alpha'].values.reshape(-1, 1), wing_data['CL'].values).coef_[0] * (360/(2*np.pi))
-CLah = LinearRegression().fit(hstab_data['alpha'].values.reshape(-1, 1), hstab_data['CL'].values).coef_[0] * (360/(2*np.pi))
-CLav = LinearRegression().fit(vstab_data['alpha'].values.reshape(-1, 1), vstab_data['CL'].values).coef_[0] * (360/(2*np.pi))
-# Get the CD coefficients
-wing_poly = PolynomialFeatures(degree=2)
-a_wing_poly = wing_poly.fit_transform(wing_data['alpha'].values.reshape(-1, 1))
-wing_poly.fit(a_wing_poly, wing_data['CD'].values)
-wing_model = LinearRegression().fit(a_wing_poly, wing_data['CD'].values)
-a, b, c = wing_model.coef_
-CDawf = 2 * a * params['aoa_trim'] + b
-CD0wf = a * params['aoa_trim']**2 + b * params['aoa_trim'] + c - CDawf * params['aoa_trim']
-hstab_poly = PolynomialFeatures(degree=2)
-a_hstab_poly = hstab_poly.fit_transform(hstab_data['alpha'].values.reshape(-1, 1))
-hstab_poly.fit(a_hstab_poly, hstab_data['CD'].values)
-hstab_model = LinearRegression().fit(a_hstab_poly, hstab_data['CD'].values)
-a, b, c = hstab_model.coef_
-CDah = 2 * a * params['aoa_trim'] + b
-CD0h = a * params['aoa_trim']**2 + b * params['aoa_trim'] + c - CDah * params['aoa_trim']
-vstab_poly = PolynomialFeatures(degree=2)
-a_vstab_poly = vstab_poly.fit_transform(vstab_data['alpha'].values.reshape(-1, 1))
-vstab_poly.fit(a_vstab_poly, vstab_data['CD'].values)
-vstab_model = LinearRegression().fit(a_vstab_poly, vstab_data['CD'].values)
-a, b, c = vstab_model.coef_
-CDav = 2 * a * params['aoa_trim'] + b
-CD0v = a * params['aoa_trim']**2 + b * params['aoa_trim'] + c - CDav * params['aoa_trim']
-# Get the ClB coefficients
-ClBwf = LinearRegression().fit(wing_side_data['Beta'].values.reshape(-1, 1), wing_side_data['Cl'].values).coef_[0] * (360/(2*np.pi))
-ClBh = LinearRegression().fit(hstab_side_data['Beta'].values.reshape(-1, 1), hstab_side_data['Cl'].values).coef_[0] * (360/(2*np.pi))
-
-
-wing = {
-    'CL0wf': CL0wf,
-    'CLawf': CLawf,
-    'Cmacwf': -0.12306, # FIND MANUALLY
-    'CD0wf': CD0wf,
-    'CDawf': CDawf,
-    'ClBwf': ClBwf,
-}
+# Coefficients, built on first use
+cache = {}
 
-h_stab = {
-    'CL0h': CL0h,
-    'CLah': CLah,
-    'CD0h': CD0h,
-    'CDah': CDah,
-    'ClBh': ClBh,
-    'e0': 2*CL0wf/(np.pi*params['AR']) * params['lh']/np.sqrt(params['lh']**2 + params['zh']**2),
-    'deda': 2*CLawf/(np.pi*params['AR']) * params['lh']/np.sqrt(params['lh']**2 + params['zh']**2),
+polar_files = {
+    'wing_data': 'data/polars/Wing.csv',
+    'hstab_data': 'data/polars/Hstab.csv',
+    'vstab_data': 'data/polars/Vstab.csv',
+    'wing_side_data': 'data/polars/Wing-Side-Slip.csv',
+    'hstab_side_data': 'data/polars/Hstab-Side-Slip.csv',
 }
 
-v_stab = {
-    'CL0v': CL0v,
-    'CLav': CLav,
-    'CD0v': CD0v,
-    'CDav': CDav,
-    'dsdB': 4.22652*params['Sv']/params['S']/(1+np.cos(params['lambda_c/4'])) + 0.012431*params['AR'],
-}
\ No newline at end of file
+# Bump when the coefficient fits change so cached values are rebuilt
+FIT_VERSION = 1
+
+# Import CSV data
+@instrumentation.timed('stability_params.load_polars')
+def load_polars():
+    if 'polars' not in cache:
+        import pandas as pd
+        cache['polars'] = {name: pd.read_csv(path) for name, path in polar_files.items()}
+    return cache['polars']
+
+# Fit a quadratic CD polar, returning the model coefficients (a, b, c)
+def drag_polar(data):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import PolynomialFeatures
+    poly = PolynomialFeatures(degree=2)
+    a_poly = poly.fit_transform(data['alpha'].values.reshape(-1, 1))
+    model = LinearRegression().fit(a_poly, data['CD'].values)
+    a, b, c = model.coef_
+    return a, b, c
+
+# Linearize the CD polar about the trim angle of attack, which may be an array
+def linearize_drag(a, b, c, aoa_trim):
+    CDa = 2 * a * aoa_trim + b
+    CD0 = a * aoa_trim**2 + b * aoa_trim + c - CDa * aoa_trim
+    return CD0, CDa
+
+# Fit the coefficients that depend only on the polars; the CD polars are kept as polynomial coefficients
+@instrumentation.timed('stability_params.fit_polar_coeffs')
+def fit_polar_coeffs():
+    from sklearn.linear_model import LinearRegression
+    polars = load_polars()
+    wing_data = polars['wing_data']
+    hstab_data = polars['hstab_data']
+    vstab_data = polars['vstab_data']
+    wing_side_data = polars['wing_side_data']
+    hstab_side_data = polars['hstab_side_data']
+
+    # Get the CL0 coefficients
+    CL0wf = wing_data.loc[wing_data['alpha'] == 0, 'CL'].values[0]
+    CL0h = hstab_data.loc[hstab_data['alpha'] == 0, 'CL'].values[0]
+    CL0v = vstab_data.loc[vstab_data['alpha'] == 0, 'CL'].values[0]
+    # Get the CLa coefficients
+    CLawf = LinearRegression().fit(wing_data['alpha'].values.reshape(-1, 1), wing_data['CL'].values).coef_[0] * (360/(2*np.pi))
+    CLah = LinearRegression().fit(hstab_data['alpha'].values.reshape(-1, 1), hstab_data['CL'].values).coef_[0] * (360/(2*np.pi))
+    CLav = LinearRegression().fit(vstab_data['alpha'].values.reshape(-1, 1), vstab_data['CL'].values).coef_[0] * (360/(2*np.pi))
+    # Get the CD polars
+    CDwf_a, CDwf_b, CDwf_c = drag_polar(wing_data)
+    CDh_a, CDh_b, CDh_c = drag_polar(hstab_data)
+    CDv_a, CDv_b, CDv_c = drag_polar(vstab_data)
+    # Get the ClB coefficients
+    ClBwf = LinearRegression().fit(wing_side_data['Beta'].values.reshape(-1, 1), wing_side_data['Cl'].values).coef_[0] * (360/(2*np.pi))
+    ClBh = LinearRegression().fit(hstab_side_data['Beta'].values.reshape(-1, 1), hstab_side_data['Cl'].values).coef_[0] * (360/(2*np.pi))
+
+    return {
+        'CL0wf': CL0wf, 'CL0h': CL0h, 'CL0v': CL0v,
+        'CLawf': CLawf, 'CLah': CLah, 'CLav': CLav,
+        'CDwf_a': CDwf_a, 'CDwf_b': CDwf_b, 'CDwf_c': CDwf_c,
+        'CDh_a': CDh_a, 'CDh_b': CDh_b, 'CDh_c': CDh_c,
+        'CDv_a': CDv_a, 'CDv_b': CDv_b, 'CDv_c': CDv_c,
+        'ClBwf': ClBwf, 'ClBh': ClBh,
+    }
+
+# Polar coefficients from the on-disk cache, refitted only when a polar file changes
+def polar_coeffs():
+    return cached_coeffs('stability_polars', list(polar_files.values()), {'version': FIT_VERSION}, fit_polar_coeffs)
+
+# Coefficients at a trim angle of attack (scalar or array) from polar coefficients
+def trim_coeffs(fit, aoa_trim):
+    CD0wf, CDawf = linearize_drag(fit['CDwf_a'], fit['CDwf_b'], fit['CDwf_c'], aoa_trim)
+    CD0h, CDah = linearize_drag(fit['CDh_a'], fit['CDh_b'], fit['CDh_c'], aoa_trim)
+    CD0v, CDav = linearize_drag(fit['CDv_a'], fit['CDv_b'], fit['CDv_c'], aoa_trim)
+    return {
+        'CL0wf': fit['CL0wf'], 'CL0h': fit['CL0h'], 'CL0v': fit['CL0v'],
+        'CLawf': fit['CLawf'], 'CLah': fit['CLah'], 'CLav': fit['CLav'],
+        'CD0wf': CD0wf, 'CDawf': CDawf, 'CD0h': CD0h, 'CDah': CDah, 'CD0v': CD0v, 'CDav': CDav,
+        'ClBwf': fit['ClBwf'], 'ClBh': fit['ClBh'],
+    }
+
+# Fitted coefficients at a trim angle of attack, from polar coefficients fitted once and cached on disk
+def fitted_coeffs(aoa_trim):
+    return trim_coeffs(polar_coeffs(), aoa_trim)
+
+# Build the wing, h-stab and v-stab coefficients for a parameter set
+# fit is the output of fitted_coeffs at params['aoa_trim'], looked up when not given
+def surface_coeffs(params, fit=None):
+    if fit is None:
+        fit = fitted_coeffs(params['aoa_trim'])
+    CL0wf = fit['CL0wf']
+    CLawf = fit['CLawf']
+
+    wing = {
+        'CL0wf': CL0wf,
+        'CLawf': CLawf,
+        'Cmacwf': -0.12306, # FIND MANUALLY
+        'CD0wf': fit['CD0wf'],
+        'CDawf': fit['CDawf'],
+        'ClBwf': fit['ClBwf'],
+    }
+
+    h_stab = {
+        'CL0h': fit['CL0h'],
+        'CLah': fit['CLah'],
+        'CD0h': fit['CD0h'],
+        'CDah': fit['CDah'],
+        'ClBh': fit['ClBh'],
+        'e0': 2*CL0wf/(np.pi*params['AR']) * params['lh']/np.sqrt(params['lh']**2 + params['zh']**2),
+        'deda': 2*CLawf/(np.pi*params['AR']) * params['lh']/np.sqrt(params['lh']**2 + params['zh']**2),
+    }
+
+    v_stab = {
+        'CL0v': fit['CL0v'],
+        'CLav': fit['CLav'],
+        'CD0v': fit['CD0v'],
+        'CDav': fit['CDav'],
+        'dsdB': 4.22652*params['Sv']/params['S']/(1+np.cos(params['lambda_c/4'])) + 0.012431*params['AR'],
+    }
+
+    return wing, h_stab, v_stab
+
+# Coefficients for the module parameters
+def get_coeffs():
+    if 'coeffs' not in cache:
+        cache['coeffs'] = surface_coeffs(params)
+    return cache['coeffs']
+
+# Build the polar data and coefficients on first access as module attributes
+def __getattr__(name):
+    if name in ('wing', 'h_stab', 'v_stab'):
+        return dict(zip(('wing', 'h_stab', 'v_stab'), get_coeffs()))[name]
+    if name in ('wing_data', 'hstab_data', 'vstab_data', 'wing_side_data', 'hstab_side_data'):
+        return load_polars()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+# Importing the sizing modules must stay cheap: no data loading, model fitting or plotting imports
+# tests/test_startup.py runs this check with the test suite
+STARTUP_TARGET = 0.5 # s, measured around the imports in a fresh interpreter
+# Every module in src/ is checked, so a new module cannot be left out; this check itself is the only exception
+EXCLUDED_MODULES = ['startup_check']
+LIBRARY_MODULES = sorted(name[:-3] for name in os.listdir(os.path.dirname(os.path.abspath(__file__)))
+                         if name.endswith('.py') and name[:-3] not in EXCLUDED_MODULES)
+HEAVY_MODULES = ['pandas', 'sklearn', 'matplotlib', 'scipy']
+
+IMPORT_SCRIPT = '''
+import sys, time
+t = time.perf_counter()
+import {modules}
+elapsed = time.perf_counter() - t
+print(elapsed)
+print(','.join(m for m in {heavy!r} if m in sys.modules))
+'''
+
+# Import every library module in a fresh interpreter and return the import time and heavy modules loaded
+def measure_startup():
+    script = IMPORT_SCRIPT.format(modules=', '.join(LIBRARY_MODULES), heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout.split('\n')
+    loaded = [m for m in output[1].split(',') if m]
+    return float(output[0]), loaded
+
+# Best of several runs, so a busy machine does not fail the check
+def check_startup(runs=3, target=STARTUP_TARGET):
+    results = [measure_startup() for _ in range(runs)]
+    elapsed = min(r[0] for r in results)
+    loaded = results[0][1]
+    ok = elapsed < target and not loaded
+    print("Import time: {:.3f} s (target {:.3f} s)".format(elapsed, target))
+    if loaded:
+        print("Heavy modules loaded at import: {}".format(', '.join(loaded)))
+    print("PASS" if ok else "FAIL")
+    return ok
+
+if __name__ == '__main__':
+    sys.exit(0 if check_startup() else 1)
@@ -0,0 +1,152 @@
+import json
+import numpy as np
+
+# Least-squares surrogate models stored as plain arrays and evaluated on whole arrays at once
+# A model is fitted through the triangular factor R of the QR decomposition of [1 | features | y], so adding
+# rows only needs the QR of R stacked on the new rows, and the data itself is never kept.
+# With the intercept column first, the lower block of R factors the centered features, which gives the
+# same coefficients as an intercept fit on centered data (minimum norm when the features are collinear).
+
+# Linear model y = intercept + X @ coef
+class LinearSurrogate:
+    kind = 'linear'
+
+    def __init__(self):
+        self.R = None
+        self.n_samples = 0
+        self.intercept_ = np.nan
+        self.coef_ = None
+
+    # Feature matrix of inputs with shape (n,) or (n, inputs)
+    def features(self, X):
+        X = np.asarray(X, dtype=float)
+        return X.reshape(-1, 1) if X.ndim == 1 else X
+
+    def fit(self, X, y):
+        self.R = None
+        self.n_samples = 0
+        return self.update(X, y)
+
+    # Add rows to the fit
+    def update(self, X, y):
+        F = self.features(X)
+        y = np.asarray(y, dtype=float).reshape(-1, 1)
+        if len(F) != len(y):
+            raise ValueError("Got {} input rows and {} outputs".format(len(F), len(y)))
+        rows = np.hstack((np.ones((len(F), 1)), F, y))
+        if self.R is not None:
+            if self.R.shape[1] != rows.shape[1]:
+                raise ValueError("Model has {} features, got {}".format(self.R.shape[1] - 2, F.shape[1]))
+            rows = np.vstack((self.R, rows))
+        self.R = np.linalg.qr(rows, mode='r')
+        self.n_samples += len(F)
+        self.solve()
+        return self
+
+    def solve(self):
+        R = self.R
+        p = R.shape[1] - 2
+        if self.n_samples < 1:
+            raise ValueError("Cannot fit a model without data")
+        Rxx = R[1:p+1, 1:p+1]
+        rxy = R[1:p+1, -1]
+        self.coef_ = np.zeros(p)
+        if p:
+            # Directions of Rxx at round-off level relative to the feature column norms are constant or
+            # collinear features, which get no weight; the rest is the minimum norm solution
+            U, s, Vt = np.linalg.svd(Rxx, full_matrices=False)
+            tol = max(R.shape) * np.finfo(float).eps * np.linalg.norm(R[:, 1:p+1], axis=0).max()
+            keep = s > tol
+            self.coef_ = Vt[keep].T @ ((U[:, keep].T @ rxy) / s[keep])
+        self.intercept_ = (R[0, -1] - R[0, 1:p+1] @ self.coef_) / R[0, 0]
+
+    # Number of model inputs; inputs of a multi-input model lie along the last axis of X
+    @property
+    def inputs(self):
+        return self.coef_.size
+
+    # Predictions with the shape of the inputs, less the input axis for multi-input models
+    # A single point gives a scalar
+    def predict(self, X):
+        X = np.asarray(X, dtype=float)
+        if self.inputs == 1:
+            return (self.intercept_ + self.features(X.ravel()) @ self.coef_).reshape(X.shape)[()]
+        return (self.intercept_ + self.features(X.reshape(-1, self.inputs)) @ self.coef_).reshape(X.shape[:-1])[()]
+
+    def settings(self):
+        return {}
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            **self.settings(),
+            'n_samples': self.n_samples,
+            'R': self.R.tolist(),
+            'intercept': float(self.intercept_),
+            'coef': self.coef_.tolist(),
+        }
+
+# Polynomial in one input: y = intercept + sum(coef[k] * x**(k+1))
+class PolynomialSurrogate(LinearSurrogate):
+    kind = 'polynomial'
+
+    def __init__(self, degree=2):
+        super().__init__()
+        self.degree = degree
+
+    def features(self, X):
+        x = np.asarray(X, dtype=float).reshape(-1, 1)
+        return x ** np.arange(1, self.degree + 1)
+
+    @property
+    def inputs(self):
+        return 1
+
+    def settings(self):
+        return {'degree': self.degree}
+
+# Continuous piecewise linear function of one input with slope changes at the knots
+# y = intercept + coef[0] * x + sum(coef[k+1] * max(x - knots[k], 0))
+class PiecewiseSurrogate(LinearSurrogate):
+    kind = 'piecewise'
+
+    def __init__(self, knots=()):
+        super().__init__()
+        self.knots = np.sort(np.asarray(knots, dtype=float))
+
+    def features(self, X):
+        x = np.asarray(X, dtype=float).reshape(-1, 1)
+        return np.hstack((x, np.maximum(x - self.knots, 0)))
+
+    @property
+    def inputs(self):
+        return 1
+
+    def settings(self):
+        return {'knots': self.knots.tolist()}
+
+surrogate_kinds = {cls.kind: cls for cls in (LinearSurrogate, PolynomialSurrogate, PiecewiseSurrogate)}
+
+# Build an unfitted model from a kind name and its settings, e.g. ('polynomial', degree=3)
+def make_surrogate(kind='linear', **settings):
+    if kind not in surrogate_kinds:
+        raise ValueError("Unknown surrogate kind '{}', expected one of {}".format(kind, list(surrogate_kinds)))
+    return surrogate_kinds[kind](**settings)
+
+def from_dict(data):
+    settings = {key: value for key, value in data.items() if key not in ('kind', 'n_samples', 'R', 'intercept', 'coef')}
+    model = make_surrogate(data['kind'], **settings)
+    model.R = np.array(data['R'], dtype=float)
+    model.n_samples = data['n_samples']
+    model.intercept_ = data['intercept']
+    model.coef_ = np.array(data['coef'], dtype=float)
+    return model
+
+# Write a dict of named models to a JSON file, and read it back
+def save_surrogates(models, path):
+    with open(path, 'w') as f:
+        json.dump({name: model.to_dict() for name, model in models.items()}, f, indent=1)
+
+def load_surrogates(path):
+    with open(path) as f:
+        return {name: from_dict(data) for name, data in json.load(f).items()}
@@ -0,0 +1,182 @@
+import argparse
+import csv
+import os
+import time
+from multiprocessing import Pool
+import numpy as np
+from constraint_params import params as constraint_defaults
+from constraints import evaluate_constraints
+import hstab_params
+import instrumentation
+from hstab_sizing import evaluate_grid, sweep_grid
+import weight_est
+
+# Default weight closure inputs for a variant
+weight_defaults = {
+    'TW_ratio': weight_est.constraint_params['tw_range'],
+    'Endurance': weight_est.constraint_params['endurance'], # hrs
+    'WTO_guess': weight_est.sweep_params['WTO_guess'], # lbs
+    'WTO_lower': weight_est.sweep_params['WTO_lower'], # lbs
+    'WTO_upper': weight_est.sweep_params['WTO_upper'], # lbs
+    'method': 'bisection',
+}
+
+# Default h-stab grid resolution for a variant
+grid_defaults = {
+    'num_lh': 1001,
+    'num_aoa': 11,
+}
+
+# Split a variant into explicit constraint, h-stab and weight parameter sets
+# A plain key sets every parameter set that defines it; 'constraints:', 'hstab:' or 'weight:' targets one set
+def variant_params(variant):
+    sets = {
+        'constraints': dict(constraint_defaults),
+        'hstab': {**hstab_params.get_params(), **grid_defaults},
+        'weight': dict(weight_defaults),
+    }
+    for key, value in variant.items():
+        if key == 'variant':
+            continue
+        if ':' in key:
+            name, key = key.split(':', 1)
+            if name not in sets:
+                raise ValueError("Unknown parameter set '{}' in variant key '{}:{}'".format(name, name, key))
+            sets[name][key] = value
+            continue
+        targets = [s for s in sets.values() if key in s]
+        if not targets:
+            raise ValueError("Unknown variant parameter '{}'".format(key))
+        for s in targets:
+            s[key] = value
+    return sets
+
+# Run the constraint diagram, weight closure and h-stab sweep for one variant
+def run_variant(variant):
+    sets = variant_params(variant)
+    result = dict(variant)
+
+    # Constraint diagram
+    constraints = evaluate_constraints(sets['constraints'])
+    for key, value in constraints.items():
+        result[key] = value.item()
+
+    # Weight closure
+    w = sets['weight']
+    if w['method'] == 'bisection':
+        # Same bisection as weight_estimate, on all points of the variant at once
+        estimate = weight_est.batch_weight_estimate(w['TW_ratio'], w['Endurance'], w['WTO_guess'], w['WTO_lower'], w['WTO_upper'])
+    else:
+        estimate = weight_est.weight_estimate(w['TW_ratio'], w['Endurance'], w['WTO_guess'], w['WTO_lower'], w['WTO_upper'], method=w['method'])
+    for key, value in zip(['WTO', 'W_motor', 'W_battery', 'Power'], estimate if estimate is not None else [np.nan]*4):
+        result[key] = float(value)
+
+    # H-stab sweep
+    h = sets['hstab']
+    lh_arr, aoa_arr = sweep_grid(h, int(h['num_lh']), int(h['num_aoa']))
+    verified, data = evaluate_grid(lh_arr, aoa_arr, h)
+    result['hstab_feasible'] = int(verified.sum())
+    if verified.any():
+        best = np.argmin(np.where(verified, data['T/W_req'], np.inf))
+        best = np.unravel_index(best, verified.shape)
+        result['hstab_lh'] = float(data['lh (ft)'][best])
+        result['hstab_bh'] = float(data['bh (ft)'][best])
+        result['hstab_aoa_trim'] = float(data['aoa_trim (deg)'][best])
+        result['hstab_TW_req'] = float(data['T/W_req'][best])
+        result['hstab_SM'] = float(data['SM'][best])
+        result['hstab_min_lh'] = float(data['lh (ft)'][verified].min())
+        result['hstab_min_bh'] = float(data['bh (ft)'][verified].min())
+    else:
+        for key in ['hstab_lh', 'hstab_bh', 'hstab_aoa_trim', 'hstab_TW_req', 'hstab_SM', 'hstab_min_lh', 'hstab_min_bh']:
+            result[key] = np.nan
+    return result
+
+# Run one variant with instrumentation on, returning the worker's summary with the result
+def profiled_variant(variant):
+    with instrumentation.instrumented() as report:
+        result = run_variant(variant)
+    return result, report
+
+# Load the coefficients and models once per process
+def warm_caches():
+    hstab_params.get_params()
+    hstab_params.get_polars()
+    weight_est.get_models()
+
+# Variant parameters given as text, with their allowed values; every other cell must be a number
+text_params = {
+    'method': list(weight_est.weight_solvers),
+}
+
+# Read a table of design variants from CSV, numbers as floats
+# Empty, missing or malformed cells raise ValueError naming the file, line and column
+def read_variants(path):
+    variants = []
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        for i, row in enumerate(reader):
+            variant = {'variant': i}
+            for key, value in row.items():
+                if key is None:
+                    raise ValueError("{}, line {}: more cells than columns".format(path, reader.line_num))
+                where = "{}, line {}, column '{}'".format(path, reader.line_num, key)
+                if value is None or not value.strip():
+                    raise ValueError("{}: missing value".format(where))
+                name = key.split(':', 1)[-1]
+                if name in text_params:
+                    if value.strip() not in text_params[name]:
+                        raise ValueError("{}: '{}' is not one of {}".format(where, value, text_params[name]))
+                    variant[key] = value.strip()
+                    continue
+                try:
+                    variant[key] = float(value)
+                except ValueError:
+                    raise ValueError("{}: '{}' is not a number".format(where, value))
+            variants.append(variant)
+    return variants
+
+# Run every variant on a process pool, writing each result to out_path as it finishes
+def run_study(variants, out_path, workers=None, chunksize=None):
+    workers = workers or os.cpu_count()
+    variants = [{'variant': i, **v} if 'variant' not in v else v for i, v in enumerate(variants)]
+    if chunksize is None:
+        # Several chunks per worker keeps every core busy until the end of the study
+        chunksize = max(1, len(variants) // (workers * 8))
+
+    warm_caches()
+    count = 0
+    # Worker counters live in the worker processes, so each result brings its own summary back
+    profiled = instrumentation.enabled
+    with Pool(workers, initializer=warm_caches) as pool, open(out_path, 'w', newline='') as f:
+        writer = None
+        for result in pool.imap_unordered(profiled_variant if profiled else run_variant, variants, chunksize):
+            if profiled:
+                result, report = result
+                instrumentation.merge(report)
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(result))
+                writer.writeheader()
+            writer.writerow(result)
+            count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the constraint, weight and h-stab sizing for a table of design variants.')
+    parser.add_argument('variants', help='CSV file with one design variant per row')
+    parser.add_argument('--out', default='./data/solutions/trade_study.csv', help='combined output CSV')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type=int, default=None, help='variants handed to a worker at a time')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        variants = read_variants(args.variants)
+    except ValueError as error:
+        parser.exit(1, "{}\n".format(error))
+    with instrumentation.from_args(args):
+        start = time.perf_counter()
+        count = run_study(variants, args.out, args.workers, args.chunksize)
+        print("Ran {} variants in {:.2f} s, results in {}".format(count, time.perf_counter() - start, args.out))
+
+if __name__ == '__main__':
+    main()
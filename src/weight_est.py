@@ -1,70 +1,263 @@
 import numpy as np
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-import matplotlib.pyplot as plt
+import instrumentation
+import rendering
+from surrogates import make_surrogate
+
+# Data and regression models, built on first use
+cache = {}
 
 # Load CSV data
-lipo_data = pd.read_csv('./data/weight/lipo_weight_data.csv')
-edf_data = pd.read_csv('./data/weight/edf_weight_data.csv')
-aircraft_data = pd.read_csv('./data/weight/aircraft_weight_data.csv')
-
-# Aircraft weight regression model
-x1 = aircraft_data['Battery Weight (lbs)']
-x2 = aircraft_data['Motor Weight (lbs)']
-y = aircraft_data['Takeoff Weight (lbs)']
-X = np.column_stack((x1,x2))
-aircraft_model = LinearRegression().fit(X, y)
-# Motor weight regression model
-x1 = edf_data['Thrust (lbs)'].values.reshape(-1, 1)
-y = edf_data['Weight (lbs)']
-X = np.column_stack((x1))
-motor_weight_model = LinearRegression().fit(x1, y)
-# Motor power regression model
-x1 = edf_data['Thrust (lbs)'].values.reshape(-1, 1)
-y = edf_data['Power (W)']
-X = np.column_stack((x1))
-motor_power_model = LinearRegression().fit(x1, y)
-# Battery weight regression model
-x1 = lipo_data['Energy (Wh)'].values.reshape(-1, 1)
-y = lipo_data['Energy Density (Wh/lb)']
-X = np.column_stack((x1))
-battery_power_density_model = LinearRegression().fit(x1, y)
-
-# Estimation functions
+@instrumentation.timed('weight_est.load_weight_data')
+def load_weight_data():
+    if 'data' not in cache:
+        import pandas as pd
+        cache['data'] = {
+            'lipo_data': pd.read_csv('./data/weight/lipo_weight_data.csv'),
+            'edf_data': pd.read_csv('./data/weight/edf_weight_data.csv'),
+            'aircraft_data': pd.read_csv('./data/weight/aircraft_weight_data.csv'),
+        }
+    return cache['data']
+
+# Component regression models: data set, input columns and output column
+model_specs = {
+    'aircraft_model': ('aircraft_data', ['Battery Weight (lbs)', 'Motor Weight (lbs)'], 'Takeoff Weight (lbs)'),
+    'motor_weight_model': ('edf_data', ['Thrust (lbs)'], 'Weight (lbs)'),
+    'motor_power_model': ('edf_data', ['Thrust (lbs)'], 'Power (W)'),
+    'battery_power_density_model': ('lipo_data', ['Energy (Wh)'], 'Energy Density (Wh/lb)'),
+}
+
+# Surrogate kind and settings of each model, see surrogates.make_surrogate
+# e.g. {'kind': 'polynomial', 'degree': 2}; the closed-form and batched solvers need linear models
+model_kinds = {name: {'kind': 'linear'} for name in model_specs}
+
+# Inputs and output of a model from its data set, starting at row start
+def model_data(name, data, start=0):
+    data_set, x_cols, y_col = model_specs[name]
+    df = data[data_set].iloc[start:]
+    X = df[x_cols].values
+    return (X[:, 0] if len(x_cols) == 1 else X), df[y_col].values
+
+# Fit the component regression models
+@instrumentation.timed('weight_est.fit_models')
+def fit_models():
+    data = load_weight_data()
+    return {name: make_surrogate(**model_kinds[name]).fit(*model_data(name, data)) for name in model_specs}
+
+def get_models():
+    if 'models' not in cache:
+        cache['models'] = fit_models()
+    return cache['models']
+
+# Reload the component CSVs and add rows appended since the models were fitted
+# Models whose data set lost rows are refitted from scratch
+@instrumentation.timed('weight_est.update_models')
+def update_models():
+    models = get_models()
+    cache.pop('data', None)
+    data = load_weight_data()
+    for name, model in models.items():
+        rows = len(data[model_specs[name][0]])
+        if rows < model.n_samples:
+            model.fit(*model_data(name, data))
+        elif rows > model.n_samples:
+            model.update(*model_data(name, data, model.n_samples))
+    return models
+
+# Build the data and models on first access as module attributes
+def __getattr__(name):
+    if name in ('aircraft_model', 'motor_weight_model', 'motor_power_model', 'battery_power_density_model'):
+        return get_models()[name]
+    if name in ('lipo_data', 'edf_data', 'aircraft_data'):
+        return load_weight_data()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+# Estimation functions, for scalars or arrays
+@instrumentation.timed('weight_est.aircraft_weight_estimate')
 def aircraft_weight_estimate(weight_battery,weight_motor):
-    return aircraft_model.predict([[weight_battery,weight_motor]])[0]
+    return get_models()['aircraft_model'].predict(np.stack(np.broadcast_arrays(weight_battery, weight_motor), axis=-1))
 
+@instrumentation.timed('weight_est.motor_weight_estimate')
 def motor_weight_estimate(thrust):
-    return motor_weight_model.predict([[thrust]])[0]
+    return get_models()['motor_weight_model'].predict(thrust)
 
+@instrumentation.timed('weight_est.motor_power_estimate')
 def motor_power_estimate(thrust):
-    return motor_power_model.predict([[thrust]])[0]
+    return get_models()['motor_power_model'].predict(thrust)
 
+@instrumentation.timed('weight_est.battery_power_density_estimate')
 def battery_power_density_estimate(thrust):
-    return battery_power_density_model.predict([[motor_power_estimate(thrust)]])[0]
+    return get_models()['battery_power_density_model'].predict(motor_power_estimate(thrust))
 
-# Calculate Weights, Thrust, and Power
-def weight_estimate(TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, show=False):
+# Thrust range (lbs) of the EDF data behind the motor weight and power models; estimates outside it extrapolate the fits
+def motor_thrust_range():
+    thrust = model_data('motor_weight_model', load_weight_data())[0]
+    return float(thrust.min()), float(thrust.max())
+
+# Residual of the takeoff weight fixed point WTO = f(WTO) and the estimated weight f(WTO)
+def weight_residual(WTO, TW_ratio, Endurance):
+    T = TW_ratio * WTO
+    Wmotor = motor_weight_estimate(T)
+    Wbattery = Endurance * motor_power_estimate(T) / battery_power_density_estimate(T)
+    WTO_calc = aircraft_weight_estimate(Wbattery,Wmotor)
+    return WTO - WTO_calc, WTO_calc
+
+# Check that every component model is a linear regression
+def linear_models():
+    return all(model.kind == 'linear' for model in get_models().values())
+
+# Coefficients of the linear component models
+def linear_coefficients():
+    if not linear_models():
+        raise ValueError("Closed-form and Newton solvers require linear component models")
+    models = get_models()
+    aircraft_model = models['aircraft_model']
+    motor_weight_model = models['motor_weight_model']
+    motor_power_model = models['motor_power_model']
+    battery_power_density_model = models['battery_power_density_model']
+    return {
+        'a0': aircraft_model.intercept_, 'a_b': aircraft_model.coef_[0], 'a_m': aircraft_model.coef_[1],
+        'm0': motor_weight_model.intercept_, 'm1': motor_weight_model.coef_[0],
+        'p0': motor_power_model.intercept_, 'p1': motor_power_model.coef_[0],
+        'd0': battery_power_density_model.intercept_, 'd1': battery_power_density_model.coef_[0],
+    }
+
+# Derivative of the fixed point residual with respect to WTO for linear component models
+def weight_residual_slope(WTO, TW_ratio, Endurance):
+    c = linear_coefficients()
+    P = c['p0'] + c['p1'] * TW_ratio * WTO
+    D = c['d0'] + c['d1'] * P
+    dWbattery = Endurance * c['p1'] * TW_ratio * (D - c['d1'] * P) / D**2
+    dWmotor = c['m1'] * TW_ratio
+    return 1 - c['a_b'] * dWbattery - c['a_m'] * dWmotor
+
+# Bisection on [WTO_lower, WTO_upper] starting from WTO_guess
+def bisection_solve(TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, rtol, max_iter):
     lower_init = WTO_lower
     upper_init = WTO_upper
     
-    while(True):
-        T_guess = TW_ratio * WTO_guess
-        Wmotor = motor_weight_estimate(T_guess)
-        Wbattery = Endurance * motor_power_estimate(T_guess) / battery_power_density_estimate(T_guess)
-        WTO_calc = aircraft_weight_estimate(Wbattery,Wmotor)
+    for iteration in range(1, max_iter+1):
+        _, WTO_calc = weight_residual(WTO_guess, TW_ratio, Endurance)
         
-        if np.abs((WTO_guess-WTO_calc)/WTO_calc) < 0.0001 or WTO_guess < 0:
-            break
+        if np.abs((WTO_guess-WTO_calc)/WTO_calc) < rtol or WTO_guess < 0:
+            return WTO_guess, iteration
         elif WTO_guess < WTO_calc:
             WTO_lower = WTO_guess
         elif WTO_guess > WTO_calc:
             WTO_upper = WTO_guess
         
         if np.abs(WTO_upper - lower_init) < 0.0001 or np.abs(WTO_lower - upper_init) < 0.0001:
-            return None
+            return None, iteration
         
         WTO_guess = (WTO_upper+WTO_lower)/2
+    return None, max_iter
+
+# Brent's method on [WTO_lower, WTO_upper]; the guess is not needed
+def brent_solve(TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, rtol, max_iter):
+    from scipy.optimize import brentq
+    def f(WTO):
+        return weight_residual(WTO, TW_ratio, Endurance)[0]
+    if np.sign(f(WTO_lower)) == np.sign(f(WTO_upper)):
+        return None, 2
+    WTO, result = brentq(f, WTO_lower, WTO_upper, rtol=max(rtol, 4*np.finfo(float).eps), maxiter=max_iter, full_output=True, disp=False)
+    return (WTO if result.converged else None), result.function_calls + 2
+
+# Safeguard for the open solvers: keep a step that stays inside the bracket of known residual signs,
+# otherwise check the end of the search range it overshoots once, then fall back to bisection
+def safeguarded_step(step, lower, upper, WTO_lower, WTO_upper, probed):
+    if lower < step < upper:
+        return step
+    if step >= upper and upper == WTO_upper and 'upper' not in probed:
+        probed.add('upper')
+        return WTO_upper
+    if step <= lower and lower == WTO_lower and 'lower' not in probed:
+        probed.add('lower')
+        return WTO_lower
+    return (lower+upper)/2
+
+# Secant iteration from WTO_guess and a nearby second point
+def secant_solve(TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, rtol, max_iter):
+    lower, upper, probed = WTO_lower, WTO_upper, set()
+    x0 = WTO_guess
+    x1 = WTO_guess + 0.01 * (WTO_upper - WTO_lower)
+    r0, _ = weight_residual(x0, TW_ratio, Endurance)
+    for iteration in range(2, max_iter+1):
+        r1, WTO_calc = weight_residual(x1, TW_ratio, Endurance)
+        if np.abs(r1/WTO_calc) < rtol:
+            return x1, iteration
+        if r1 < 0:
+            lower = max(lower, x1)
+        else:
+            upper = min(upper, x1)
+        # The root lies outside the search range
+        if np.abs(upper - WTO_lower) < 0.0001 or np.abs(lower - WTO_upper) < 0.0001:
+            return None, iteration
+        step = x1 - r1 * (x1 - x0) / (r1 - r0) if r1 != r0 else np.nan
+        x0, r0 = x1, r1
+        x1 = safeguarded_step(step, lower, upper, WTO_lower, WTO_upper, probed)
+    return None, max_iter
+
+# Newton iteration from WTO_guess using the analytic residual slope
+def newton_solve(TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, rtol, max_iter):
+    lower, upper, probed = WTO_lower, WTO_upper, set()
+    WTO = WTO_guess
+    for iteration in range(1, max_iter+1):
+        r, WTO_calc = weight_residual(WTO, TW_ratio, Endurance)
+        if np.abs(r/WTO_calc) < rtol:
+            return WTO, iteration
+        if r < 0:
+            lower = max(lower, WTO)
+        else:
+            upper = min(upper, WTO)
+        # The root lies outside the search range
+        if np.abs(upper - WTO_lower) < 0.0001 or np.abs(lower - WTO_upper) < 0.0001:
+            return None, iteration
+        step = WTO - r / weight_residual_slope(WTO, TW_ratio, Endurance)
+        WTO = safeguarded_step(step, lower, upper, WTO_lower, WTO_upper, probed)
+    return None, max_iter
+
+# Closed-form solution for linear component models
+# With linear models the fixed point multiplied by the battery energy density is a quadratic in WTO
+def linear_solve(TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, rtol, max_iter):
+    c = linear_coefficients()
+    alpha = 1 - c['a_m'] * c['m1'] * TW_ratio
+    beta = c['a0'] + c['a_m'] * c['m0']
+    gamma = c['d0'] + c['d1'] * c['p0']
+    delta = c['d1'] * c['p1'] * TW_ratio
+    roots = np.roots([
+        alpha * delta,
+        alpha * gamma - beta * delta - c['a_b'] * Endurance * c['p1'] * TW_ratio,
+        -beta * gamma - c['a_b'] * Endurance * c['p0'],
+    ])
+    roots = roots[np.isreal(roots)].real
+    roots = roots[(roots >= WTO_lower) & (roots <= WTO_upper) & (gamma + delta * roots > 0)]
+    if roots.size == 0:
+        return None, 0
+    return roots[np.argmin(np.abs(roots - WTO_guess))], 0
+
+weight_solvers = {
+    'bisection': bisection_solve,
+    'brent': brent_solve,
+    'secant': secant_solve,
+    'newton': newton_solve,
+    'linear': linear_solve,
+}
+
+# Calculate Weights, Thrust, and Power
+# method selects the root finder; with return_info the iteration count and relative residual are returned too
+@instrumentation.timed('weight_est.weight_estimate')
+def weight_estimate(TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, show=False, method='bisection', rtol=0.0001, max_iter=100, return_info=False):
+    if method not in weight_solvers:
+        raise ValueError("Unknown solver method '{}', expected one of {}".format(method, list(weight_solvers)))
+    WTO_guess, iterations = weight_solvers[method](TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, rtol, max_iter)
+    if instrumentation.enabled:
+        instrumentation.observe('weight_estimate iterations [{}]'.format(method), iterations)
+    
+    info = {'method': method, 'iterations': iterations, 'converged': WTO_guess is not None, 'residual': np.nan}
+    if WTO_guess is None:
+        return (None, info) if return_info else None
+    residual, WTO_calc = weight_residual(WTO_guess, TW_ratio, Endurance)
+    info['residual'] = residual / WTO_calc
+    T_guess = TW_ratio * WTO_guess
         
     if show == True:
         print("Estimate: ")
@@ -76,10 +269,99 @@ def weight_estimate(TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, show=F
         print("Battery Weight: {:.2f} lbs".format(Endurance * motor_power_estimate(T_guess) / battery_power_density_estimate(T_guess)))
         print("Power: {:.2f} W".format(motor_power_estimate(T_guess)))
     
-    return [WTO_guess, 
-            motor_weight_estimate(T_guess),
-            Endurance * motor_power_estimate(T_guess) / battery_power_density_estimate(T_guess), 
-            motor_power_estimate(T_guess)]
+    result = [WTO_guess, 
+              motor_weight_estimate(T_guess),
+              Endurance * motor_power_estimate(T_guess) / battery_power_density_estimate(T_guess), 
+              motor_power_estimate(T_guess)]
+    return (result, info) if return_info else result
+
+# Sweep thrust-to-weight ratios in order, warm starting each solve from the previous converged weight
+# Returns the results as arrays with NaN for failed points, plus the iteration count and residual of each solve
+def warm_start_estimation(tw_values, Endurance, WTO_guess, WTO_lower, WTO_upper, method='newton', rtol=0.0001, max_iter=100):
+    results = np.full((4, len(tw_values)), np.nan)
+    iterations = np.zeros(len(tw_values), dtype=int)
+    residuals = np.full(len(tw_values), np.nan)
+    guess = WTO_guess
+    for k, t in enumerate(tw_values):
+        result, info = weight_estimate(t, Endurance, guess, WTO_lower, WTO_upper, method=method, rtol=rtol, max_iter=max_iter, return_info=True)
+        iterations[k] = info['iterations']
+        residuals[k] = info['residual']
+        if result is not None:
+            results[:, k] = result
+            guess = result[0]
+    return results, iterations, residuals
+
+# Motor weight, battery weight, power and estimated takeoff weight at thrust T
+# from the linear model coefficients c, whose entries may be scalars or per-point arrays
+def component_estimates(T, Endurance, c):
+    Power = c['p0'] + c['p1']*T
+    Wmotor = c['m0'] + c['m1']*T
+    Wbattery = Endurance * Power / (c['d0'] + c['d1']*Power)
+    WTO_calc = c['a0'] + c['a_b']*Wbattery + c['a_m']*Wmotor
+    return Wmotor, Wbattery, Power, WTO_calc
+
+# Calculate Weights, Thrust, and Power for every (T/W, endurance) pair at once
+# Runs the same bisection as weight_estimate on all points together; points that fail return NaN
+# coeffs overrides the fitted linear model coefficients, with scalars or arrays broadcast against the points
+# energy_fraction(WTO, TW_ratio, Endurance, idx) scales the battery energy of the flattened points idx at each
+# iterate, e.g. mission_sim.energy_fraction for the mission energy in place of rated power over the endurance;
+# it is called once more with converged=True at the converged weights, where NaN marks a point that fails
+@instrumentation.timed('weight_est.batch_weight_estimate')
+def batch_weight_estimate(TW_ratio, Endurance, WTO_guess, WTO_lower, WTO_upper, max_iter=200, coeffs=None, energy_fraction=None):
+    c = {key: np.asarray(value, dtype=float) for key, value in {**linear_coefficients(), **(coeffs or {})}.items()}
+    varying = [key for key, value in c.items() if value.ndim]
+    arrays = np.broadcast_arrays(np.asarray(TW_ratio, dtype=float), np.asarray(Endurance, dtype=float), *(c[key] for key in varying))
+    shape = arrays[0].shape
+    TW_ratio = arrays[0].ravel()
+    Endurance = arrays[1].ravel()
+    for key, value in zip(varying, arrays[2:]):
+        c[key] = value.ravel()
+    
+    guess = np.full(TW_ratio.size, float(WTO_guess))
+    lower = np.full(TW_ratio.size, float(WTO_lower))
+    upper = np.full(TW_ratio.size, float(WTO_upper))
+    converged = np.zeros(TW_ratio.size, dtype=bool)
+    active = np.ones(TW_ratio.size, dtype=bool)
+    iterations = np.full(TW_ratio.size, max_iter)
+    
+    for iteration in range(1, max_iter+1):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        WTO_i = guess[idx]
+        T_i = TW_ratio[idx] * WTO_i
+        c_i = {key: value[idx] if value.ndim else value for key, value in c.items()}
+        Endurance_i = Endurance[idx]
+        if energy_fraction is not None:
+            Endurance_i = Endurance_i * energy_fraction(WTO_i, TW_ratio[idx], Endurance_i, idx)
+        _, _, _, WTO_calc = component_estimates(T_i, Endurance_i, c_i)
+        
+        done = (np.abs((WTO_i-WTO_calc)/WTO_calc) < 0.0001) | (WTO_i < 0)
+        raise_lower = ~done & (WTO_i < WTO_calc)
+        drop_upper = ~done & (WTO_i > WTO_calc)
+        lower[idx[raise_lower]] = WTO_i[raise_lower]
+        upper[idx[drop_upper]] = WTO_i[drop_upper]
+        
+        failed = ~done & ((np.abs(upper[idx] - WTO_lower) < 0.0001) | (np.abs(lower[idx] - WTO_upper) < 0.0001))
+        # A non-finite estimate never moves the bracket, and a bracket squeezed onto a pole of the
+        # battery model never converges, so stop there instead of running out the iterations
+        failed |= ~done & (~np.isfinite(WTO_calc) | (upper[idx] - lower[idx] <= 4*np.finfo(float).eps*upper[idx]))
+        converged[idx[done]] = True
+        active[idx[done | failed]] = False
+        iterations[idx[done | failed]] = iteration
+        
+        step = idx[~done & ~failed]
+        guess[step] = (upper[step]+lower[step])/2
+    
+    instrumentation.observe_many('batch_weight_estimate iterations', iterations)
+    WTO = np.where(converged, guess, np.nan)
+    if energy_fraction is not None and converged.any():
+        done = np.flatnonzero(converged)
+        Endurance = np.where(converged, Endurance, np.nan)
+        Endurance[done] *= energy_fraction(WTO[done], TW_ratio[done], Endurance[done], done, converged=True)
+        WTO[np.isnan(Endurance)] = np.nan
+    Wmotor, Wbattery, Power, _ = component_estimates(TW_ratio * WTO, Endurance, c)
+    return [WTO.reshape(shape), Wmotor.reshape(shape), Wbattery.reshape(shape), Power.reshape(shape)]
 
 def weight_verification(Thrust, Power, Energy, W_battery, W_motor):
     WTO = aircraft_weight_estimate(W_battery,W_motor)
@@ -87,37 +369,28 @@ def weight_verification(Thrust, Power, Energy, W_battery, W_motor):
     Endurance = Energy / Power  
     return [TW_ratio, Endurance, WTO, W_motor, W_battery, Power]
 
-# Get lists of parameters dependence on endurance and thrust-to-weight ratio   
-def full_estimation(sweep_params, verification_params):
-    #FIXME Get design point
+# Get dense arrays of parameters over the endurance x thrust-to-weight ratio grid
+# Rows follow endurance, columns follow thrust-to-weight ratio, NaN marks non-converged points
+def sweep_estimation(sweep_params, energy_fraction=None):
     thrust_space = np.linspace(sweep_params['tw_range'][0], sweep_params['tw_range'][1], 1000)
     endurance_space = np.linspace(sweep_params['endurance_range'][0], sweep_params['endurance_range'][1], sweep_params['num'])
+    tw_grid, endurance_grid = np.meshgrid(thrust_space, endurance_space)
+    results = batch_weight_estimate(tw_grid, endurance_grid, sweep_params['WTO_guess'], sweep_params['WTO_lower'], sweep_params['WTO_upper'], energy_fraction=energy_fraction)
+    return tw_grid, endurance_grid, results
+
+# Get lists of parameters dependence on endurance and thrust-to-weight ratio   
+def full_estimation(sweep_params, verification_params, energy_fraction=None):
+    #FIXME Get design point
+    tw_grid, endurance_grid, (takeoff_weight, motor_weight, battery_weight, power) = sweep_estimation(sweep_params, energy_fraction)
+    endurance_space = endurance_grid[:,0]
     
-    takeoff_weight_list = []
-    motor_weight_list = []
-    battery_weight_list = []
-    power_list = []
-    tw_ratio_list = []
-    
-    for e in endurance_space:
-        takeoff_weight = []
-        motor_weight = []
-        battery_weight = []
-        power = []
-        tw_ratio = []
-        for t in thrust_space:
-            result = weight_estimate(t, e, sweep_params['WTO_guess'], sweep_params['WTO_lower'], sweep_params['WTO_upper']) 
-            if result is not None:
-                takeoff_weight.append(result[0])
-                motor_weight.append(result[1])
-                battery_weight.append(result[2])
-                power.append(result[3])
-                tw_ratio.append(t)
-        takeoff_weight_list.append(takeoff_weight)
-        motor_weight_list.append(motor_weight)
-        battery_weight_list.append(battery_weight)
-        power_list.append(power)
-        tw_ratio_list.append(tw_ratio)
+    # Drop non-converged points from each endurance row
+    valid = ~np.isnan(takeoff_weight)
+    takeoff_weight_list = [list(takeoff_weight[i][valid[i]]) for i in range(len(endurance_space))]
+    motor_weight_list = [list(motor_weight[i][valid[i]]) for i in range(len(endurance_space))]
+    battery_weight_list = [list(battery_weight[i][valid[i]]) for i in range(len(endurance_space))]
+    power_list = [list(power[i][valid[i]]) for i in range(len(endurance_space))]
+    tw_ratio_list = [list(tw_grid[i][valid[i]]) for i in range(len(endurance_space))]
     
     design_point = None
     if all(verification_params.values()):
@@ -138,9 +411,10 @@ def full_estimation(sweep_params, verification_params):
         
     return takeoff_weight_list, motor_weight_list, battery_weight_list, power_list, tw_ratio_list, design_point
       
-def visualize_estimation(endurance_range, takeoff_weight_list, motor_weight_list, battery_weight_list, power_list, tw_ratio_list, design_point):
+# Draw the sweep results against thrust-to-weight ratio, one line per endurance
+def draw_estimation(fig, endurance_range, takeoff_weight_list, motor_weight_list, battery_weight_list, power_list, tw_ratio_list, design_point):
     #FIXME: Plot design point
-    fig, axs = plt.subplots(2,2)
+    axs = fig.subplots(2,2)
     fig.suptitle('Sizing Analysis')
     
     axs[0,0].set_ylabel('Takeoff Weight (lbs)')
@@ -170,8 +444,13 @@ def visualize_estimation(endurance_range, takeoff_weight_list, motor_weight_list
             axs[i,j].legend()
             axs[i,j].set_xlabel('Thrust-to-Weight Ratio')
             axs[i,j].grid()
-    
-    plt.show()
+
+# Plot the sweep results, shown on screen or rendered to out (.png, .svg or .pdf),
+# in the background when a renderer is given
+def visualize_estimation(endurance_range, takeoff_weight_list, motor_weight_list, battery_weight_list, power_list, tw_ratio_list, design_point, out=None, max_points=None, renderer=None):
+    curves = [rendering.downsample(max_points, *c) for c in zip(tw_ratio_list, takeoff_weight_list, motor_weight_list, battery_weight_list, power_list)]
+    tw_ratio_list, takeoff_weight_list, motor_weight_list, battery_weight_list, power_list = ([c[n] for c in curves] for n in range(5))
+    return rendering.render(draw_estimation, (endurance_range, takeoff_weight_list, motor_weight_list, battery_weight_list, power_list, tw_ratio_list, design_point), out, renderer)
    
 # Weight Estimation sweep parameters
 sweep_params = {
@@ -199,15 +478,47 @@ verification_params = {
     'W_motor': None, # Required (lbs)
 }
 
-# Run Weight Estimation
-takeoff_weight_list, motor_weight_list, battery_weight_list, power_list, tw_ratio_list, design_point = full_estimation(sweep_params,verification_params)
-visualize_estimation(
-    np.linspace(sweep_params['endurance_range'][0],sweep_params['endurance_range'][1],sweep_params['num']), 
-    takeoff_weight_list,
-    motor_weight_list, 
-    battery_weight_list, 
-    power_list, 
-    tw_ratio_list,
-    design_point
-)
-weight_estimate(constraint_params['tw_range'], constraint_params['endurance'], sweep_params['WTO_guess'], sweep_params['WTO_lower'], sweep_params['WTO_upper'], show=True)
\ No newline at end of file
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Weight estimation sweep over thrust-to-weight ratio and endurance.')
+    parser.add_argument('--mission', action='store_true', help='size the sweep batteries for the mission energy instead of rated power throughout')
+    rendering.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.from_args(args), rendering.BackgroundRenderer() as renderer:
+        # Run Weight Estimation
+        sweep, energy_fraction = sweep_params, None
+        if args.mission:
+            import mission_sim
+            sweep, energy_fraction = {**sweep_params, **mission_sim.search_range}, mission_sim.energy_fraction()
+        takeoff_weight_list, motor_weight_list, battery_weight_list, power_list, tw_ratio_list, design_point = full_estimation(sweep,verification_params,energy_fraction)
+        visualize_estimation(
+            np.linspace(sweep_params['endurance_range'][0],sweep_params['endurance_range'][1],sweep_params['num']), 
+            takeoff_weight_list,
+            motor_weight_list, 
+            battery_weight_list, 
+            power_list, 
+            tw_ratio_list,
+            design_point,
+            args.plot_out,
+            args.max_points,
+            renderer
+        )
+        if not args.mission:
+            weight_estimate(constraint_params['tw_range'], constraint_params['endurance'], sweep_params['WTO_guess'], sweep_params['WTO_lower'], sweep_params['WTO_upper'], show=True)
+            return
+        WTO, W_motor, W_battery, Power = mission_sim.mission_weight_estimate(constraint_params['tw_range'], constraint_params['endurance'], sweep['WTO_guess'], sweep['WTO_lower'], sweep['WTO_upper'])
+        if np.isnan(WTO):
+            print("Mission estimate: no feasible takeoff weight")
+            return
+        print("Mission estimate: ")
+        print("Takeoff Weight: {:.2f} lbs".format(WTO))
+        print("Thrust: {:.2f} lbs".format(constraint_params['tw_range'] * WTO))
+        print("Motor Weight: {:.2f} lbs".format(W_motor))
+        print("Battery Weight: {:.2f} lbs".format(W_battery))
+        print("Rated Power: {:.2f} W".format(Power))
+        if mission_sim.outside_motor_data(WTO, constraint_params['tw_range']):
+            print("Warning: thrust outside the EDF data ({:.2f} to {:.2f} lbs), motor weight and power are extrapolated".format(*motor_thrust_range()))
+
+if __name__ == '__main__':
+    main()
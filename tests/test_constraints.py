@@ -0,0 +1,51 @@
+import numpy as np
+from constraints import default_params, evaluate_constraints, feasible_region, takeoff_constraint, velocity_constraint
+
+# Configurations spread around the nominal constraint parameters, some of them infeasible
+def sample_params(n, seed=0):
+    rng = np.random.default_rng(seed)
+    keys = ['e', 'CD0', 'CLmaxTO', 'CLmaxL', 'CLmaxCruise', 'WTO_estimate', 'V_max']
+    return {key: default_params[key] * np.exp(0.3 * rng.standard_normal(n)) for key in keys}
+
+# The vectorized evaluation reports the same bounds, optimum and feasibility as feasible_region for each configuration
+def test_evaluate_matches_feasible_region():
+    params = sample_params(200)
+    for max_tw_ratio in (0.3, 1.0):
+        result = evaluate_constraints(params, max_tw_ratio)
+        assert 0 < result['feasible'].sum() < 200
+        for i in range(200):
+            region = feasible_region({key: value[i] for key, value in params.items()}, max_tw_ratio)
+            assert result['feasible'][i] == region['feasible']
+            for key in ('ws_min', 'ws_max', 'ws_lower', 'ws_upper'):
+                assert np.isclose(result[key][i], region[key], rtol=1e-12, equal_nan=True)
+            if region['feasible']:
+                assert np.isclose(result['ws_opt'][i], region['ws_opt'], rtol=1e-12)
+                assert np.isclose(result['tw_min'][i], region['tw_min'], rtol=1e-12)
+
+# The region bounds, optimum and feasibility agree with a dense scan of the constraint curves
+def test_feasible_region_matches_dense_scan():
+    params = sample_params(40, seed=1)
+    feasible_count = 0
+    for i in range(40):
+        config = {key: value[i] for key, value in params.items()}
+        for max_tw_ratio in (0.3, 1.0):
+            region = feasible_region(config, max_tw_ratio)
+            ws = np.linspace(region['ws_min'], region['ws_max'], 200001)
+            full = {**default_params, **config}
+            tw = np.maximum(takeoff_constraint(ws, full), velocity_constraint(ws, full))
+            inside = tw <= max_tw_ratio
+            if not region['feasible']:
+                assert not inside.any() or region['ws_min'] >= region['ws_max']
+                assert np.isnan([region['ws_lower'], region['ws_upper'], region['ws_opt'], region['tw_min']]).all()
+                assert region['vertices'] == []
+                continue
+            feasible_count += 1
+            step = ws[1] - ws[0]
+            assert region['ws_min'] <= region['ws_lower'] <= region['ws_upper'] <= region['ws_max']
+            assert abs(ws[inside][0] - region['ws_lower']) <= step
+            assert abs(ws[inside][-1] - region['ws_upper']) <= step
+            assert region['tw_min'] <= tw[inside].min() + 1e-12
+            assert region['ws_lower'] <= region['ws_opt'] <= region['ws_upper']
+            for w, t in region['vertices']:
+                assert region['ws_lower'] <= w <= region['ws_upper'] and t <= max_tw_ratio + 1e-12
+    assert feasible_count > 10
@@ -0,0 +1,33 @@
+import numpy as np
+from coupled_sizing import coupled_graph, coupled_params, coupled_solve
+import weight_est
+
+# The solve stops at a fixed point of the weight closure, whatever the starting weight
+def test_converges_to_fixed_point():
+    designs = []
+    for WTO in (10.0, 20.0):
+        design, history = coupled_solve(coupled_graph(WTO=WTO, num_lh=101))
+        assert design['converged'] and design['error'] is None
+        assert design['iterations'] == len(history)
+        assert np.isclose(history[-1]['WTO_closure'], design['WTO'], rtol=1e-8)
+        TW = max(coupled_params['T/W'], design['constraints']['tw_constraint'], design['tail']['TW_req'] * (1 + coupled_params['tw_margin']))
+        assert design['T/W'] == TW
+        closure = weight_est.weight_estimate(TW, coupled_params['Endurance'], design['WTO'], 1, 50, method='newton', rtol=1e-10)
+        assert np.isclose(closure[0], design['WTO'], rtol=1e-8)
+        designs.append(design['WTO'])
+    assert np.isclose(designs[0], designs[1], rtol=1e-8)
+
+# Below the motor data the closure has no solution: the design reports why and has no weight
+def test_closure_failure():
+    design, history = coupled_solve(coupled_graph(params={'T/W': 0.5}, num_lh=101))
+    assert not design['converged'] and design['weight'] is None
+    assert design['error'].startswith('Weight closure has no solution between 1 and 50 lbs')
+    assert history == [] and design['iterations'] == 1
+
+# Running out of iterations gives the last evaluated iterate, evaluated once
+def test_max_iter():
+    design, history = coupled_solve(coupled_graph(num_lh=101), max_iter=1)
+    assert not design['converged'] and design['error'] is None
+    assert len(history) == 1 and design['iterations'] == 1
+    assert design['WTO'] == history[0]['WTO'] == 10.0
+    assert design['weight']['WTO'] == history[0]['WTO_closure']
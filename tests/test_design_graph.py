@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import hstab_params
+from design_graph import DependencyGraph, sizing_graph
+from hstab_sizing import calculate_bh, evaluate_points
+
+# A toy graph: setting an input recomputes only what depends on it, once
+def test_recomputes_dependents_only():
+    calls = []
+    graph = DependencyGraph()
+    graph.add_input('a', 1)
+    graph.add_input('b', 2)
+    graph.add_node('sum', ['a', 'b'], lambda a, b: calls.append('sum') or a + b)
+    graph.add_node('double', ['b'], lambda b: calls.append('double') or 2 * b)
+    graph.add_node('total', ['sum', 'double'], lambda s, d: calls.append('total') or s + d)
+    assert graph['total'] == 7 and graph.computations == 3
+    graph.set('a', 1)
+    assert graph['total'] == 7 and graph.computations == 3
+    graph.set('a', 5)
+    assert graph['total'] == 11
+    assert calls == ['sum', 'double', 'total', 'sum', 'total']
+
+def test_invalid_changes():
+    graph = DependencyGraph()
+    graph.add_input('a', np.arange(3))
+    graph.add_node('b', ['a'], lambda a: a + 1)
+    with pytest.raises(ValueError, match="'b' is derived"):
+        graph.set('b', 1)
+    with pytest.raises(ValueError, match="Unknown input 'c'"):
+        graph.set('c', 1)
+    with pytest.raises(ValueError, match="Unknown dependency 'c' of 'd'"):
+        graph.add_node('d', ['c'], lambda c: c)
+    graph.get('b')
+    graph.set('a', np.arange(3))
+    assert graph.computations == 1
+
+# The sizing graph gives the h-stab values of the direct calls, and a change only reaches the quantities using it
+def test_sizing_graph():
+    graph = sizing_graph()
+    params = hstab_params.get_params()
+    lh, aoa_trim = graph['lh'], graph['aoa_trim']
+    assert np.isclose(graph['bh_trim'], calculate_bh(lh, aoa_trim, params), rtol=1e-12)
+    checks, _ = evaluate_points(lh, aoa_trim, params)
+    assert graph['verified'] == bool(np.logical_and.reduce(list(checks.values())))
+    graph.get('stability_coefficients')
+
+    computations = graph.computations
+    graph.set('T/W', params['T/W'] * 1.1)
+    graph.get('bh_trim')
+    graph.get('stability_coefficients')
+    assert graph.computations == computations
+
+    graph.set('lh', lh * 1.2)
+    bh = calculate_bh(lh * 1.2, aoa_trim, params)
+    assert np.isclose(graph['bh_trim'], bh, rtol=1e-12)
+    assert np.isclose(graph['Sh'], bh**2 / graph['ARh'], rtol=1e-12)
+    assert np.isclose(graph['stability_coefficients']['Vh_long'], graph['Sh'] / graph['S'] * lh * 1.2 / graph['MAC'], rtol=1e-12)
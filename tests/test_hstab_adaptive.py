@@ -0,0 +1,29 @@
+import numpy as np
+from hstab_adaptive import adaptive_grid
+from hstab_params import get_params
+from hstab_sizing import evaluate_grid, sweep_grid
+
+# A single point on either axis leaves no cells to refine, so every point is evaluated
+def test_single_point_axis():
+    params = get_params()
+    for num_lh, num_aoa in [(1, 11), (101, 1), (1, 1)]:
+        lh_arr, aoa_arr = sweep_grid(params, num_lh, num_aoa)
+        result = adaptive_grid(lh_arr, aoa_arr, params)
+        verified, _ = evaluate_grid(lh_arr, aoa_arr, params)
+        assert result['evaluations'] == num_lh * num_aoa
+        assert np.array_equal(result['verified'], verified)
+
+# On the default grid the adaptive sweep classifies every point like the full grid with fewer evaluations,
+# and the points it evaluates carry the full grid's solutions
+def test_matches_full_grid():
+    params = get_params()
+    lh_arr, aoa_arr = sweep_grid(params)
+    result = adaptive_grid(lh_arr, aoa_arr, params)
+    verified, data = evaluate_grid(lh_arr, aoa_arr, params)
+    assert np.array_equal(result['verified'], verified)
+    assert result['evaluations'] < verified.size // 2
+    assert result['evaluated_verified'].sum() <= verified.sum()
+    bh = np.broadcast_to(data['bh (ft)'], verified.shape)
+    evaluated_bh = result['evaluated']['bh (ft)']
+    assert evaluated_bh.size == result['evaluations']
+    assert np.isin(evaluated_bh[~np.isnan(evaluated_bh)], bh).all()
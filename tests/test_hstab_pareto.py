@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from hstab_params import get_params
+from hstab_pareto import dominated_count, front_ranks, grid_front, parse_objectives, pareto_front
+from hstab_sizing import evaluate_grid, evaluate_points, sweep_grid
+
+# Fronts of a small two-objective problem; infeasible points rank after every feasible one, by violations
+def test_front_ranks():
+    f = np.array([[1, 4], [2, 2], [4, 1], [3, 3], [5, 5], [np.inf, np.inf], [np.inf, np.inf]])
+    violations = np.array([0, 0, 0, 0, 0, 2, 1])
+    assert front_ranks(f, violations).tolist() == [0, 0, 0, 1, 2, 4, 3]
+
+def test_unknown_objective():
+    with pytest.raises(ValueError, match="Unknown objective 'span'"):
+        parse_objectives(['span'])
+    with pytest.raises(ValueError, match="Unknown objective sense 'up'"):
+        parse_objectives(['SM:up'])
+
+# The optimizer front on a small run is reproducible, verified and mutually non-dominated
+def test_pareto_front():
+    params = get_params()
+    front, evaluations = pareto_front(params, population=16, generations=8, seed=0)
+    again, _ = pareto_front(params, population=16, generations=8, seed=0)
+    assert evaluations == 16 * 9
+    assert all(np.array_equal(front[c], again[c]) for c in front)
+    assert len(front['lh (ft)']) > 1
+    assert dominated_count(front, front) == 0
+    checks, data = evaluate_points(front['lh (ft)'], front['aoa_trim (deg)'], params)
+    assert np.logical_and.reduce(list(checks.values())).all()
+    assert np.allclose(data['bh (ft)'], front['bh (ft)'])
+    assert np.all(np.diff(front['bh (ft)']) >= 0)
+
+# Every verified grid point off the grid front is dominated by a point on it
+def test_grid_front():
+    params = get_params()
+    lh_arr, aoa_arr = sweep_grid(params, 101, 6)
+    front = grid_front(lh_arr, aoa_arr, params)
+    verified, data = evaluate_grid(lh_arr, aoa_arr, params)
+    points = {c: np.broadcast_to(data[c], verified.shape)[verified] for c in data}
+    assert dominated_count(front, front) == 0
+    front_points = set(zip(front['lh (ft)'], front['aoa_trim (deg)']))
+    on_front = np.array([point in front_points for point in zip(points['lh (ft)'], points['aoa_trim (deg)'])])
+    off_front = {c: values[~on_front] for c, values in points.items()}
+    assert dominated_count(off_front, front) == (~on_front).sum() > 0
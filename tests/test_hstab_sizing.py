@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+from hstab_params import get_params
+from hstab_sizing import evaluate_grid, evaluate_points, solution_columns, sweep_grid
+
+# The verified rows of the default grid reproduce the solutions of the original row-by-row sweep
+def test_grid_matches_baseline_csv():
+    params = get_params()
+    verified, data = evaluate_grid(*sweep_grid(params), params)
+    baseline = pd.read_csv('data/solutions/hstab.csv')
+    assert list(baseline.columns) == solution_columns
+    assert verified.sum() == len(baseline)
+    for column in solution_columns:
+        assert np.allclose(data[column][verified], baseline[column].values, rtol=1e-12, atol=0)
+
+# Broadcasting the grid gives the same checks and values as evaluating its points as flat arrays
+def test_grid_matches_points():
+    params = get_params()
+    lh_arr, aoa_arr = sweep_grid(params, 41, 6)
+    verified, data = evaluate_grid(lh_arr, aoa_arr, params)
+    lh, aoa_trim = np.meshgrid(lh_arr, aoa_arr, indexing='ij')
+    checks, points = evaluate_points(lh.ravel(), aoa_trim.ravel(), params)
+    assert np.array_equal(verified.ravel(), np.logical_and.reduce(list(checks.values())))
+    for column in solution_columns:
+        assert np.array_equal(np.broadcast_to(data[column], verified.shape).ravel(), points[column], equal_nan=True)
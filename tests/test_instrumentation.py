@@ -0,0 +1,46 @@
+import json
+import numpy as np
+import instrumentation
+import weight_est
+
+# Nothing is recorded outside an instrumented block
+def test_disabled_by_default():
+    instrumentation.reset()
+    assert not instrumentation.enabled
+    weight_est.weight_estimate(0.85, 1/12, 7, 5, 15)
+    instrumentation.count('calls')
+    instrumentation.observe('values', 1)
+    assert instrumentation.counters == {} and instrumentation.histograms == {}
+
+# Counters, timers and histograms are recorded inside the block and the flag is restored after it
+def test_instrumented_block():
+    @instrumentation.timed('square')
+    def square(x):
+        return x * x
+    with instrumentation.instrumented() as report:
+        assert [square(x) for x in range(3)] == [0, 1, 4]
+        instrumentation.count('calls', 5)
+        instrumentation.observe('values', 2)
+        instrumentation.observe_many('values', np.array([1, 2, 2]))
+        with instrumentation.timer('block'):
+            pass
+        weight_est.weight_estimate(0.85, 1/12, 7, 5, 15, method='newton')
+    assert not instrumentation.enabled
+    assert report['counters']['square']['calls'] == 3
+    assert report['counters']['calls'] == {'calls': 5, 'total_s': 0.0, 'mean_s': 0.0}
+    assert report['counters']['block']['calls'] == 1
+    assert report['counters']['weight_est.weight_estimate']['calls'] == 1
+    assert report['histograms']['values'] == {'1': 1, '2': 3}
+    assert sum(report['histograms']['weight_estimate iterations [newton]'].values()) == 1
+
+# A summary survives JSON and merges back into the counters, as from a worker process
+def test_merge_round_trip():
+    with instrumentation.instrumented() as report:
+        instrumentation.count('calls', 2)
+        instrumentation.observe('values', 3)
+    report = json.loads(json.dumps(report))
+    with instrumentation.instrumented() as merged:
+        instrumentation.count('calls')
+        instrumentation.merge(report)
+    assert merged['counters']['calls']['calls'] == 3
+    assert merged['histograms']['values'] == {'3': 1}
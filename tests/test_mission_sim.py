@@ -0,0 +1,32 @@
+import numpy as np
+import weight_est
+from mission_sim import mission_weight_estimate, outside_motor_data, search_range
+
+TW_RATIO = np.array([0.6, 0.7, 0.8, 0.9, 1.0])
+ENDURANCE = 0.1
+
+# With power_exponent = 0 every segment draws rated power, so the mission closure is the constant-power closure:
+# the same weights with the same search range (the battery to round-off, as the segment times add up to the
+# endurance), and within the bisection tolerance with the wider mission range
+def test_constant_power_limit():
+    sp = weight_est.sweep_params
+    constant = weight_est.batch_weight_estimate(TW_RATIO, ENDURANCE, sp['WTO_guess'], sp['WTO_lower'], sp['WTO_upper'])
+    mission = mission_weight_estimate(TW_RATIO, ENDURANCE, sp['WTO_guess'], sp['WTO_lower'], sp['WTO_upper'], mission={'power_exponent': 0})
+    assert np.array_equal(mission[0], constant[0], equal_nan=True)
+    for a, b in zip(constant, mission):
+        assert np.allclose(a, b, rtol=1e-12, equal_nan=True)
+
+    wide = mission_weight_estimate(TW_RATIO, ENDURANCE, sp['WTO_guess'], search_range['WTO_lower'], search_range['WTO_upper'], mission={'power_exponent': 0})
+    assert np.array_equal(np.isnan(wide[0]), np.isnan(constant[0]))
+    assert np.allclose(wide[0], constant[0], rtol=1e-3, equal_nan=True)
+
+# Throttled segments need less battery, and designs that light fall below the thrust of the EDF data
+def test_mission_below_constant_power():
+    sp = weight_est.sweep_params
+    constant = weight_est.batch_weight_estimate(TW_RATIO, ENDURANCE, sp['WTO_guess'], search_range['WTO_lower'], search_range['WTO_upper'])[0]
+    WTO = mission_weight_estimate(TW_RATIO, ENDURANCE, sp['WTO_guess'], search_range['WTO_lower'], search_range['WTO_upper'])[0]
+    converged = ~np.isnan(WTO)
+    assert converged.any()
+    assert np.all(WTO[converged] < constant[converged])
+    low, high = weight_est.motor_thrust_range()
+    assert np.array_equal(outside_motor_data(WTO, TW_RATIO), converged & ((TW_RATIO * WTO < low) | (TW_RATIO * WTO > high)))
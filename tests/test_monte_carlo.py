@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from constraints import evaluate_constraints
+import monte_carlo
+
+# The same seed gives the same samples
+def test_seed_reproducible():
+    first = monte_carlo.monte_carlo(2000, seed=3, batch_size=700)
+    second = monte_carlo.monte_carlo(2000, seed=3, batch_size=700)
+    for key in first:
+        assert np.array_equal(first[key], second[key], equal_nan=True)
+
+@pytest.mark.parametrize('n, batch_size', [(0, 10), (10, 0)])
+def test_invalid_sizes(n, batch_size):
+    with pytest.raises(ValueError, match='must be positive'):
+        monte_carlo.monte_carlo(n, seed=0, batch_size=batch_size)
+
+# Each sample's constraints are evaluated at its own closed weight, and the constraint outputs
+# are only defined where the diagram is feasible, which needs the closure to converge
+def test_constraints_at_closed_weight():
+    n = 5000
+    samples = monte_carlo.monte_carlo(n, seed=0)
+    rng = np.random.default_rng(0)
+    monte_carlo.sample_weight_coeffs(n, rng)
+    with np.errstate(invalid='ignore'):
+        constraints = evaluate_constraints({**monte_carlo.sample_constraint_params(n, rng), 'WTO_estimate': samples['WTO']})
+    feasible = samples['feasible']
+    assert np.array_equal(feasible, constraints['feasible'])
+    assert 0 < feasible.sum() < n
+    assert not feasible[np.isnan(samples['WTO'])].any()
+    for key in ('tw_min', 'ws_opt'):
+        assert np.array_equal(samples[key][feasible], constraints[key][feasible])
+        assert np.isnan(samples[key][~feasible]).all()
+
+# The statistics of each output cover exactly the samples where it is defined
+def test_summarize_valid_fraction():
+    samples = monte_carlo.monte_carlo(3000, seed=1)
+    summary = monte_carlo.summarize(samples)
+    assert 'feasible' not in summary
+    for key, stats in summary.items():
+        defined = samples[key][~np.isnan(samples[key])]
+        assert stats['valid'] == defined.size / samples[key].size
+        assert np.isclose(stats['p50'], np.median(defined))
+    assert summary['tw_min']['valid'] == np.mean(samples['feasible'])
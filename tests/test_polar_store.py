@@ -0,0 +1,40 @@
+import glob
+import os
+import numpy as np
+import pandas as pd
+from polar_store import build_store, open_store
+from polar_tables import PolarTable
+
+POLARS = ['data/polars/Wing.csv', 'data/polars/Wing-Flap.csv', 'data/polars/Hstab.csv']
+
+# Single-speed lookups match the CSV polar tables, including extrapolation past the ends
+def test_lookup_matches_csv(tmp_path):
+    store = build_store(POLARS, str(tmp_path))
+    alpha = np.linspace(-12.0, 16.0, 113)
+    for path, (surface, flap) in zip(POLARS, [('Wing', False), ('Wing', True), ('Hstab', False)]):
+        table = PolarTable.from_csv(path)
+        for column in ('CL', 'CD', 'Cm'):
+            assert np.allclose(store.lookup(surface, column, alpha, flap=flap), table.lookup(alpha, column), rtol=1e-12, atol=1e-15)
+            assert np.allclose(store.polar_table(surface, flap=flap).lookup(alpha, column), table.lookup(alpha, column), rtol=1e-12, atol=1e-15)
+
+# Speeds are stored in ft/s, from QInf in m/s, and lookups between two speeds interpolate linearly
+def test_speeds_in_feet_per_second(tmp_path):
+    df = pd.read_csv('data/polars/Wing.csv')
+    fast = df.assign(QInf=2 * df['QInf'], CL=2 * df['CL'])
+    fast.to_csv(tmp_path / 'Wing@fast.csv', index=False)
+    store = build_store(['data/polars/Wing.csv', str(tmp_path / 'Wing@fast.csv')], str(tmp_path / 'store'))
+    speed = df['QInf'].iloc[0] / 0.3048
+    assert np.allclose(store.speeds('Wing'), [speed, 2 * speed])
+    alpha = np.array([-3.0, 2.0, 7.25])
+    CL = PolarTable.from_csv('data/polars/Wing.csv').CL(alpha)
+    assert np.allclose(store.lookup('Wing', 'CL', alpha, speed=1.5 * speed), 1.5 * CL)
+    assert np.allclose(store.polar_table('Wing', 1.5 * speed).CL(alpha), 1.5 * CL)
+
+# A rebuild points the index at its own binary and removes the old one; open_store only rebuilds on changes
+def test_rebuild_replaces_index_and_binary(tmp_path):
+    first = build_store(POLARS[:1], str(tmp_path))
+    second = open_store(POLARS, str(tmp_path))
+    assert second.index['data'] != first.index['data']
+    assert sorted(os.listdir(tmp_path)) == sorted(['index.json', second.index['data']])
+    assert open_store(POLARS, str(tmp_path)).index['key'] == second.index['key']
+    assert not glob.glob(str(tmp_path / '*.tmp'))
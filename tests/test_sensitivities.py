@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from scipy.optimize import brentq
+from hstab_params import get_params
+from hstab_sizing import SM, TW_req, aoa, calculate_bh
+from sensitivities import Dual, hstab_inputs, seed, sensitivities, split, weight_inputs, weight_sensitivities
+import weight_est
+
+# Central difference of fn with respect to one input, scaled to its magnitude
+def central_difference(fn, x, h=1e-6):
+    step = h * max(abs(x), 1.0)
+    return (fn(x + step) - fn(x - step)) / (2 * step)
+
+# Dual derivatives of the supported operations and functions on arrays
+def test_dual_operations():
+    x = np.array([0.5, 1.0, 2.0])
+    duals = seed({'x': x, 'y': 3.0})
+    value, gradient = split(np.sqrt(duals['x']) * np.exp(-duals['x']) / (1 + duals['y']**2) - np.log(duals['x']) / duals['y'], ['x', 'y'])
+    assert np.allclose(value, np.sqrt(x) * np.exp(-x) / 10 - np.log(x) / 3)
+    assert np.allclose(gradient['x'], (0.5 / np.sqrt(x) - np.sqrt(x)) * np.exp(-x) / 10 - 1 / (3 * x))
+    assert np.allclose(gradient['y'], -np.sqrt(x) * np.exp(-x) * 6 / 100 + np.log(x) / 9)
+    with pytest.raises(ValueError, match='Dual exponents are not supported'):
+        duals['x'] ** duals['y']
+    assert isinstance(2.0 - Dual(1.0, [1.0]), Dual)
+
+# The h-stab sizing derivatives match finite differences for the positional arguments and every parameter
+@pytest.mark.parametrize('fn, args, wrt', [
+    (calculate_bh, [1.702, 5.0], [0, 1] + hstab_inputs),
+    (aoa, [1.702, 1.72, 1.2], [0, 1] + hstab_inputs),
+    (SM, [1.702, 1.72], [0, 1] + hstab_inputs),
+    (TW_req, [0.012], [0, 'W/S', 'rho_alt', 'Vmax', 'e', 'AR']),
+])
+def test_hstab_derivatives(fn, args, wrt):
+    params = get_params()
+    value, gradients = sensitivities(fn, args, params, wrt)
+    assert np.isclose(value, fn(*args, params))
+    for name in wrt:
+        if isinstance(name, int):
+            difference = central_difference(lambda x: fn(*args[:name], x, *args[name+1:], params), args[name])
+        else:
+            difference = central_difference(lambda x: fn(*args, {**params, name: x}), params[name])
+        assert np.isclose(gradients[name], difference, rtol=1e-5, atol=1e-8), name
+
+def test_unknown_inputs():
+    with pytest.raises(ValueError, match="Unknown parameter 'span'"):
+        sensitivities(SM, [1.7, 1.7], get_params(), ['span'])
+    with pytest.raises(ValueError, match='No positional argument 2'):
+        sensitivities(SM, [1.7, 1.7], get_params(), [2])
+    with pytest.raises(ValueError, match="Unknown weight input 'span'"):
+        weight_sensitivities(8.0, 0.85, 0.1, ['span'])
+
+# Converged takeoff weight of the linear models, solved far below the closure tolerance
+def closed_weight(values):
+    c = {key: values[key] for key in weight_inputs[2:]}
+    residual = lambda WTO: WTO - weight_est.component_estimates(values['TW_ratio'] * WTO, values['Endurance'], c)[3]
+    return brentq(residual, 5, 15, xtol=1e-14, rtol=1e-15)
+
+def closed_outputs(values):
+    WTO = closed_weight(values)
+    c = {key: values[key] for key in weight_inputs[2:]}
+    Wmotor, Wbattery, Power, _ = weight_est.component_estimates(values['TW_ratio'] * WTO, values['Endurance'], c)
+    return WTO, Wmotor, Wbattery, Power
+
+# Implicit derivatives of the converged weights match finite differences of re-solved closures
+def test_weight_derivatives():
+    values = {'TW_ratio': 0.85, 'Endurance': 1/12, **weight_est.linear_coefficients()}
+    gradients = weight_sensitivities(closed_weight(values), values['TW_ratio'], values['Endurance'])
+    for name in weight_inputs:
+        for k, output in enumerate(['WTO', 'W_motor', 'W_battery', 'Power']):
+            difference = central_difference(lambda x: closed_outputs({**values, name: x})[k], values[name], h=1e-5)
+            assert np.isclose(gradients[output][name], difference, rtol=1e-5, atol=1e-8), (output, name)
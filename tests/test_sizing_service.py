@@ -0,0 +1,40 @@
+import asyncio
+import numpy as np
+import pytest
+from sizing_service import Batcher, SizingService
+
+def requests():
+    return (
+        [{'op': 'weight_estimate', 'TW_ratio': tw, 'Endurance': 0.1} for tw in np.linspace(0.6, 1.0, 9)]
+        + [{'op': 'weight_estimate', 'TW_ratio': 0.8, 'Endurance': 0.1, 'WTO_lower': 1, 'WTO_upper': 50}]
+        + [{'op': 'verify', 'lh': lh, 'aoa_trim': aoa} for lh, aoa in [(1.5, 0.0), (2.0, 2.5), (3.5, 5.0)]]
+        + [{'op': 'constraints', 'CD0': cd0} for cd0 in (0.02, 0.03, 0.05)] + [{'op': 'constraints'}]
+        + [{'op': 'stability', 'lh': lh, 'Sh': 0.9} for lh in (1.0, 1.5, 2.5)]
+    )
+
+# Requests answered together in batches give the same results as each request answered on its own
+def test_batched_matches_unbatched():
+    async def run():
+        service = SizingService()
+        batched = await asyncio.gather(*(service.query(message) for message in requests()))
+        single = [await service.query(message) for message in requests()]
+        return service.stats(), batched, single
+    stats, batched, single = asyncio.run(run())
+    assert all('result' in response for response in batched)
+    assert batched == single
+    assert stats['weight_estimate'] == {'requests': 20, 'batches': 11}
+
+# A request that fails only fails itself, not the others evaluated in the same batch
+def test_failing_request_isolated():
+    def evaluate(batch):
+        if any(request['x'] < 0 for request in batch):
+            raise ValueError("negative x")
+        return [2 * request['x'] for request in batch]
+    async def run():
+        batcher = Batcher(evaluate)
+        return await asyncio.gather(*(batcher.submit({'x': x}) for x in (1, -1, 3)), return_exceptions=True), batcher.batches
+    results, batches = asyncio.run(run())
+    assert batches == 1
+    assert results[0] == 2 and results[2] == 6
+    with pytest.raises(ValueError, match='negative x'):
+        raise results[1]
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from hstab_sizing import solution_columns
+from solution_store import SolutionStore, parse_range
+
+def baseline():
+    frame = pd.read_csv('data/solutions/hstab.csv')
+    return {column: frame[column].values for column in solution_columns}
+
+# Rows, run parameters and NaN values survive a round trip through a store that is closed and reopened
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'solutions.db')
+    data = baseline()
+    other = {column: values[:50] * 2 for column, values in data.items()}
+    other['SM'][0] = np.nan
+    with SolutionStore(path, solution_columns) as store:
+        first = store.add_run({'num_lh': np.int64(1001), 'bh_range': (0.5, 2.0)}, source='hstab.csv')
+        assert store.insert(first, data) == len(data['SM'])
+        second = store.add_run()
+        store.insert(second, other)
+    with SolutionStore(path) as store:
+        assert store.columns == solution_columns
+        runs = store.runs()
+        assert [run['rows'] for run in runs] == [len(data['SM']), 50]
+        assert runs[0]['params'] == {'num_lh': 1001, 'bh_range': [0.5, 2.0]} and runs[0]['source'] == 'hstab.csv'
+        rows = store.query(runs=[first])
+        assert all(np.array_equal(rows[column], data[column]) for column in solution_columns)
+        rows = store.query(runs=[second])
+        assert np.isnan(rows['SM'][0]) and np.array_equal(rows['SM'][1:], other['SM'][1:])
+        store.delete_run(second)
+        assert [run['run_id'] for run in store.runs()] == [first]
+
+# Range queries and top-k match filtering and sorting the arrays directly
+def test_range_and_top_k(tmp_path):
+    data = baseline()
+    with SolutionStore(str(tmp_path / 'solutions.db'), solution_columns) as store:
+        run_id = store.add_run()
+        store.insert(run_id, data)
+        inside = (data['SM'] >= 0.3) & (data['SM'] <= 0.5) & (data['bh (ft)'] <= 1.5)
+        rows = store.query({'SM': (0.3, 0.5), 'bh (ft)': (None, 1.5)}, order_by='T/W_req')
+        assert np.array_equal(rows['T/W_req'], np.sort(data['T/W_req'][inside]))
+        for where in (None, {'SM': (0.3, None)}):
+            mask = np.ones(len(data['SM']), dtype=bool) if where is None else data['SM'] >= 0.3
+            top = store.top_k('bh (ft)', 5, where, descending=True)
+            assert np.array_equal(top['bh (ft)'], np.sort(data['bh (ft)'][mask])[::-1][:5])
+        with pytest.raises(ValueError, match="Unknown solution column 'span'"):
+            store.query({'span': (0, 1)})
+
+# Opening a missing store without columns fails before any file is created
+def test_missing_store(tmp_path):
+    path = tmp_path / 'missing.db'
+    with pytest.raises(ValueError, match='does not exist yet'):
+        SolutionStore(str(path))
+    assert not path.exists()
+    SolutionStore(str(path), solution_columns).close()
+    with pytest.raises(ValueError, match='holds columns'):
+        SolutionStore(str(path), solution_columns[:3])
+
+def test_parse_range():
+    assert parse_range('bh (ft)=:2') == ('bh (ft)', (None, 2.0))
+    assert parse_range('SM=0.05:0.15') == ('SM', (0.05, 0.15))
+    with pytest.raises(ValueError, match="Expected 'column=low:high'"):
+        parse_range('SM=0.1')
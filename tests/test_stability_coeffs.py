@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+import stability_params
+from stability_coeffs import get_coefficients, stability_coefficients, stability_maps, statically_stable
+
+# Each point of a broadcast map has the coefficients of that configuration computed on its own
+def test_maps_match_scalar_coefficients():
+    Sh = np.linspace(0.5, 1.2, 4)[:, None, None]
+    lh = np.linspace(1.0, 3.0, 5)[None, :, None]
+    aoa_trim = np.array([0.0, 3.0, 6.0])[None, None, :]
+    maps = stability_maps(Sh=Sh, lh=lh, aoa_trim=aoa_trim)
+    assert all(value.shape == (4, 5, 3) for value in maps.values())
+    for i, j, k in np.ndindex(4, 5, 3):
+        params = {**stability_params.params, 'Sh': Sh[i, 0, 0], 'lh': lh[0, j, 0], 'aoa_trim': aoa_trim[0, 0, k]}
+        coefficients = stability_coefficients(params, *stability_params.surface_coeffs(params))
+        for name, value in coefficients.items():
+            assert np.isclose(maps[name][i, j, k], value, rtol=1e-12, atol=1e-15)
+
+# Without arrays the maps are the module's coefficients
+def test_maps_default_parameters():
+    maps = stability_maps()
+    for name, value in get_coefficients().items():
+        assert np.isclose(maps[name], value, rtol=1e-12, atol=1e-15)
+    assert statically_stable(maps) == statically_stable(get_coefficients())
+
+def test_unknown_parameter():
+    with pytest.raises(ValueError, match="Unknown stability parameter 'tail'"):
+        stability_maps(tail=np.ones(3))
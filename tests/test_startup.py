@@ -0,0 +1,17 @@
+import hstab_params
+from startup_check import STARTUP_TARGET, measure_startup
+
+# Importing every module in src/ loads no heavy dependency and stays under the startup target
+# Best of several runs, so a busy machine does not fail the test
+def test_startup():
+    results = [measure_startup() for _ in range(3)]
+    assert results[0][1] == []
+    assert min(r[0] for r in results) < STARTUP_TARGET
+
+# Editing the returned parameters does not change them for later callers
+def test_get_params_copy():
+    params = hstab_params.get_params()
+    params['T/W'] = -1.0
+    params['CLah'] = -1.0
+    assert hstab_params.get_params()['T/W'] == hstab_params.design_params['T/W']
+    assert hstab_params.get_params()['CLah'] != -1.0
@@ -0,0 +1,27 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from surrogates import LinearSurrogate
+
+# A duplicated feature splits its weight evenly (minimum norm), as an intercept fit on centered data does
+def test_duplicated_column():
+    x = np.linspace(0.0, 1.0, 10)
+    model = LinearSurrogate().fit(np.column_stack((x, x)), 2 * x + 1)
+    assert np.allclose(model.coef_, [1.0, 1.0])
+    assert np.isclose(model.intercept_, 1.0)
+    assert np.allclose(model.predict(np.column_stack((x, x))), 2 * x + 1)
+
+# A constant feature carries no information, so it gets no weight and the fit stays finite
+def test_constant_column():
+    x = np.linspace(0.0, 1.0, 10)
+    model = LinearSurrogate().fit(np.column_stack((x, np.full(10, 7.0))), 2 * x + 1)
+    assert np.allclose(model.coef_, [2.0, 0.0], atol=1e-12)
+    assert np.isclose(model.intercept_, 1.0)
+
+    model = LinearSurrogate().fit(np.full(2, 3.0), [1.0, 5.0])
+    assert np.allclose(model.predict([3.0, 3.0]), 3.0)
+
+    model = LinearSurrogate().fit(np.array([[1.0, 2.0]] * 3), [3.0, 4.0, 5.0])
+    assert np.isclose(model.predict([1.0, 2.0]), 4.0)
@@ -0,0 +1,44 @@
+import csv
+import re
+import pytest
+from trade_study import read_variants, run_study, run_variant
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+# Cells are read as numbers, except the solver method, which must name a solver
+def test_read_variants(tmp_path):
+    path = write_csv(tmp_path / 'variants.csv', [['CD0', 'weight:method', 'T/W'], ['0.03', 'newton', '0.8'], ['0.04', 'bisection', '0.9']])
+    assert read_variants(path) == [
+        {'variant': 0, 'CD0': 0.03, 'weight:method': 'newton', 'T/W': 0.8},
+        {'variant': 1, 'CD0': 0.04, 'weight:method': 'bisection', 'T/W': 0.9},
+    ]
+
+# Bad cells are reported with the file, line and column instead of failing inside the sizing code
+@pytest.mark.parametrize('rows, message', [
+    ([['CD0', 'T/W'], ['0.03', '0.8'], ['0.04', '']], "line 3, column 'T/W': missing value"),
+    ([['CD0', 'T/W'], ['0.03', 'abc']], "line 2, column 'T/W': 'abc' is not a number"),
+    ([['CD0', 'T/W'], ['0.03', '0.8', '5']], "line 2: more cells than columns"),
+    ([['CD0', 'T/W'], ['0.03']], "line 2, column 'T/W': missing value"),
+    ([['method'], ['fastest']], "line 2, column 'method': 'fastest' is not one of"),
+])
+def test_read_variants_errors(tmp_path, rows, message):
+    path = write_csv(tmp_path / 'variants.csv', rows)
+    with pytest.raises(ValueError, match=re.escape('{}, {}'.format(path, message))):
+        read_variants(path)
+
+# The process pool writes the same results as running each variant in this process
+def test_run_study_matches_run_variant(tmp_path):
+    variants = [
+        {'CD0': 0.03, 'T/W': 0.8, 'weight:method': 'bisection', 'hstab:num_lh': 101},
+        {'CD0': 0.04, 'T/W': 0.9, 'weight:method': 'newton', 'hstab:num_lh': 101},
+    ]
+    out = str(tmp_path / 'out.csv')
+    assert run_study(variants, out, workers=2) == 2
+    with open(out, newline='') as f:
+        rows = sorted(csv.DictReader(f), key=lambda row: row['variant'])
+    for i, (row, variant) in enumerate(zip(rows, variants)):
+        expected = run_variant({'variant': i, **variant})
+        assert row == {key: str(value) for key, value in expected.items()}
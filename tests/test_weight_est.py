@@ -0,0 +1,50 @@
+import numpy as np
+import weight_est
+import pytest
+
+# The batched bisection gives the same weights as solving each point on its own, with NaN where a solve fails
+def test_batch_matches_pointwise():
+    tw_grid, endurance_grid = np.meshgrid(np.linspace(0.2, 1.4, 25), [1/12, 1/8, 1/6, 1/2])
+    batch = weight_est.batch_weight_estimate(tw_grid, endurance_grid, 7, 5, 15)
+    assert np.isnan(batch[0]).any() and not np.isnan(batch[0]).all()
+    for index in np.ndindex(tw_grid.shape):
+        result = weight_est.weight_estimate(tw_grid[index], endurance_grid[index], 7, 5, 15)
+        if result is None:
+            assert all(np.isnan(values[index]) for values in batch)
+        else:
+            assert np.allclose([values[index] for values in batch], result, rtol=1e-12, atol=0)
+
+converged_points = [(0.85, 1/12), (0.95, 1/12), (0.6, 1/8), (0.75, 1/8), (0.5, 1/6)]
+
+# Every root finder closes on the same weight, within its residual tolerance
+@pytest.mark.parametrize('TW_ratio, Endurance', converged_points)
+def test_solvers_agree(TW_ratio, Endurance):
+    reference = weight_est.linear_solve(TW_ratio, Endurance, 7, 5, 15, 1e-10, 100)[0]
+    for method in weight_est.weight_solvers:
+        result, info = weight_est.weight_estimate(TW_ratio, Endurance, 7, 5, 15, method=method, rtol=1e-10, return_info=True)
+        assert info['converged'] and abs(info['residual']) < 1e-10
+        assert np.isclose(result[0], reference, rtol=1e-9, atol=0)
+        result, info = weight_est.weight_estimate(TW_ratio, Endurance, 7, 5, 15, method=method, return_info=True)
+        assert abs(info['residual']) < 1e-4
+        assert np.isclose(result[0], reference, rtol=1e-3, atol=0)
+
+# Every root finder reports a point with no closure in the bracket as not converged
+def test_solvers_agree_on_failure():
+    for method in weight_est.weight_solvers:
+        result, info = weight_est.weight_estimate(0.8, 1/6, 7, 5, 15, method=method, return_info=True)
+        assert result is None and not info['converged'] and np.isnan(info['residual'])
+
+def test_unknown_method():
+    with pytest.raises(ValueError, match="Unknown solver method 'regula'"):
+        weight_est.weight_estimate(0.8, 0.1, 7, 5, 15, method='regula')
+
+# Warm starting a T/W sweep changes the starting guesses, not the weights
+def test_warm_start_matches_cold_start():
+    tw_values = np.linspace(0.6, 1.0, 9)
+    results, iterations, residuals = weight_est.warm_start_estimation(tw_values, 1/12, 7, 5, 15, rtol=1e-10)
+    for k, t in enumerate(tw_values):
+        result = weight_est.weight_estimate(t, 1/12, 7, 5, 15, method='newton', rtol=1e-10)
+        if result is None:
+            assert np.isnan(results[:, k]).all()
+        else:
+            assert np.allclose(results[:, k], result, rtol=1e-9, atol=0)